@@ -4,13 +4,24 @@ Model được khởi tạo 1 lần khi server start, sau đó tái sử dụng
 Queue system cho phép xử lý nhiều request song song một cách an toàn
 """
 
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, stream_with_context
+import numpy as np
+import soundfile as sf
+import json
+import struct
 import sys
 from pathlib import Path
 import uuid
 import os
 import threading
 import queue
+import hashlib
+import heapq
+import shutil
+import unicodedata
+from collections import OrderedDict
+import itertools
+import math
 import time
 from datetime import datetime
 import argparse
@@ -18,19 +29,141 @@ import argparse
 # Thêm đường dẫn src vào sys.path
 sys.path.append(str(Path(__file__).resolve().parent / "src"))
 
+import torch
+
 from f5_tts.api import F5TTS
+from f5_tts.infer.duration import estimate_gen_frames, hop_length
+from f5_tts.infer.utils_infer import (
+    cpu_engines,
+    get_guidance,
+    get_latency_tier,
+    get_tier_guidance,
+    guidance_presets,
+    latency_tiers,
+    set_cpu_threads,
+)
 
 app = Flask(__name__)
 
 # ====== QUEUE SYSTEM ======
+# Mỗi giây chờ trong queue được trừ bấy nhiêu frame vào độ ưu tiên (aging),
+# để câu dài không bị câu ngắn chen mãi
+AGING_FRAMES_PER_SEC = 200
+
+
+class JobQueue:
+    """
+    Hàng đợi ưu tiên theo khối lượng dự đoán (shortest expected work first), công bằng giữa các client
+    Job có ít mel frame dự đoán ("frames") được xử lý trước, job chờ lâu được ưu tiên dần lên
+
+    Độ ưu tiên = frames - AGING_FRAMES_PER_SEC * thời gian chờ, mọi job cùng già đi như nhau
+    nên thứ tự chỉ phụ thuộc frames + AGING_FRAMES_PER_SEC * thời điểm vào queue (dùng heap được)
+    Công bằng: cộng thêm số frame client đó đang chờ sẵn trong queue, client gửi hàng loạt
+    (VD: cả file SRT) không chặn được request của client khác, job của nó xếp sau dần theo tổng việc
+    Cùng interface với queue.Queue: put / get(timeout) / qsize / task_done
+    """
+
+    def __init__(self):
+        self.heap = []
+        self.counter = itertools.count()  # giữ thứ tự FIFO khi bằng độ ưu tiên
+        self.not_empty = threading.Condition()
+        self.queued_frames = 0
+        self.client_frames = {}  # client_id -> tổng frame đang chờ
+
+    def put(self, job):
+        with self.not_empty:
+            if job is None:  # Poison pill xếp cuối
+                key = math.inf
+            else:
+                client_id = job["client_id"]
+                key = self.client_frames.get(client_id, 0) + job["frames"] + AGING_FRAMES_PER_SEC * job["enqueue_time"]
+                self.queued_frames += job["frames"]
+                self.client_frames[client_id] = self.client_frames.get(client_id, 0) + job["frames"]
+            heapq.heappush(self.heap, (key, next(self.counter), job))
+            self.not_empty.notify()
+
+    def get(self, timeout=None):
+        with self.not_empty:
+            if not self.not_empty.wait_for(lambda: self.heap, timeout=timeout):
+                raise queue.Empty
+            _, _, job = heapq.heappop(self.heap)
+            if job is not None:
+                self.queued_frames -= job["frames"]
+                self.client_frames[job["client_id"]] -= job["frames"]
+                if not self.client_frames[job["client_id"]]:
+                    del self.client_frames[job["client_id"]]
+            return job
+
+    def qsize(self):
+        return len(self.heap)
+
+    def task_done(self):
+        pass
+
+
 # Queue để lưu các request đang chờ xử lý
-request_queue = queue.Queue()
+request_queue = JobQueue()
 
-# Dictionary để lưu kết quả của các request
+# Dictionary để lưu kết quả của các request, kết quả không ai lấy bị xóa sau RESULT_TTL giây
 results = {}
+RESULT_TTL = 600
+RESULT_CLEANUP_INTERVAL = 30
+
+# Các job chưa xong: request_id -> job, worker báo qua job["started"] / job["done"] (threading.Event)
+# thay vì client phải hỏi results liên tục
+pending_jobs = {}
+
+# Thời gian chờ tối đa của long-poll /tts/status?wait= và khoảng gửi keep-alive của SSE (giây)
+MAX_STATUS_WAIT = 60
+SSE_KEEPALIVE = 15
+
+# ====== WORKER POOL ======
+# Số worker chạy model song song, cùng dùng 1 bản weights (chỉ đọc) trong process này.
+# Trên CPU nhiều core, mỗi worker dùng cpu_count / NUM_WORKERS thread torch
+NUM_WORKERS = 1
+
+# ====== CPU ENGINE ======
+# Chỉ dùng khi chạy trên CPU, xem cpu_engines trong utils_infer và benchmark_cpu_engine.py
+#   "fp32": mặc định, "bf16": weights bfloat16 (CPU có AVX512-BF16 / AMX), "int8": lượng tử hóa động Linear
+CPU_ENGINE = "fp32"
+# Số thread torch mỗi worker, None = cpu_count / NUM_WORKERS
+# Chạy nhiều server trên 1 máy thì đặt sao cho tổng thread các server <= số core
+CPU_THREADS = None
+CPU_INTEROP_THREADS = None
+
+
+def cpu_engine_arg_parser():
+    """Flag CPU engine, đọc trước khi load model (model load ngay khi import file này)"""
+    parser = argparse.ArgumentParser(add_help=False)
+    parser.add_argument(
+        "--cpu-engine",
+        choices=list(cpu_engines),
+        default=CPU_ENGINE,
+        help=f"Chế độ chạy model trên CPU: fp32, bf16 hoặc int8 (default: {CPU_ENGINE})",
+    )
+    parser.add_argument(
+        "--cpu-threads",
+        type=int,
+        default=CPU_THREADS,
+        help="Số thread torch mỗi worker trên CPU (default: cpu_count / workers)",
+    )
+    parser.add_argument(
+        "--cpu-interop-threads",
+        type=int,
+        default=CPU_INTEROP_THREADS,
+        help="Số thread inter-op của torch (default: mặc định của torch)",
+    )
+    return parser
 
-# Lock để đảm bảo thread-safe khi truy cập model
-model_lock = threading.Lock()
+
+if __name__ == "__main__":
+    cpu_args, _ = cpu_engine_arg_parser().parse_known_args()
+    CPU_ENGINE = cpu_args.cpu_engine
+    CPU_THREADS = cpu_args.cpu_threads
+    CPU_INTEROP_THREADS = cpu_args.cpu_interop_threads
+
+# Mỗi lần chạy model (1 batch, 1 đoạn stream) giữ 1 slot, tối đa NUM_WORKERS cùng lúc
+model_lock = threading.BoundedSemaphore(NUM_WORKERS)
 
 # Thống kê
 stats = {
@@ -39,7 +172,124 @@ stats = {
     "failed_requests": 0,
     "queue_size": 0,
     "processing": False,
+    # Số worker đang chạy model / tổng số worker
+    "busy_workers": 0,
+    "workers": NUM_WORKERS,
+    # Số request đã nhận nhưng chưa xong (đang chờ trong queue + đang xử lý + đang stream)
+    # và tổng mel frame dự đoán của chúng
+    # Load balancer đọc các giá trị này qua /health để chọn server ít việc nhất
+    "in_flight": 0,
+    "in_flight_frames": 0,
+    # Số request bị từ chối (429) vì quá tải
+    "rejected_requests": 0,
+    # Thời gian xử lý / độ dài audio, trung bình trượt, dùng ước lượng Retry-After
+    "rtf": 0.5,
 }
+stats_lock = threading.Lock()
+
+# client_id -> tổng frame dự đoán của các request đang xử lý của client đó
+client_in_flight_frames = {}
+
+
+def update_in_flight(delta, frames=0, client_id=None):
+    """Cập nhật số request đang xử lý và tổng frame dự đoán (thread-safe)"""
+    with stats_lock:
+        stats["in_flight"] += delta
+        stats["in_flight_frames"] += delta * frames
+        if client_id is not None:
+            client_frames = client_in_flight_frames.get(client_id, 0) + delta * frames
+            if client_frames > 0:
+                client_in_flight_frames[client_id] = client_frames
+            else:
+                client_in_flight_frames.pop(client_id, None)
+
+
+def update_rtf(processing_time, audio_duration, alpha=0.2):
+    """Cập nhật RTF trung bình trượt sau mỗi lần chạy model"""
+    if audio_duration > 0:
+        with stats_lock:
+            stats["rtf"] = (1 - alpha) * stats["rtf"] + alpha * processing_time / audio_duration
+
+
+# ====== ADMISSION CONTROL ======
+# Tổng audio (giây, dự đoán) tối đa đang chờ + đang xử lý, vượt quá thì trả 429 thay vì xếp hàng đến timeout
+MAX_QUEUED_AUDIO_SECONDS = 600
+# Tối đa cho 1 client, để 1 client gửi hàng loạt không chiếm hết sức chứa
+MAX_CLIENT_AUDIO_SECONDS = 300
+
+
+def get_client_id(data):
+    """Client được nhận diện qua header X-Client-Id, field client_id, hoặc IP (qua load balancer: X-Forwarded-For)"""
+    client_id = request.headers.get("X-Client-Id") or data.get("client_id")
+    if client_id:
+        return str(client_id)
+    forwarded_for = request.headers.get("X-Forwarded-For")
+    if forwarded_for:
+        return forwarded_for.split(",")[0].strip()
+    return request.remote_addr
+
+
+def admit(frames, client_id):
+    """
+    Nhận request nếu còn sức chứa, giữ chỗ (in_flight) ngay trong cùng lock
+    Trả về None nếu nhận, hoặc số giây client nên chờ trước khi gửi lại (Retry-After)
+    Request đầu tiên luôn được nhận, kể cả khi một mình nó đã vượt giới hạn
+    """
+    seconds_per_frame = hop_length / tts_model.target_sample_rate
+    with stats_lock:
+        job_seconds = frames * seconds_per_frame
+        backlog = stats["in_flight_frames"] * seconds_per_frame
+        client_backlog = client_in_flight_frames.get(client_id, 0) * seconds_per_frame
+
+        # Số giây audio phải xử lý xong trước khi request này vừa giới hạn
+        excess = 0
+        if backlog > 0:
+            excess = max(excess, backlog + job_seconds - MAX_QUEUED_AUDIO_SECONDS)
+        if client_backlog > 0:
+            excess = max(excess, client_backlog + job_seconds - MAX_CLIENT_AUDIO_SECONDS)
+        if excess > 0:
+            stats["rejected_requests"] += 1
+            # NUM_WORKERS worker xử lý song song
+            return max(1, math.ceil(excess * stats["rtf"] / NUM_WORKERS))
+
+        stats["in_flight"] += 1
+        stats["in_flight_frames"] += frames
+        client_in_flight_frames[client_id] = client_in_flight_frames.get(client_id, 0) + frames
+    return None
+
+
+def overloaded_response(retry_after):
+    response = jsonify({"error": "Server overloaded, retry later", "retry_after": retry_after})
+    response.status_code = 429
+    response.headers["Retry-After"] = str(retry_after)
+    return response
+
+
+def finish_job(job, result):
+    """Lưu kết quả rồi đánh thức mọi client đang chờ job này"""
+    result["finished_at"] = time.time()
+    results[job["request_id"]] = result
+    pending_jobs.pop(job["request_id"], None)
+    job["done"].set()
+
+
+def cleanup_results():
+    """Xóa kết quả (và file audio) không ai lấy sau RESULT_TTL giây, tránh results và outputs/ phình mãi"""
+    while True:
+        time.sleep(RESULT_CLEANUP_INTERVAL)
+        now = time.time()
+        for request_id, result in list(results.items()):
+            if now - result["finished_at"] < RESULT_TTL:
+                continue
+            results.pop(request_id, None)
+            output_path = result.get("output_path")
+            if output_path is not None and os.path.exists(output_path):
+                try:
+                    os.remove(output_path)
+                except OSError as e:
+                    print(f"   ⚠️  Failed to delete expired file: {e}")
+            print(f"   🗑️  Expired result [{request_id}]")
+
 
 # ====== KHỞI TẠO MODEL 1 LẦN KHI SERVER START ======
 print("🟢 Đang khởi tạo F5-TTS model...")
@@ -52,6 +302,8 @@ CKPT_FILE = os.path.join(SCRIPT_DIR, "F5-TTS-Vietnamese", "model_last.pt")
 VOCAB_FILE = os.path.join(SCRIPT_DIR, "F5-TTS-Vietnamese", "config.json")
 DEFAULT_REF_AUDIO = "ref3.mp3"
 DEFAULT_REF_TEXT = "hiệu quả là có thể khống chế đại tiện của mục tiêu"
+# Cache giọng tham chiếu đã tiền xử lý trên đĩa, restart server không phải xử lý lại
+VOICE_CACHE_DIR = os.path.join(SCRIPT_DIR, "voice_cache")
 
 print(f"📂 Model checkpoint: {CKPT_FILE}")
 print(f"📂 Vocab file: {VOCAB_FILE}")
@@ -61,7 +313,43 @@ tts_model = F5TTS(
     model="F5TTS_Base",
     ckpt_file=CKPT_FILE,
     vocab_file=VOCAB_FILE,
+    voice_cache_dir=VOICE_CACHE_DIR,
+    convert_ckpt=True,  # checkpoint của server, ghi được file .ema.safetensors cạnh nó
+    cpu_engine=CPU_ENGINE,  # load thẳng weights bf16 / int8, không load fp32 rồi mới chuyển
+    cpu_interop_threads=CPU_INTEROP_THREADS,  # chỉ đặt được trước khi torch chạy song song lần đầu
 )
+# Trên GPU engine CPU không có tác dụng
+CPU_ENGINE = tts_model.cpu_engine or "fp32"
+
+# Giọng mặc định được tiền xử lý ngay (cũng là warm-up), dùng để dự đoán độ dài request
+default_voice = tts_model.voice_cache.get(DEFAULT_REF_AUDIO, DEFAULT_REF_TEXT)
+
+# (ref_audio, ref_text) -> (số frame audio tham chiếu, ref_text sau tiền xử lý), của các giọng đã dùng
+voice_profiles = {
+    (DEFAULT_REF_AUDIO, DEFAULT_REF_TEXT): (
+        default_voice["cond_audio"].shape[-1] // hop_length,
+        default_voice["ref_text"],
+    )
+}
+
+
+def predict_frames(text, ref_audio, ref_text, speed):
+    """
+    Số mel frame sẽ sinh ra, cùng công thức infer_batch_process dùng
+    Giọng chưa dùng lần nào thì lấy tốc độ nói của giọng mặc định
+    """
+    ref_frames, profile_text = voice_profiles.get(
+        (ref_audio, ref_text), voice_profiles[(DEFAULT_REF_AUDIO, DEFAULT_REF_TEXT)]
+    )
+    return estimate_gen_frames(ref_frames, profile_text, text, speed=speed)
+
+
+def remember_voice(ref_audio, ref_text):
+    """Ghi lại độ dài giọng tham chiếu vừa dùng (đã nằm trong voice cache, không tốn gì)"""
+    if (ref_audio, ref_text) not in voice_profiles:
+        voice = tts_model.voice_cache.get(ref_audio, ref_text, show_info=lambda *args: None)
+        voice_profiles[(ref_audio, ref_text)] = (voice["cond_audio"].shape[-1] // hop_length, voice["ref_text"])
+
 
 print("✅ Model đã sẵn sàng! Server có thể nhận request.\n")
 
@@ -70,12 +358,319 @@ OUTPUT_DIR = Path("outputs")
 OUTPUT_DIR.mkdir(exist_ok=True)
 
 
+# ====== DYNAMIC BATCHING ======
+# Thời gian chờ gom thêm request vào cùng batch (giây)
+BATCH_WINDOW = 0.05
+# Số câu tối đa trong 1 lần chạy model (1 ODE solve)
+MAX_BATCH_SIZE = 8
+# Số request tối đa gom trong 1 cửa sổ, để có đủ câu chia bucket theo độ dài
+MAX_GATHER = 32
+
+
+# ====== LATENCY TIERS ======
+# Mỗi tier là 1 cặp (số bước ODE, solver), xem latency_tiers trong utils_infer và benchmark_latency_tiers.py
+DEFAULT_LATENCY_TIER = "quality"
+# Khi quá tải, job async (batch) không chỉ định tier được hạ xuống tier này
+DEGRADED_LATENCY_TIER = "balanced"
+# Ngưỡng quá tải: tổng mel frame dự đoán đang chờ (~ 94 frame / 1 giây audio)
+DEGRADE_QUEUED_FRAMES = 20000
+
+
+def parse_latency_tier(data):
+    """Lấy latency_tier từ request, None nếu không chỉ định, ValueError nếu không hợp lệ"""
+    latency_tier = data.get("latency_tier")
+    if latency_tier is not None and latency_tier not in latency_tiers:
+        raise ValueError(f"'latency_tier' must be one of {list(latency_tiers)}")
+    return latency_tier
+
+
+# ====== GUIDANCE ======
+# Bước nào chạy thêm forward không điều kiện (CFG), xem guidance_presets (utils_infer) và benchmark_guidance.py
+# "full": mọi bước (chậm nhất, chất lượng gốc), "none": không CFG (1 forward / bước)
+DEFAULT_GUIDANCE = "full"
+
+
+def parse_guidance(data):
+    """Lấy guidance preset từ request, None nếu không chỉ định, ValueError nếu không hợp lệ"""
+    guidance = data.get("guidance")
+    if guidance is not None and guidance not in guidance_presets:
+        raise ValueError(f"'guidance' must be one of {list(guidance_presets)}")
+    return guidance
+
+
+def resolve_guidance(latency_tier, guidance):
+    """Preset thực tế: request chỉ định > mặc định của tier (vd fast_no_cfg) > DEFAULT_GUIDANCE"""
+    return get_tier_guidance(latency_tier, guidance) or DEFAULT_GUIDANCE
+
+
+# ====== RESULT CACHE ======
+# Audio đã tổng hợp được lưu trên đĩa theo hash của (text, giọng, speed, tier, cfg, seed), LRU theo dung lượng
+# Chạy lại file SRT đã sửa vài dòng thì chỉ các dòng đó phải tổng hợp lại
+RESULT_CACHE_DIR = os.path.join(SCRIPT_DIR, "result_cache")
+RESULT_CACHE_MAX_MB = 2048  # 0 = tắt cache
+# Seed policy: cache chỉ đúng khi kết quả xác định (cùng input -> cùng audio)
+#   "request": chỉ request gửi seed mới xác định và được cache, còn lại random như cũ (mặc định)
+#   "fixed":   request không gửi seed dùng DEFAULT_SEED, mọi request đều cache được,
+#              nhưng cùng text + giọng luôn ra đúng 1 audio (mất tính ngẫu nhiên)
+RESULT_CACHE_SEED_POLICY = "request"
+DEFAULT_SEED = 0
+# Tham số sampling server dùng (mặc định của F5TTS), nằm trong key để đổi là cache tự mất hiệu lực
+CFG_STRENGTH = 2
+SWAY_SAMPLING_COEF = -1
+
+
+class ResultCache:
+    """
+    Cache file wav trên đĩa, key là hash nội dung input, xóa file ít dùng nhất khi vượt max_bytes
+    Thứ tự LRU được khôi phục từ mtime khi restart (mỗi lần hit cập nhật mtime)
+    """
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> số byte, cũ nhất trước
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if max_bytes > 0:
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            # File tạm (đang ghi / đang gửi) còn sót lại từ lần chạy trước
+            for path in self.cache_dir.glob("*.tmp"):
+                path.unlink(missing_ok=True)
+            for path in sorted(self.cache_dir.glob("*.wav"), key=lambda path: path.stat().st_mtime):
+                size = path.stat().st_size
+                self.entries[path.stem] = size
+                self.total_bytes += size
+            self.evict()
+
+    @property
+    def enabled(self):
+        return self.max_bytes > 0
+
+    def path(self, key):
+        return self.cache_dir / f"{key}.wav"
+
+    def get(self, key):
+        """Đường dẫn file wav đã cache, None nếu miss"""
+        with self.lock:
+            if key not in self.entries:
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+        path = self.path(key)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return path
+
+    def put(self, key, wav_path):
+        """Copy file wav vào cache (ghi file tạm rồi rename, không ai đọc được file ghi dở)"""
+        path = self.path(key)
+        tmp_path = path.with_suffix(f".{uuid.uuid4().hex}.tmp")
+        shutil.copyfile(wav_path, tmp_path)
+        os.replace(tmp_path, path)
+        with self.lock:
+            self.total_bytes -= self.entries.pop(key, 0)
+            self.entries[key] = path.stat().st_size
+            self.total_bytes += self.entries[key]
+            self.evict()
+
+    def evict(self):
+        while self.total_bytes > self.max_bytes and self.entries:
+            key, size = self.entries.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self.path(key))
+            except OSError:
+                pass
+
+    def info(self):
+        with self.lock:
+            lookups = self.hits + self.misses
+            return {
+                "enabled": self.enabled,
+                "entries": len(self.entries),
+                "size_mb": round(self.total_bytes / 1024 / 1024, 1),
+                "max_mb": round(self.max_bytes / 1024 / 1024, 1),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0,
+            }
+
+
+result_cache = ResultCache(RESULT_CACHE_DIR, RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+# Checkpoint nằm trong key: đổi model thì kết quả cũ không còn dùng
+MODEL_FINGERPRINT = f"{CKPT_FILE}:{os.stat(CKPT_FILE).st_mtime_ns}" if os.path.exists(CKPT_FILE) else CKPT_FILE
+
+
+def normalize_text(text):
+    """NFC (tiếng Việt dựng sẵn / tổ hợp dấu là cùng 1 chữ) và gộp khoảng trắng"""
+    return " ".join(unicodedata.normalize("NFC", text).split())
+
+
+def parse_seed(data):
+    """Seed theo policy, None nếu request không xác định (không cache), ValueError nếu không hợp lệ"""
+    seed = data.get("seed")
+    if seed is None:
+        return DEFAULT_SEED if RESULT_CACHE_SEED_POLICY == "fixed" else None
+    if isinstance(seed, bool) or not isinstance(seed, int) or seed < 0:
+        raise ValueError("'seed' must be a non-negative integer")
+    return seed
+
+
+def result_cache_key(text, ref_audio, ref_text, speed, latency_tier, guidance, seed):
+    """Hash của mọi input quyết định audio, None nếu không cache được"""
+    if not result_cache.enabled or seed is None:
+        return None
+    try:
+        voice_hash = tts_model.voice_cache.hash_file(ref_audio)
+    except OSError:
+        return None
+    nfe_step, ode_method = get_latency_tier(latency_tier)
+    guidance = get_guidance(guidance, CFG_STRENGTH)
+    key = json.dumps(
+        [
+            MODEL_FINGERPRINT,
+            CPU_ENGINE,
+            text,
+            voice_hash,
+            ref_text,
+            float(speed),
+            nfe_step,
+            ode_method,
+            guidance["cfg_strength"],
+            guidance["cfg_interval"],
+            guidance["cfg_reuse"],
+            SWAY_SAMPLING_COEF,
+            seed,
+        ],
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()
+
+
+def collect_jobs(first_job):
+    """
+    Gom các request đang chờ trong queue trong khoảng BATCH_WINDOW
+    Trả về (danh sách job, có gặp poison pill hay không)
+    """
+    jobs = [first_job]
+    deadline = time.time() + BATCH_WINDOW
+
+    while len(jobs) < MAX_GATHER:
+        remaining = deadline - time.time()
+        if remaining <= 0:
+            break
+        try:
+            job = request_queue.get(timeout=remaining)
+        except queue.Empty:
+            break
+        if job is None:
+            request_queue.task_done()
+            return jobs, True
+        jobs.append(job)
+
+    return jobs, False
+
+
+def process_jobs(jobs):
+    """
+    Chạy 1 nhóm job có cùng giọng tham chiếu (ref_audio, ref_text), latency tier và guidance
+    Các câu có độ dài dự đoán gần nhau được chạy chung 1 batch
+    """
+    ref_audio = jobs[0]["ref_audio"]
+    ref_text = jobs[0]["ref_text"]
+    latency_tier = jobs[0]["latency_tier"]
+    guidance = jobs[0]["guidance"]
+    seed = jobs[0]["seed"]
+    pending = {i: job for i, job in enumerate(jobs)}
+
+    for job in jobs:
+        job["started"].set()
+        print(f"🔊 Processing [{job['request_id']}]: {job['text'][:50]}...")
+
+    start_time = time.time()
+    audio_duration = 0
+    try:
+        # Giữ 1 slot model, tối đa NUM_WORKERS nhóm chạy cùng lúc
+        with model_lock:
+            for i, wav, sr, spec in tts_model.infer_batch(
+                ref_file=ref_audio,
+                ref_text=ref_text,
+                gen_texts=[job["text"] for job in jobs],
+                speed=[job["speed"] for job in jobs],
+                file_waves=[str(job["output_path"]) for job in jobs],
+                latency_tier=latency_tier,
+                guidance=guidance,
+                cfg_strength=CFG_STRENGTH,
+                sway_sampling_coef=SWAY_SAMPLING_COEF,
+                seed=seed,
+                max_batch_size=MAX_BATCH_SIZE,
+            ):
+                job = pending.pop(i)
+                duration = time.time() - start_time
+
+                # Key theo tier thực tế đã chạy (job có thể bị hạ tier khi quá tải)
+                # Cache theo từng câu: frame padding được mask nên câu chạy trong batch ra giống khi chạy riêng
+                cache_key = result_cache_key(
+                    job["text"], ref_audio, ref_text, job["speed"], latency_tier, guidance, seed
+                )
+                if cache_key is not None:
+                    try:
+                        result_cache.put(cache_key, job["output_path"])
+                    except OSError as e:
+                        print(f"   ⚠️  Failed to cache result: {e}")
+
+                # Lưu kết quả thành công
+                stats["completed_requests"] += 1
+                update_in_flight(-1, job["frames"], job["client_id"])
+                finish_job(
+                    job,
+                    {
+                        "status": "completed",
+                        "output_path": job["output_path"],
+                        "sample_rate": sr,
+                        "duration": len(wav) / sr,
+                        "processing_time": duration,
+                        "batch_size": len(jobs),
+                        "latency_tier": latency_tier,
+                        "guidance": guidance,
+                        "error": None,
+                    },
+                )
+                audio_duration += len(wav) / sr
+                print(f"   ✅ Completed [{job['request_id']}] in {duration:.2f}s")
+
+    except Exception as e:
+        # Lưu kết quả lỗi cho các job chưa xong
+        for job in pending.values():
+            stats["failed_requests"] += 1
+            update_in_flight(-1, job["frames"], job["client_id"])
+            finish_job(job, {"status": "failed", "error": str(e)})
+            print(f"   ❌ Failed [{job['request_id']}]: {str(e)}")
+    else:
+        remember_voice(ref_audio, ref_text)
+        update_rtf(time.time() - start_time, audio_duration)
+
+
+def update_busy_workers(delta):
+    with stats_lock:
+        stats["busy_workers"] += delta
+        stats["processing"] = stats["busy_workers"] > 0
+
+
 def process_queue():
     """
     Worker thread để xử lý các request trong queue
-    Chạy liên tục và xử lý từng request một
+    Chạy liên tục, gom các request đến gần nhau thành batch rồi xử lý
+    Có thể chạy nhiều worker cùng lúc, tất cả lấy job từ cùng 1 queue
     """
-    print("🔄 Queue worker started...")
+    print(f"🔄 Queue worker started ({threading.current_thread().name})...")
 
     while True:
         try:
@@ -85,68 +680,88 @@ def process_queue():
             if job is None:  # Poison pill để dừng worker
                 break
 
-            request_id = job["request_id"]
-            text = job["text"]
-            ref_audio = job["ref_audio"]
-            ref_text = job["ref_text"]
-            speed = job["speed"]
-            output_path = job["output_path"]
+            jobs, stop = collect_jobs(job)
+
+            if str(tts_model.device) == "cpu":
+                # Số thread OpenMP là riêng của từng thread, đặt trong chính worker (số worker có thể đổi sau khi start)
+                torch.set_num_threads(cpu_threads_per_worker())
 
-            stats["processing"] = True
+            update_busy_workers(1)
             stats["queue_size"] = request_queue.qsize()
 
-            print(f"🔊 Processing [{request_id}]: {text[:50]}...")
+            # Quá tải: hạ số bước cho job async không chỉ định tier, request sync giữ chất lượng
+            backlog = request_queue.queued_frames + sum(job["frames"] for job in jobs)
+            degrade = backlog > DEGRADE_QUEUED_FRAMES
+            for job in jobs:
+                if job["latency_tier"] is None:
+                    job["latency_tier"] = DEGRADED_LATENCY_TIER if degrade and job["async"] else DEFAULT_LATENCY_TIER
+                job["guidance"] = resolve_guidance(job["latency_tier"], job["guidance"])
+            if degrade:
+                print(f"⚠️  Backlog {backlog} frames, async jobs run with tier '{DEGRADED_LATENCY_TIER}'")
+
+            # Nhóm theo giọng tham chiếu, tier và guidance, chỉ job cùng giọng, cùng cách sampling mới chạy chung batch
+            groups = {}
+            for job in jobs:
+                groups.setdefault(
+                    (job["ref_audio"], job["ref_text"], job["latency_tier"], job["guidance"], job["seed"]), []
+                ).append(job)
+
+            if len(jobs) > 1:
+                print(f"📦 Batching {len(jobs)} requests ({len(groups)} group(s))")
 
             try:
-                # Sử dụng lock để đảm bảo chỉ 1 thread truy cập model tại 1 thời điểm
-                with model_lock:
-                    start_time = time.time()
-
-                    wav, sr, spec = tts_model.infer(
-                        ref_file=ref_audio,
-                        ref_text=ref_text,
-                        gen_text=text,
-                        file_wave=str(output_path),
-                        speed=speed,
-                    )
-
-                    duration = time.time() - start_time
-
-                # Lưu kết quả thành công
-                results[request_id] = {
-                    "status": "completed",
-                    "output_path": output_path,
-                    "sample_rate": sr,
-                    "duration": len(wav) / sr,
-                    "processing_time": duration,
-                    "error": None,
-                }
-
-                stats["completed_requests"] += 1
-                print(f"   ✅ Completed [{request_id}] in {duration:.2f}s")
-
-            except Exception as e:
-                # Lưu kết quả lỗi
-                results[request_id] = {"status": "failed", "error": str(e)}
-                stats["failed_requests"] += 1
-                print(f"   ❌ Failed [{request_id}]: {str(e)}")
-
+                for group in groups.values():
+                    process_jobs(group)
             finally:
-                stats["processing"] = False
-                request_queue.task_done()
+                update_busy_workers(-1)
+                for _ in jobs:
+                    request_queue.task_done()
+
+            if stop:
+                break
 
         except queue.Empty:
             # Queue rỗng, tiếp tục chờ
-            stats["processing"] = False
             stats["queue_size"] = 0
             continue
         except Exception as e:
             print(f"❌ Queue worker error: {str(e)}")
 
 
+workers = []
+
+
+def cpu_threads_per_worker():
+    return CPU_THREADS or max(1, (os.cpu_count() or 1) // NUM_WORKERS)
+
+
+def start_workers(num_workers):
+    """
+    Khởi động worker cho đủ num_workers, dùng chung model và queue
+    Torch nhả GIL khi tính toán nên các thread chạy model song song thật sự;
+    khác với nhiều server riêng, weights chỉ load 1 lần và không phải import torch lại
+    """
+    global NUM_WORKERS, model_lock
+
+    if num_workers != NUM_WORKERS:
+        NUM_WORKERS = num_workers
+        model_lock = threading.BoundedSemaphore(num_workers)
+        stats["workers"] = num_workers
+    if str(tts_model.device) == "cpu":
+        # Chia core cho các worker, tránh N worker x cpu_count thread tranh nhau
+        set_cpu_threads(cpu_threads_per_worker(), CPU_INTEROP_THREADS)
+
+    while len(workers) < num_workers:
+        worker = threading.Thread(target=process_queue, name=f"tts-worker-{len(workers)}", daemon=True)
+        worker.start()
+        workers.append(worker)
+
+
 # Khởi động worker thread
-worker_thread = threading.Thread(target=process_queue, daemon=True)
-worker_thread.start()
+start_workers(NUM_WORKERS)
+
+cleanup_thread = threading.Thread(target=cleanup_results, daemon=True)
+cleanup_thread.start()
 
 
 @app.route("/health", methods=["GET"])
@@ -158,6 +773,12 @@ def health_check():
             "model": "F5-TTS Vietnamese",
             "message": "Model đã được load và sẵn sàng",
             "stats": stats,
+            "result_cache": result_cache.info(),
+            # Để load balancer dự đoán số frame của request bằng cùng công thức
+            "default_voice": {
+                "ref_frames": voice_profiles[(DEFAULT_REF_AUDIO, DEFAULT_REF_TEXT)][0],
+                "ref_text": voice_profiles[(DEFAULT_REF_AUDIO, DEFAULT_REF_TEXT)][1],
+            },
         }
     )
 
@@ -173,12 +794,18 @@ def text_to_speech():
         "ref_audio": "ref3.mp3" (optional),
         "ref_text": "..." (optional),
         "speed": 1.0 (optional),
-        "async": false (optional - nếu true thì trả về request_id ngay)
+        "async": false (optional - nếu true thì trả về request_id ngay),
+        "latency_tier": "fast" | "balanced" | "balanced_midpoint" | "quality" | "fast_no_cfg" (optional - mặc định
+                        quality, job async có thể bị hạ xuống balanced khi server quá tải),
+        "guidance": "full" | "interval" | "reuse2" | "interval_reuse2" | "none" (optional - mặc định full),
+        "client_id": "..." (optional - hoặc header X-Client-Id, mặc định theo IP),
+        "seed": 0 (optional - cùng input + cùng seed -> cùng audio, lấy từ cache nếu đã có)
     }
 
     Response:
-    - File audio .wav (nếu async=false)
+    - File audio .wav (nếu async=false), header X-Cache: HIT | MISS
     - JSON với request_id (nếu async=true)
+    - 429 + header Retry-After nếu server quá tải
     """
     try:
         data = request.get_json()
@@ -186,18 +813,41 @@ def text_to_speech():
         if not data or "text" not in data:
             return jsonify({"error": "Missing 'text' field"}), 400
 
-        text = data["text"]
+        text = normalize_text(data["text"])
         ref_audio = data.get("ref_audio", DEFAULT_REF_AUDIO)
         ref_text = data.get("ref_text", DEFAULT_REF_TEXT)
         speed = data.get("speed", 1.0)
         is_async = data.get("async", False)
+        try:
+            latency_tier = parse_latency_tier(data)
+            guidance = parse_guidance(data)
+            seed = parse_seed(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        # Cache hit: trả luôn, không xếp hàng, không tính vào admission
+        # Request không chỉ định tier tra theo tier mặc định (kết quả chạy ở tier bị hạ không dùng cho nó)
+        lookup_tier = latency_tier or DEFAULT_LATENCY_TIER
+        cache_key = result_cache_key(
+            text, ref_audio, ref_text, speed, lookup_tier, resolve_guidance(lookup_tier, guidance), seed
+        )
+        cached_path = result_cache.get(cache_key) if cache_key is not None else None
+        if cached_path is not None:
+            return cached_response(cached_path, text, is_async)
+
+        client_id = get_client_id(data)
+        frames = predict_frames(text, ref_audio, ref_text, speed)
+        retry_after = admit(frames, client_id)
+        if retry_after is not None:
+            print(f"🚫 Rejected request from {client_id}: {text[:50]}... (retry after {retry_after}s)")
+            return overloaded_response(retry_after)
 
         # Tạo request ID và output path
         request_id = str(uuid.uuid4())
         output_filename = f"{request_id}.wav"
         output_path = OUTPUT_DIR / output_filename
 
-        # Tạo job và thêm vào queue
+        # Tạo job và thêm vào queue, ưu tiên theo số frame dự đoán
         job = {
             "request_id": request_id,
             "text": text,
@@ -205,8 +855,18 @@ def text_to_speech():
             "ref_text": ref_text,
             "speed": speed,
             "output_path": output_path,
+            "frames": frames,
+            "enqueue_time": time.time(),
+            "latency_tier": latency_tier,
+            "guidance": guidance,
+            "async": is_async,
+            "client_id": client_id,
+            "seed": seed,
+            "started": threading.Event(),
+            "done": threading.Event(),
         }
 
+        pending_jobs[request_id] = job
         request_queue.put(job)
         stats["total_requests"] += 1
         stats["queue_size"] = request_queue.qsize()
@@ -228,19 +888,13 @@ def text_to_speech():
                 202,
             )
 
-        # Nếu sync, đợi cho đến khi xử lý xong
+        # Nếu sync, đợi worker báo xong (không poll)
         max_wait = 300  # Tối đa 5 phút
-        start_wait = time.time()
-
-        while request_id not in results:
-            if time.time() - start_wait > max_wait:
-                return jsonify({"error": "Request timeout"}), 504
-            time.sleep(0.1)
-
-        result = results[request_id]
+        if not job["done"].wait(timeout=max_wait):
+            return jsonify({"error": "Request timeout"}), 504
 
         # Xóa kết quả khỏi memory sau khi lấy
-        del results[request_id]
+        result = results.pop(request_id)
 
         if result["status"] == "completed":
             # Trả về file audio
@@ -251,6 +905,7 @@ def text_to_speech():
                     as_attachment=True,
                     download_name=output_filename,
                 )
+                response.headers["X-Cache"] = "MISS"
 
                 # Xóa file sau khi gửi xong
                 try:
@@ -275,11 +930,218 @@ def text_to_speech():
         return jsonify({"error": str(e)}), 500
 
 
+def cached_response(cached_path, text, is_async):
+    """Trả kết quả từ cache: sync gửi thẳng file cache, async copy ra outputs/ như kết quả thường"""
+    request_id = str(uuid.uuid4())
+    stats["total_requests"] += 1
+    stats["completed_requests"] += 1
+    print(f"💾 Cache hit [{request_id}]: {text[:50]}...")
+
+    if not is_async:
+        # Gửi bản hard-link (không được thì copy) của file cache: evict() xóa file cache giữa lúc gửi
+        # cũng không ảnh hưởng, bản tạm bị xóa khi response đóng
+        send_path = cached_path.with_suffix(f".{request_id}.tmp")
+        try:
+            os.link(cached_path, send_path)
+        except OSError:
+            shutil.copyfile(cached_path, send_path)
+        response = send_file(
+            send_path, mimetype="audio/wav", as_attachment=True, download_name=f"{request_id}.wav"
+        )
+        response.call_on_close(lambda: send_path.unlink(missing_ok=True))
+        response.headers["X-Cache"] = "HIT"
+        return response
+
+    output_path = OUTPUT_DIR / f"{request_id}.wav"
+    shutil.copyfile(cached_path, output_path)
+    info = sf.info(str(output_path))
+    results[request_id] = {
+        "status": "completed",
+        "output_path": output_path,
+        "sample_rate": info.samplerate,
+        "duration": info.duration,
+        "processing_time": 0.0,
+        "batch_size": 0,
+        "cached": True,
+        "error": None,
+        "finished_at": time.time(),
+    }
+    return jsonify({"request_id": request_id, "status": "completed", "queue_position": 0}), 202
+
+
+def wav_stream_header(sample_rate, num_channels=1, bits_per_sample=16):
+    """
+    Header WAV cho stream: chưa biết trước độ dài nên kích thước RIFF/data đặt giá trị tối đa
+    (đa số player/thư viện đọc tiếp đến hết stream)
+    """
+    byte_rate = sample_rate * num_channels * bits_per_sample // 8
+    block_align = num_channels * bits_per_sample // 8
+    return struct.pack(
+        "<4sI4s4sIHHIIHH4sI",
+        b"RIFF",
+        0xFFFFFFFF,
+        b"WAVE",
+        b"fmt ",
+        16,
+        1,  # PCM
+        num_channels,
+        sample_rate,
+        byte_rate,
+        block_align,
+        bits_per_sample,
+        b"data",
+        0xFFFFFFFF,
+    )
+
+
+@app.route("/tts/stream", methods=["POST"])
+def text_to_speech_stream():
+    """
+    API endpoint stream audio theo từng đoạn (chunked transfer)
+    Mỗi đoạn text được vocode xong là gửi ngay, không chờ cả file
+
+    Request body (JSON):
+    {
+        "text": "Văn bản cần chuyển thành giọng nói",
+        "ref_audio": "ref3.mp3" (optional),
+        "ref_text": "..." (optional),
+        "speed": 1.0 (optional),
+        "format": "wav" | "pcm" (optional - wav: header + PCM int16, pcm: chỉ PCM int16 mono),
+        "latency_tier": "fast" | "balanced" | "balanced_midpoint" | "quality" | "fast_no_cfg" (optional),
+        "guidance": "full" | "interval" | "reuse2" | "interval_reuse2" | "none" (optional),
+        "client_id": "..." (optional),
+        "seed": 0 (optional - cùng input + cùng seed -> cùng stream, theo seed policy như /tts, không cache)
+    }
+
+    Response: stream audio/wav (hoặc PCM int16 little-endian), sample rate trong header X-Sample-Rate
+    429 + header Retry-After nếu server quá tải
+    """
+    data = request.get_json()
+
+    if not data or "text" not in data:
+        return jsonify({"error": "Missing 'text' field"}), 400
+
+    text = normalize_text(data["text"])
+    ref_audio = data.get("ref_audio", DEFAULT_REF_AUDIO)
+    ref_text = data.get("ref_text", DEFAULT_REF_TEXT)
+    speed = data.get("speed", 1.0)
+    audio_format = data.get("format", "wav")
+    if audio_format not in ("wav", "pcm"):
+        return jsonify({"error": "'format' must be 'wav' or 'pcm'"}), 400
+    try:
+        latency_tier = parse_latency_tier(data) or DEFAULT_LATENCY_TIER
+        guidance = resolve_guidance(latency_tier, parse_guidance(data))
+        seed = parse_seed(data)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    client_id = get_client_id(data)
+    frames = predict_frames(text, ref_audio, ref_text, speed)
+    retry_after = admit(frames, client_id)
+    if retry_after is not None:
+        print(f"🚫 Rejected stream from {client_id}: {text[:50]}... (retry after {retry_after}s)")
+        return overloaded_response(retry_after)
+
+    request_id = str(uuid.uuid4())
+    sample_rate = tts_model.target_sample_rate
+    stats["total_requests"] += 1
+    print(f"🎧 Streaming [{request_id}]: {text[:50]}...")
+
+    def generate():
+        start_time = time.time()
+        first_chunk_time = None
+        num_samples = 0
+
+        stream = tts_model.infer_stream(
+            ref_file=ref_audio,
+            ref_text=ref_text,
+            gen_text=text,
+            speed=speed,
+            latency_tier=latency_tier,
+            guidance=guidance,
+            seed=seed,
+            # Chỉ giữ lock khi giải ODE 1 đoạn, request khác (queue, stream khác) được chen vào giữa các đoạn
+            # Vocode đoạn trước chạy song song với ODE đoạn sau
+            model_lock=model_lock,
+        )
+        try:
+            if audio_format == "wav":
+                yield wav_stream_header(sample_rate)
+
+            for audio_chunk, _ in stream:
+                if first_chunk_time is None:
+                    first_chunk_time = time.time() - start_time
+                num_samples += len(audio_chunk)
+                yield (np.clip(audio_chunk, -1.0, 1.0) * 32767).astype("<i2").tobytes()
+
+            stats["completed_requests"] += 1
+            print(
+                f"   ✅ Streamed [{request_id}] {num_samples / sample_rate:.2f}s audio in {time.time() - start_time:.2f}s "
+                f"(first audio after {first_chunk_time or 0:.2f}s)"
+            )
+        except Exception as e:
+            # Header HTTP đã gửi, chỉ có thể cắt stream
+            stats["failed_requests"] += 1
+            print(f"   ❌ Failed [{request_id}]: {str(e)}")
+        finally:
+            stream.close()
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="audio/wav" if audio_format == "wav" else "application/octet-stream",
+        headers={
+            "X-Request-Id": request_id,
+            "X-Sample-Rate": str(sample_rate),
+            "Cache-Control": "no-cache",
+        },
+    )
+    # Trả chỗ khi response đóng, kể cả khi client ngắt trước khi generator chạy
+    response.call_on_close(lambda: update_in_flight(-1, frames, client_id))
+    return response
+
+
+def job_status(request_id):
+    """Trạng thái hiện tại của request, None nếu không tồn tại (hoặc đã lấy / hết hạn)"""
+    if request_id in results:
+        result = results[request_id]
+        return {
+            "request_id": request_id,
+            "status": result["status"],
+            "result": (
+                {**result, "output_path": str(result["output_path"])} if result["status"] == "completed" else None
+            ),
+            "error": result.get("error"),
+        }
+    job = pending_jobs.get(request_id)
+    if job is not None:
+        return {"request_id": request_id, "status": "processing" if job["started"].is_set() else "queued"}
+    # Worker có thể vừa xong giữa 2 lần kiểm tra
+    if request_id in results:
+        return job_status(request_id)
+    return None
+
+
+def not_found_response(request_id):
+    return (
+        jsonify(
+            {
+                "request_id": request_id,
+                "status": "not_found",
+                "message": "Request not found or already retrieved",
+            }
+        ),
+        404,
+    )
+
+
 @app.route("/tts/status/<request_id>", methods=["GET"])
 def check_status(request_id):
     """
     Kiểm tra trạng thái của request
 
+    Query:
+        wait=<giây> (optional - long-poll: chờ tối đa bấy nhiêu giây cho đến khi xong, tối đa MAX_STATUS_WAIT)
+
     Response:
     {
         "request_id": "xxx",
@@ -287,28 +1149,50 @@ def check_status(request_id):
         "result": {...} (nếu completed)
     }
     """
-    if request_id in results:
-        result = results[request_id]
-        return jsonify(
-            {
-                "request_id": request_id,
-                "status": result["status"],
-                "result": result if result["status"] == "completed" else None,
-                "error": result.get("error"),
-            }
-        )
-    else:
-        # Check if still in queue
-        return (
-            jsonify(
-                {
-                    "request_id": request_id,
-                    "status": "not_found",
-                    "message": "Request not found or already retrieved",
-                }
-            ),
-            404,
-        )
+    wait = min(request.args.get("wait", 0, type=float), MAX_STATUS_WAIT)
+    job = pending_jobs.get(request_id)
+    if job is not None and wait > 0:
+        job["done"].wait(timeout=wait)
+
+    status = job_status(request_id)
+    if status is None:
+        return not_found_response(request_id)
+    return jsonify(status)
+
+
+@app.route("/tts/events/<request_id>", methods=["GET"])
+def status_events(request_id):
+    """
+    Server-sent events cho request async: gửi event "status" mỗi khi trạng thái đổi
+    (queued -> processing -> completed / failed) rồi đóng stream khi xong
+
+    Usage:
+        curl -N http://localhost:5000/tts/events/<request_id>
+    """
+    if job_status(request_id) is None:
+        return not_found_response(request_id)
+
+    def sse(status):
+        return f"event: status\ndata: {json.dumps(status, ensure_ascii=False)}\n\n"
+
+    def generate():
+        job = pending_jobs.get(request_id)
+        status = job_status(request_id)
+        yield sse(status)
+        # job là None nghĩa là đã xong trước khi đọc status, status đã là kết quả cuối
+        while job is not None and status is not None and status["status"] in ("queued", "processing"):
+            event = job["started"] if status["status"] == "queued" else job["done"]
+            while not event.wait(timeout=SSE_KEEPALIVE):
+                yield ": keep-alive\n\n"
+            status = job_status(request_id)
+            if status is not None:
+                yield sse(status)
+
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.route("/tts/json", methods=["POST"])
@@ -317,6 +1201,7 @@ def text_to_speech_json():
     API endpoint trả về thông tin JSON thay vì file
     ⚠️  DEPRECATED: Endpoint này vẫn lưu file trên server
     Khuyến nghị dùng /tts endpoint (tự động xóa file sau khi gửi)
+    Nhận "seed" như /tts (theo seed policy), nhưng không dùng cache kết quả
 
     Response:
     {
@@ -332,22 +1217,40 @@ def text_to_speech_json():
         if not data or "text" not in data:
             return jsonify({"error": "Missing 'text' field"}), 400
 
-        text = data["text"]
+        text = normalize_text(data["text"])
         ref_audio = data.get("ref_audio", DEFAULT_REF_AUDIO)
         ref_text = data.get("ref_text", DEFAULT_REF_TEXT)
         speed = data.get("speed", 1.0)
+        try:
+            latency_tier = parse_latency_tier(data) or DEFAULT_LATENCY_TIER
+            guidance = resolve_guidance(latency_tier, parse_guidance(data))
+            seed = parse_seed(data)
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
+
+        client_id = get_client_id(data)
+        frames = predict_frames(text, ref_audio, ref_text, speed)
+        retry_after = admit(frames, client_id)
+        if retry_after is not None:
+            return overloaded_response(retry_after)
 
         output_filename = f"{uuid.uuid4()}.wav"
         output_path = OUTPUT_DIR / output_filename
 
         # Sử dụng model đã được khởi tạo sẵn
-        wav, sr, spec = tts_model.infer(
-            ref_file=ref_audio,
-            ref_text=ref_text,
-            gen_text=text,
-            file_wave=str(output_path),
-            speed=speed,
-        )
+        try:
+            wav, sr, spec = tts_model.infer(
+                ref_file=ref_audio,
+                ref_text=ref_text,
+                gen_text=text,
+                file_wave=str(output_path),
+                speed=speed,
+                latency_tier=latency_tier,
+                guidance=guidance,
+                seed=seed,
+            )
+        finally:
+            update_in_flight(-1, frames, client_id)
 
         duration = len(wav) / sr
 
@@ -410,27 +1313,150 @@ def download_file(filename):
 
 if __name__ == "__main__":
     # Parse command line arguments
-    parser = argparse.ArgumentParser(description="F5-TTS API Server với Queue System")
+    parser = argparse.ArgumentParser(
+        description="F5-TTS API Server với Queue System", parents=[cpu_engine_arg_parser()]
+    )
     parser.add_argument(
         "--port", type=int, default=5000, help="Port để chạy server (default: 5000)"
     )
     parser.add_argument(
         "--host", type=str, default="0.0.0.0", help="Host để bind (default: 0.0.0.0)"
     )
+    parser.add_argument(
+        "--batch-window-ms",
+        type=float,
+        default=BATCH_WINDOW * 1000,
+        help=f"Thời gian chờ gom request thành batch, ms (default: {BATCH_WINDOW * 1000:.0f})",
+    )
+    parser.add_argument(
+        "--max-batch-size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help=f"Số câu tối đa mỗi batch, 1 = tắt batching (default: {MAX_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--aging-frames-per-sec",
+        type=float,
+        default=AGING_FRAMES_PER_SEC,
+        help=f"Mỗi giây chờ được ưu tiên thêm bấy nhiêu frame, 0 = ngắn trước tuyệt đối (default: {AGING_FRAMES_PER_SEC})",
+    )
+    parser.add_argument(
+        "--latency-tier",
+        choices=list(latency_tiers),
+        default=DEFAULT_LATENCY_TIER,
+        help=f"Tier mặc định khi request không chỉ định (default: {DEFAULT_LATENCY_TIER})",
+    )
+    parser.add_argument(
+        "--degraded-latency-tier",
+        choices=list(latency_tiers),
+        default=DEGRADED_LATENCY_TIER,
+        help=f"Tier cho job async khi quá tải (default: {DEGRADED_LATENCY_TIER})",
+    )
+    parser.add_argument(
+        "--degrade-queued-frames",
+        type=int,
+        default=DEGRADE_QUEUED_FRAMES,
+        help=f"Ngưỡng quá tải tính bằng mel frame đang chờ, 0 = luôn hạ (default: {DEGRADE_QUEUED_FRAMES})",
+    )
+    parser.add_argument(
+        "--guidance",
+        choices=list(guidance_presets),
+        default=DEFAULT_GUIDANCE,
+        help=f"Guidance (CFG) mặc định khi request và tier không chỉ định (default: {DEFAULT_GUIDANCE})",
+    )
+    parser.add_argument(
+        "--max-queued-audio-seconds",
+        type=float,
+        default=MAX_QUEUED_AUDIO_SECONDS,
+        help=f"Tổng audio dự đoán tối đa đang chờ + xử lý, vượt thì trả 429 (default: {MAX_QUEUED_AUDIO_SECONDS})",
+    )
+    parser.add_argument(
+        "--max-client-audio-seconds",
+        type=float,
+        default=MAX_CLIENT_AUDIO_SECONDS,
+        help=f"Tổng audio dự đoán tối đa của 1 client (default: {MAX_CLIENT_AUDIO_SECONDS})",
+    )
+    parser.add_argument(
+        "--result-ttl",
+        type=float,
+        default=RESULT_TTL,
+        help=f"Số giây giữ kết quả async chưa ai lấy (default: {RESULT_TTL})",
+    )
+    parser.add_argument(
+        "--result-cache-mb",
+        type=float,
+        default=RESULT_CACHE_MAX_MB,
+        help=f"Dung lượng tối đa cache kết quả trên đĩa, 0 = tắt (default: {RESULT_CACHE_MAX_MB})",
+    )
+    parser.add_argument(
+        "--seed-policy",
+        choices=["fixed", "request"],
+        default=RESULT_CACHE_SEED_POLICY,
+        help="request: chỉ cache request có seed, còn lại random; "
+        "fixed: request không gửi seed dùng seed cố định, output luôn giống nhau (cache được) "
+        f"(default: {RESULT_CACHE_SEED_POLICY})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=NUM_WORKERS,
+        help=f"Số worker chạy model song song, dùng chung 1 bản weights (default: {NUM_WORKERS})",
+    )
     args = parser.parse_args()
 
+    MAX_QUEUED_AUDIO_SECONDS = args.max_queued_audio_seconds
+    MAX_CLIENT_AUDIO_SECONDS = args.max_client_audio_seconds
+    RESULT_TTL = args.result_ttl
+    RESULT_CACHE_SEED_POLICY = args.seed_policy
+    if args.result_cache_mb != RESULT_CACHE_MAX_MB:
+        RESULT_CACHE_MAX_MB = args.result_cache_mb
+        result_cache = ResultCache(RESULT_CACHE_DIR, int(RESULT_CACHE_MAX_MB * 1024 * 1024))
+    DEFAULT_LATENCY_TIER = args.latency_tier
+    DEGRADED_LATENCY_TIER = args.degraded_latency_tier
+    DEGRADE_QUEUED_FRAMES = args.degrade_queued_frames
+    DEFAULT_GUIDANCE = args.guidance
+    BATCH_WINDOW = args.batch_window_ms / 1000
+    MAX_BATCH_SIZE = args.max_batch_size
+    AGING_FRAMES_PER_SEC = args.aging_frames_per_sec
+    # --cpu-engine / --cpu-threads / --cpu-interop-threads đã đọc trước khi load model
+    start_workers(args.workers)
+
     print("\n" + "=" * 50)
     print(f"🚀 F5-TTS API Server với Queue System [Port {args.port}]")
     print("=" * 50)
     print("Endpoints:")
     print("  - GET  /health              : Kiểm tra server + stats")
     print("  - POST /tts                 : Tạo audio (sync/async) ⭐ Tự động xóa file")
-    print("  - GET  /tts/status/<id>     : Kiểm tra trạng thái request")
+    print("  - POST /tts/stream          : Stream audio theo từng đoạn (WAV/PCM)")
+    print("  - GET  /tts/status/<id>     : Kiểm tra trạng thái request (?wait=<giây> để long-poll)")
+    print("  - GET  /tts/events/<id>     : Trạng thái request qua server-sent events")
     print("  - GET  /tts/download/<file> : Download file và xóa")
     print("  - POST /tts/json            : Tạo audio (trả về JSON, DEPRECATED)")
     print("\nQueue System:")
     print("  ✅ Hỗ trợ nhiều request đồng thời")
-    print("  ✅ Xử lý tuần tự để tránh conflict")
+    worker_threads = (
+        f" ({cpu_threads_per_worker()} thread/worker, engine {CPU_ENGINE})" if str(tts_model.device) == "cpu" else ""
+    )
+    print(f"  ✅ {NUM_WORKERS} worker dùng chung 1 model{worker_threads}")
+    print(
+        f"  ✅ Dynamic batching: tối đa {MAX_BATCH_SIZE} câu/batch, cửa sổ {BATCH_WINDOW * 1000:.0f}ms"
+    )
+    print(f"  ✅ Ưu tiên câu ngắn trước (aging {AGING_FRAMES_PER_SEC:.0f} frame/s)")
+    print(
+        f"  ✅ Latency tier: mặc định '{DEFAULT_LATENCY_TIER}', job async hạ xuống '{DEGRADED_LATENCY_TIER}' "
+        f"khi backlog > {DEGRADE_QUEUED_FRAMES} frames"
+    )
+    print(f"  ✅ Guidance (CFG) mặc định: '{DEFAULT_GUIDANCE}'")
+    print(
+        f"  ✅ Admission control: tối đa {MAX_QUEUED_AUDIO_SECONDS:.0f}s audio đang chờ "
+        f"({MAX_CLIENT_AUDIO_SECONDS:.0f}s / client), quá tải trả 429 + Retry-After"
+    )
+    print(f"  ✅ Kết quả không ai lấy bị xóa sau {RESULT_TTL:.0f}s")
+    if result_cache.enabled:
+        print(
+            f"  ✅ Cache kết quả: {RESULT_CACHE_DIR} (tối đa {RESULT_CACHE_MAX_MB:.0f}MB, "
+            f"{len(result_cache.entries)} file sẵn có, seed policy '{RESULT_CACHE_SEED_POLICY}')"
+        )
     print("  ✅ Có thể dùng async mode để không chờ")
     print("\nFile Management:")
     print("  ✅ /tts endpoint: Tự động xóa file sau khi gửi")
@@ -0,0 +1,136 @@
+"""
+Phần dùng chung của các benchmark chạy thẳng trên model (không qua API):
+benchmark_latency_tiers.py, benchmark_guidance.py, benchmark_cpu_engine.py
+
+Mỗi script chỉ giữ phần riêng (tier / guidance preset / cpu engine cần so và chỉ số chất lượng của nó),
+còn đọc tham số chung, load model + warm-up, chạy và đo RTF từng câu, lưu kết quả nằm ở đây
+"""
+
+import argparse
+import json
+import os
+import time
+from statistics import mean
+
+import torch
+
+from f5_tts.api import F5TTS
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+CKPT_FILE = os.path.join(SCRIPT_DIR, "F5-TTS-Vietnamese", "model_last.pt")
+VOCAB_FILE = os.path.join(SCRIPT_DIR, "F5-TTS-Vietnamese", "config.json")
+REF_AUDIO = "ref3.mp3"
+REF_TEXT = "hiệu quả là có thể khống chế đại tiện của mục tiêu"
+SAMPLE_RATE = 24000
+
+TEST_TEXTS = [
+    "Xin chào các bạn.",
+    "Hôm nay trời đẹp quá, chúng ta cùng đi dạo công viên nhé.",
+    "Công nghệ chuyển văn bản thành giọng nói đang phát triển rất nhanh trong những năm gần đây "
+    "và được ứng dụng rộng rãi trong giáo dục, chăm sóc khách hàng và giải trí.",
+]
+
+
+def quiet(*args, **kwargs):
+    pass
+
+
+def sync():
+    if torch.cuda.is_available():
+        torch.cuda.synchronize()
+
+
+def benchmark_arg_parser(description, name, output_dir_help="Thư mục lưu wav, '' = không lưu"):
+    """Tham số chung, mỗi script thêm tham số riêng vào parser trả về"""
+    parser = argparse.ArgumentParser(description=description)
+    parser.add_argument("--repeats", type=int, default=2, help="Số lần chạy mỗi câu (default: 2)")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output-dir", default=name, help=output_dir_help)
+    parser.add_argument("--output", default=f"{name}_results.json")
+    return parser
+
+
+def load_model(**kwargs):
+    """Load model rồi warm-up (tiền xử lý giọng tham chiếu, khởi tạo kernel), trả về (model, thời gian load)"""
+    print("🟢 Đang khởi tạo F5-TTS model...")
+    load_start = time.time()
+    tts_model = F5TTS(model="F5TTS_Base", ckpt_file=CKPT_FILE, vocab_file=VOCAB_FILE, **kwargs)
+    load_time = time.time() - load_start
+
+    tts_model.infer(ref_file=REF_AUDIO, ref_text=REF_TEXT, gen_text=TEST_TEXTS[0], show_info=quiet)
+    return tts_model, load_time
+
+
+def run_texts(tts_model, label, args, texts=TEST_TEXTS, before_run=None, measure=None, **infer_kwargs):
+    """
+    Chạy mỗi câu args.repeats lần với cùng seed, đo RTF (thời gian xử lý / độ dài audio, càng nhỏ càng nhanh)
+    before_run() được gọi trước mỗi lần chạy; measure(i, text, wav, wav_path) trả về dict chỉ số riêng của script,
+    được gộp vào kết quả câu đó. wav lưu thành <output_dir>/<label>_<i>.wav nếu có output_dir
+    Trả về (kết quả từng câu, wav từng câu)
+    """
+    results = []
+    wavs = []
+    for i, text in enumerate(texts):
+        times = []
+        for _ in range(args.repeats):
+            if before_run is not None:
+                before_run()
+            sync()
+            start_time = time.time()
+            wav, sr, _ = tts_model.infer(
+                ref_file=REF_AUDIO,
+                ref_text=REF_TEXT,
+                gen_text=text,
+                show_info=quiet,
+                seed=args.seed,
+                **infer_kwargs,
+            )
+            sync()
+            times.append(time.time() - start_time)
+        wavs.append(wav)
+
+        wav_path = None
+        if args.output_dir:
+            wav_path = os.path.join(args.output_dir, f"{label}_{i}.wav")
+            tts_model.export_wav(wav, wav_path)
+
+        audio_duration = len(wav) / sr
+        processing_time = mean(times)
+        result = {
+            "text": text,
+            "text_length": len(text),
+            "audio_duration": audio_duration,
+            "processing_time": processing_time,
+            "rtf": processing_time / audio_duration,
+        }
+        extra = measure(i, text, wav, wav_path) if measure is not None else {}
+        result.update(extra)
+        results.append(result)
+
+        print(
+            f"  ✓ Câu {i + 1}: {audio_duration:.2f}s audio, {processing_time:.2f}s, RTF {result['rtf']:.3f}"
+            + "".join(f", {key} {value:.4g}" for key, value in extra.items() if isinstance(value, (int, float)))
+        )
+
+    return results, wavs
+
+
+def summarize(results, keys=()):
+    """RTF trung bình và trung bình các chỉ số riêng (avg_<key>) có trong kết quả"""
+    summary = {"avg_rtf": mean(r["rtf"] for r in results)}
+    for key in keys:
+        if key in results[0]:
+            summary[f"avg_{key}"] = mean(r[key] for r in results)
+    return summary
+
+
+def print_header(title):
+    print("\n" + "=" * 60)
+    print(f"📊 {title}")
+    print("=" * 60)
+
+
+def save_results(args, summaries, **info):
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), **info, "results": summaries}, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Đã lưu kết quả vào {args.output}")
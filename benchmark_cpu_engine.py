@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Benchmark các CPU engine (fp32, bf16, int8) của F5-TTS trên CPU, không qua API
+
+Mỗi engine load lại model rồi chạy cùng 1 bộ câu với cùng seed, đo:
+- RTF (real-time factor) = thời gian xử lý / độ dài audio sinh ra, càng nhỏ càng nhanh
+- Độ giống output fp32 của cùng câu: cosine similarity của log-mel, sai số log-mel trung bình
+- Speaker similarity (ECAPA-TDNN + WavLM, như eval của F5-TTS) so với giọng tham chiếu, nếu có --sim-ckpt
+  (tải wavlm_large_finetune.pth theo hướng dẫn trong src/f5_tts/eval/README.md)
+File wav của từng engine được lưu lại để nghe so sánh
+
+Usage:
+    python benchmark_cpu_engine.py
+    python benchmark_cpu_engine.py --engines fp32 int8 --threads 8
+    python benchmark_cpu_engine.py --sim-ckpt ckpts/wavlm_large_finetune.pth
+"""
+
+import gc
+import os
+
+import torch
+import torch.nn.functional as F
+import torchaudio
+
+from benchmark_common import (
+    REF_AUDIO,
+    SAMPLE_RATE,
+    benchmark_arg_parser,
+    load_model,
+    print_header,
+    run_texts,
+    save_results,
+    summarize,
+)
+from f5_tts.infer.utils_infer import cpu_engines, cpu_supports_bf16, latency_tiers, set_cpu_threads
+
+mel_transform = torchaudio.transforms.MelSpectrogram(
+    sample_rate=SAMPLE_RATE, n_fft=1024, win_length=1024, hop_length=256, n_mels=100
+)
+
+
+def log_mel(wav):
+    return torch.log(mel_transform(torch.as_tensor(wav, dtype=torch.float32)).clamp(min=1e-5))
+
+
+def output_similarity(wav, ref_wav):
+    """So log-mel của 2 audio cùng câu (cùng seed nên cùng độ dài): (cosine similarity, sai số tuyệt đối TB)"""
+    mel, ref_mel = log_mel(wav), log_mel(ref_wav)
+    frames = min(mel.shape[-1], ref_mel.shape[-1])
+    mel, ref_mel = mel[..., :frames], ref_mel[..., :frames]
+    cosine = F.cosine_similarity(mel.flatten(), ref_mel.flatten(), dim=0).item()
+    return cosine, (mel - ref_mel).abs().mean().item()
+
+
+class SpeakerSimilarity:
+    """Cosine similarity giữa embedding giọng của audio sinh ra và giọng tham chiếu"""
+
+    def __init__(self, ckpt_path):
+        from f5_tts.eval.ecapa_tdnn import ECAPA_TDNN_SMALL
+
+        self.model = ECAPA_TDNN_SMALL(feat_dim=1024, feat_type="wavlm_large", config_path=None)
+        state_dict = torch.load(ckpt_path, weights_only=True, map_location="cpu")
+        self.model.load_state_dict(state_dict["model"], strict=False)
+        self.model.eval()
+
+        ref_wav, sr = torchaudio.load(REF_AUDIO)
+        self.ref_embedding = self.embed(ref_wav.mean(dim=0, keepdim=True), sr)
+
+    @torch.no_grad()
+    def embed(self, wav, sr):
+        return self.model(torchaudio.functional.resample(wav, sr, 16000))
+
+    def __call__(self, wav):
+        embedding = self.embed(torch.as_tensor(wav, dtype=torch.float32).unsqueeze(0), SAMPLE_RATE)
+        return F.cosine_similarity(embedding, self.ref_embedding)[0].item()
+
+
+def run_engine(engine, args, reference_wavs, speaker_similarity):
+    """Load model với 1 engine, chạy toàn bộ câu test, trả về RTF và độ giống output fp32"""
+    print(f"\n⚡ Engine: {engine}")
+    tts_model, load_time = load_model(device="cpu", cpu_engine=engine)
+
+    def measure(i, text, wav, wav_path):
+        extra = {}
+        if reference_wavs is not None:
+            extra["mel_cosine_vs_fp32"], extra["mel_l1_vs_fp32"] = output_similarity(wav, reference_wavs[i])
+        if speaker_similarity is not None:
+            extra["speaker_sim"] = speaker_similarity(wav)
+        return extra
+
+    results, wavs = run_texts(tts_model, engine, args, measure=measure, latency_tier=args.latency_tier)
+
+    del tts_model
+    gc.collect()
+
+    summary = {
+        "engine": engine,
+        "load_time": load_time,
+        **summarize(results, ("mel_cosine_vs_fp32", "mel_l1_vs_fp32", "speaker_sim")),
+        "results": results,
+    }
+    return summary, wavs
+
+
+def main(args):
+    # Chỉ đặt được 1 lần cho cả process, trước khi load model
+    set_cpu_threads(args.threads, args.interop_threads)
+    print(f"🧵 {torch.get_num_threads()} thread intra-op, {torch.get_num_interop_threads()} inter-op")
+    print(f"🧮 CPU hỗ trợ bf16: {'có' if cpu_supports_bf16() else 'không (engine bf16 chạy fp32)'}")
+
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+    speaker_similarity = SpeakerSimilarity(args.sim_ckpt) if args.sim_ckpt else None
+
+    # fp32 chạy trước làm mốc so sánh
+    engines = sorted(args.engines, key=lambda engine: engine != "fp32")
+    summaries = []
+    reference_wavs = None
+    for engine in engines:
+        summary, wavs = run_engine(engine, args, reference_wavs, speaker_similarity)
+        summaries.append(summary)
+        if engine == "fp32":
+            reference_wavs = wavs
+
+    base = summaries[0]
+    print_header("SO SÁNH")
+    for summary in summaries:
+        line = f"  {summary['engine']:<6} RTF {summary['avg_rtf']:.3f} ({base['avg_rtf'] / summary['avg_rtf']:.2f}x)"
+        if "avg_mel_cosine_vs_fp32" in summary:
+            line += f" | mel cosine {summary['avg_mel_cosine_vs_fp32']:.4f}, L1 {summary['avg_mel_l1_vs_fp32']:.3f}"
+        if "avg_speaker_sim" in summary:
+            delta = summary["avg_speaker_sim"] - base["avg_speaker_sim"]
+            line += f" | SIM {summary['avg_speaker_sim']:.3f} ({delta:+.3f})"
+        print(line)
+
+    save_results(
+        args,
+        summaries,
+        cpu_count=os.cpu_count(),
+        num_threads=torch.get_num_threads(),
+        bf16_supported=cpu_supports_bf16(),
+    )
+
+
+if __name__ == "__main__":
+    parser = benchmark_arg_parser("Benchmark RTF và chất lượng các CPU engine", "benchmark_cpu_engine")
+    parser.add_argument("--engines", nargs="+", default=list(cpu_engines), choices=list(cpu_engines))
+    parser.add_argument("--threads", type=int, default=None, help="Số thread intra-op (default: mặc định của torch)")
+    parser.add_argument("--interop-threads", type=int, default=None, help="Số thread inter-op")
+    parser.add_argument("--latency-tier", default=None, choices=list(latency_tiers), help="(default: quality)")
+    parser.add_argument("--sim-ckpt", default=None, help="Checkpoint WavLM ECAPA-TDNN để đo speaker similarity")
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Benchmark các guidance preset (bước nào chạy thêm forward không điều kiện của CFG) trực tiếp trên model
+
+Mỗi preset chạy cùng 1 bộ câu với cùng seed, đo:
+- RTF (real-time factor) = thời gian xử lý / độ dài audio sinh ra, càng nhỏ càng nhanh
+- Số forward của DiT mỗi câu (1 forward = 1 câu qua transformer, CFG đầy đủ = 2 forward / bước)
+- WER: nhận dạng lại audio sinh ra bằng Whisper rồi so với text gốc, càng thấp càng đọc đúng
+So với preset "full" để chọn preset cắt 25-50% forward mà không mất chất lượng, nên nghe thêm file wav đã lưu
+
+Cần jiwer (pip install jiwer, có trong extra "eval")
+
+Usage:
+    python benchmark_guidance.py
+    python benchmark_guidance.py --guidance full interval reuse2 --latency-tier balanced
+"""
+
+import os
+import string
+
+from jiwer import wer
+
+from benchmark_common import (
+    REF_AUDIO,
+    TEST_TEXTS,
+    benchmark_arg_parser,
+    load_model,
+    print_header,
+    run_texts,
+    save_results,
+    summarize,
+)
+from f5_tts.infer.utils_infer import get_guidance, guidance_presets, latency_tiers, transcribe
+
+TEXTS = TEST_TEXTS + ["Người dân thành phố Hồ Chí Minh đã quen với những cơn mưa bất chợt vào buổi chiều."]
+
+
+def normalize_words(text):
+    """Bỏ dấu câu, chữ thường, để WER chỉ tính sai từ"""
+    text = text.translate(str.maketrans(string.punctuation, " " * len(string.punctuation)))
+    return " ".join(text.lower().split())
+
+
+class ForwardCounter:
+    """Đếm số câu đi qua transformer (batch CFG gộp 2b câu tính là 2 forward mỗi câu)"""
+
+    def __init__(self, transformer):
+        self.count = 0
+        transformer.register_forward_hook(self.hook)
+
+    def hook(self, module, inputs, output):
+        self.count += output.shape[0]
+
+    def reset(self):
+        self.count = 0
+
+
+def run_guidance(tts_model, counter, guidance, args):
+    """Chạy 1 guidance preset trên toàn bộ câu test, trả về RTF, số forward và WER trung bình"""
+    preset = get_guidance(guidance)
+    print(f"\n⚡ Guidance: {guidance} {preset}")
+
+    def measure(i, text, wav, wav_path):
+        hypothesis = transcribe(wav_path, language="vi")
+        return {
+            "transcript": hypothesis,
+            "forwards": counter.count,
+            "wer": wer(normalize_words(text), normalize_words(hypothesis)),
+        }
+
+    results, _ = run_texts(
+        tts_model,
+        guidance,
+        args,
+        texts=TEXTS,
+        before_run=counter.reset,
+        measure=measure,
+        latency_tier=args.latency_tier,
+        guidance=guidance,
+    )
+    return {
+        "guidance": guidance,
+        "preset": {key: list(value) if isinstance(value, tuple) else value for key, value in preset.items()},
+        **summarize(results, ("forwards", "wer")),
+        "results": results,
+    }
+
+
+def main(args):
+    tts_model, _ = load_model()
+    counter = ForwardCounter(tts_model.ema_model.transformer)
+    os.makedirs(args.output_dir, exist_ok=True)
+
+    # Warm-up Whisper
+    transcribe(REF_AUDIO, language="vi")
+
+    summaries = [run_guidance(tts_model, counter, guidance, args) for guidance in args.guidance]
+
+    base = next((s for s in summaries if s["guidance"] == "full"), summaries[0])
+    print_header(f"SO SÁNH (tier {args.latency_tier})")
+    for summary in summaries:
+        print(
+            f"  {summary['guidance']:<16} {summary['avg_forwards']:>6.0f} forward "
+            f"({summary['avg_forwards'] / base['avg_forwards']:.0%} của {base['guidance']}) | "
+            f"RTF {summary['avg_rtf']:.3f} | WER {summary['avg_wer']:.3f} ({summary['avg_wer'] - base['avg_wer']:+.3f})"
+        )
+
+    save_results(args, summaries, device=tts_model.device)
+
+
+if __name__ == "__main__":
+    parser = benchmark_arg_parser(
+        "Benchmark RTF và WER các guidance preset",
+        "benchmark_guidance",
+        output_dir_help="Thư mục lưu wav (dùng cho ASR)",
+    )
+    parser.add_argument("--guidance", nargs="+", default=list(guidance_presets), choices=list(guidance_presets))
+    parser.add_argument("--latency-tier", default="quality", choices=list(latency_tiers))
+    args = parser.parse_args()
+    if not args.output_dir:
+        parser.error("--output-dir không được rỗng: wav sinh ra được nhận dạng lại để tính WER")
+
+    main(args)
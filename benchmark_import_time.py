@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Benchmark thời gian import khi khởi động (python -X importtime), không load model
+
+Đo cho:
+- api_server: các import của api_server.py (trước khi load model)
+- infer_cli: f5-tts_infer-cli --help (import + parse argument rồi thoát)
+- utils_infer / api: import riêng từng module
+
+Mỗi target chạy trong process mới, báo:
+- Thời gian import (tổng cumulative của các module top-level) và thời gian process
+- Các module tốn thời gian nhất
+- Thư viện nặng nào bị import (transformers, matplotlib, ... chỉ nên import khi thật sự dùng)
+
+Usage:
+    python benchmark_import_time.py
+    python benchmark_import_time.py --repeats 5 --top 15
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import time
+from pathlib import Path
+from statistics import median
+
+SCRIPT_DIR = Path(__file__).resolve().parent
+
+TARGETS = {
+    "api_server": [
+        "-c",
+        "import flask, numpy, soundfile, torch; "
+        "import f5_tts.api, f5_tts.infer.duration, f5_tts.infer.utils_infer",
+    ],
+    "infer_cli": ["-m", "f5_tts.infer.infer_cli", "--help"],
+    "utils_infer": ["-c", "import f5_tts.infer.utils_infer"],
+    "api": ["-c", "import f5_tts.api"],
+}
+
+# Thư viện chỉ cần cho ASR, vẽ spectrogram, tải từ HF hub, tiếng Trung, training
+HEAVY_MODULES = [
+    "transformers",
+    "matplotlib",
+    "huggingface_hub",
+    "vocos",
+    "jieba",
+    "pypinyin",
+    "cached_path",
+    "librosa",
+    "pydub",
+    "wandb",
+    "accelerate",
+    "datasets",
+]
+
+IMPORTTIME_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def parse_importtime(stderr):
+    """Trả về {module: (self_us, cumulative_us, depth)} từ output của -X importtime"""
+    modules = {}
+    for line in stderr.splitlines():
+        match = IMPORTTIME_LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = (int(self_us), int(cumulative_us), (len(indent) - 1) // 2)
+    return modules
+
+
+def run_target(name, args, repeats):
+    # Giống api_server.py: import f5_tts từ src/ không cần pip install
+    pythonpath = [str(SCRIPT_DIR / "src"), os.environ.get("PYTHONPATH")]
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, pythonpath))}
+    wall_times = []
+    import_times = []
+    modules = {}
+    for _ in range(repeats):
+        start_time = time.time()
+        proc = subprocess.run(
+            [sys.executable, "-X", "importtime", *args], capture_output=True, text=True, cwd=SCRIPT_DIR, env=env
+        )
+        wall_times.append(time.time() - start_time)
+        if proc.returncode != 0:
+            error = proc.stderr.strip().splitlines()[-1] if proc.stderr.strip() else f"exit code {proc.returncode}"
+            print(f"  ❌ {name}: {error}")
+            return {"target": name, "error": error}
+        modules = parse_importtime(proc.stderr)
+        import_times.append(sum(cumulative for _, cumulative, depth in modules.values() if depth == 0) / 1e6)
+
+    top_level = sorted(
+        ((module, cumulative) for module, (_, cumulative, depth) in modules.items() if depth == 0),
+        key=lambda item: item[1],
+        reverse=True,
+    )
+    heavy = [module for module in HEAVY_MODULES if module in modules]
+    return {
+        "target": name,
+        "wall_time": median(wall_times),
+        "import_time": median(import_times),
+        "num_modules": len(modules),
+        "top_modules": [{"module": module, "cumulative_s": us / 1e6} for module, us in top_level],
+        "heavy_modules_imported": heavy,
+    }
+
+
+def main(args):
+    print("=" * 60)
+    print("⏱️  BENCHMARK THỜI GIAN IMPORT")
+    print("=" * 60)
+
+    summaries = []
+    for name in args.targets:
+        print(f"\n⚡ {name} ({args.repeats} lần)")
+        summary = run_target(name, TARGETS[name], args.repeats)
+        summaries.append(summary)
+        if "error" in summary:
+            continue
+        print(
+            f"  ✓ Import: {summary['import_time']:.2f}s | process: {summary['wall_time']:.2f}s | "
+            f"{summary['num_modules']} module"
+        )
+        for item in summary["top_modules"][: args.top]:
+            print(f"     {item['cumulative_s']:7.3f}s  {item['module']}")
+        heavy = summary["heavy_modules_imported"]
+        print(f"  📦 Thư viện nặng đã import: {', '.join(heavy) if heavy else 'không có'}")
+
+    for summary in summaries:
+        if "top_modules" in summary:
+            summary["top_modules"] = summary["top_modules"][: args.top]
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "python": sys.version, "results": summaries}, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Đã lưu kết quả vào {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark thời gian import khi khởi động")
+    parser.add_argument("--targets", nargs="+", default=list(TARGETS), choices=list(TARGETS))
+    parser.add_argument("--repeats", type=int, default=3, help="Số lần chạy mỗi target, lấy median (default: 3)")
+    parser.add_argument("--top", type=int, default=10, help="Số module chậm nhất hiển thị (default: 10)")
+    parser.add_argument("--output", default="benchmark_import_time_results.json")
+    args = parser.parse_args()
+
+    main(args)
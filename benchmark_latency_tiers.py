@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Benchmark các latency tier (số bước ODE + solver) trực tiếp trên model, không qua API
+
+Mỗi tier chạy cùng 1 bộ câu với cùng seed, đo:
+- RTF (real-time factor) = thời gian xử lý / độ dài audio sinh ra, càng nhỏ càng nhanh
+- Số lần gọi DiT mỗi câu (euler: 1 lần / bước, midpoint: 2 lần / bước)
+File wav của từng tier được lưu lại để nghe so sánh chất lượng
+
+Usage:
+    python benchmark_latency_tiers.py
+    python benchmark_latency_tiers.py --tiers fast balanced_midpoint quality --repeats 3
+"""
+
+import os
+
+from benchmark_common import benchmark_arg_parser, load_model, print_header, run_texts, save_results, summarize
+from f5_tts.infer.utils_infer import get_latency_tier, latency_tiers
+
+# Số lần gọi DiT mỗi bước của các solver bước cố định
+EVALS_PER_STEP = {"euler": 1, "midpoint": 2, "rk4": 4}
+
+
+def run_tier(tts_model, tier, args):
+    """Chạy 1 tier trên toàn bộ câu test, trả về RTF trung bình"""
+    nfe_step, ode_method = get_latency_tier(tier)
+    print(f"\n⚡ Tier: {tier} ({ode_method}, {nfe_step} bước)")
+
+    results, _ = run_texts(tts_model, tier, args, latency_tier=tier)
+    return {
+        "tier": tier,
+        "nfe_step": nfe_step,
+        "ode_method": ode_method,
+        "dit_calls": nfe_step * EVALS_PER_STEP.get(ode_method, 1),
+        **summarize(results),
+        "results": results,
+    }
+
+
+def main(args):
+    tts_model, _ = load_model()
+    if args.output_dir:
+        os.makedirs(args.output_dir, exist_ok=True)
+
+    summaries = [run_tier(tts_model, tier, args) for tier in args.tiers]
+
+    base = next((s for s in summaries if s["tier"] == "quality"), summaries[0])
+    print_header("SO SÁNH")
+    for summary in summaries:
+        print(
+            f"  {summary['tier']:<20} {summary['ode_method']:<9} {summary['nfe_step']:>3} bước, "
+            f"{summary['dit_calls']:>3} lần gọi DiT | RTF {summary['avg_rtf']:.3f} "
+            f"({base['avg_rtf'] / summary['avg_rtf']:.2f}x so với {base['tier']})"
+        )
+
+    save_results(args, summaries, device=tts_model.device)
+
+
+if __name__ == "__main__":
+    parser = benchmark_arg_parser("Benchmark RTF các latency tier", "benchmark_latency_tiers")
+    parser.add_argument("--tiers", nargs="+", default=list(latency_tiers), choices=list(latency_tiers))
+    args = parser.parse_args()
+
+    main(args)
@@ -0,0 +1,248 @@
+#!/usr/bin/env python3
+"""
+Benchmark load balancer với các backend giả lập (stub) chạy local
+Không cần model: mỗi stub xử lý tuần tự như api_server (1 lock), thời gian xử lý tỉ lệ với độ dài text
+
+So sánh routing round_robin, least_outstanding và least_work:
+- Độ trễ p50/p95/p99, throughput
+- Phân bố request giữa các backend
+- Loại/nhận lại backend khi 1 stub bị tắt giữa chừng (--kill-backend)
+
+Usage:
+    python benchmark_load_balancer.py
+    python benchmark_load_balancer.py --requests 200 --concurrency 16 --kill-backend
+"""
+
+import aiohttp
+from aiohttp import web
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import random
+import time
+from statistics import mean
+
+import load_balancer
+from f5_tts.infer.duration import estimate_gen_frames
+
+HOST = "127.0.0.1"
+
+# Giọng mặc định giả lập, stub báo qua /health giống api_server
+DEFAULT_VOICE = {"ref_frames": 400, "ref_text": "hiệu quả là có thể khống chế đại tiện của mục tiêu"}
+
+SHORT_TEXT = "Xin chào các bạn."
+LONG_TEXT = (
+    "Hôm nay chúng ta sẽ cùng tìm hiểu về công nghệ chuyển văn bản thành giọng nói, "
+    "một lĩnh vực đang phát triển rất nhanh trong những năm gần đây và được ứng dụng rộng rãi."
+)
+
+
+class StubBackend:
+    """Backend giả lập api_server: xử lý tuần tự, báo in_flight / in_flight_frames qua /health"""
+
+    def __init__(self, port, seconds_per_frame, base_latency=0.01):
+        self.port = port
+        self.seconds_per_frame = seconds_per_frame
+        self.base_latency = base_latency
+        self.lock = asyncio.Lock()
+        self.stats = {"total_requests": 0, "completed_requests": 0, "in_flight": 0, "in_flight_frames": 0}
+        self.runner = None
+
+    @property
+    def url(self):
+        return f"http://{HOST}:{self.port}"
+
+    async def handle_health(self, request):
+        return web.json_response({"status": "ok", "stats": self.stats, "default_voice": DEFAULT_VOICE})
+
+    async def handle_tts(self, request):
+        data = await request.json()
+        frames = estimate_gen_frames(DEFAULT_VOICE["ref_frames"], DEFAULT_VOICE["ref_text"], data["text"])
+        self.stats["total_requests"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["in_flight_frames"] += frames
+        try:
+            async with self.lock:
+                await asyncio.sleep(self.base_latency + self.seconds_per_frame * frames)
+        finally:
+            self.stats["in_flight"] -= 1
+            self.stats["in_flight_frames"] -= frames
+        self.stats["completed_requests"] += 1
+        # Audio giả: 1KB / ký tự
+        return web.Response(body=b"\0" * (1024 * len(data["text"])), content_type="audio/wav")
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/health", self.handle_health)
+        app.router.add_post("/tts", self.handle_tts)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+        await web.TCPSite(self.runner, HOST, self.port).start()
+
+    async def stop(self):
+        if self.runner is not None:
+            await self.runner.cleanup()
+            self.runner = None
+
+
+async def call_tts(session, url, text):
+    start_time = time.time()
+    try:
+        async with session.post(f"{url}/tts", json={"text": text}) as resp:
+            body = await resp.read()
+            return {
+                "success": resp.status == 200,
+                "status_code": resp.status,
+                "duration": time.time() - start_time,
+                "response_size": len(body),
+                "long": text == LONG_TEXT,
+            }
+    except Exception as e:
+        return {
+            "success": False,
+            "status_code": 0,
+            "duration": time.time() - start_time,
+            "response_size": 0,
+            "long": text == LONG_TEXT,
+            "error": str(e),
+        }
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return 0.0
+    k = min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))
+    return values[k]
+
+
+async def run_routing(routing, args):
+    """Chạy 1 lượt benchmark với 1 thuật toán routing"""
+    random.seed(args.seed)
+    # Backend không đồng đều: server cuối chậm gấp đôi (VD: GPU yếu hơn)
+    backends = [
+        StubBackend(args.backend_port + i, args.seconds_per_frame * (2 if i == args.backends - 1 else 1))
+        for i in range(args.backends)
+    ]
+    for backend in backends:
+        await backend.start()
+
+    load_balancer.HEALTH_CHECK_INTERVAL = 0.2
+    lb_app = load_balancer.create_app([backend.url for backend in backends], routing=routing)
+    lb_runner = web.AppRunner(lb_app, access_log=None)
+    await lb_runner.setup()
+    await web.TCPSite(lb_runner, HOST, args.lb_port).start()
+    lb_url = f"http://{HOST}:{args.lb_port}"
+
+    texts = [LONG_TEXT if random.random() < args.long_ratio else SHORT_TEXT for _ in range(args.requests)]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def worker(session, text):
+        async with semaphore:
+            return await call_tts(session, lb_url, text)
+
+    async def kill_and_restore():
+        # Tắt 1 backend giữa chừng rồi bật lại, kiểm tra loại/nhận lại
+        await asyncio.sleep(args.kill_after)
+        await backends[0].stop()
+        await asyncio.sleep(args.kill_for)
+        await backends[0].start()
+
+    print(f"\n⚡ Routing: {routing} ({args.requests} requests, {args.concurrency} đồng thời)")
+    start_time = time.time()
+    # Log của load balancer mỗi request rất dài, tắt đi khi benchmark
+    with contextlib.redirect_stdout(io.StringIO()):
+        async with aiohttp.ClientSession() as session:
+            killer = asyncio.create_task(kill_and_restore()) if args.kill_backend else None
+            results = await asyncio.gather(*(worker(session, text) for text in texts))
+            if killer is not None:
+                await killer
+    total_time = time.time() - start_time
+
+    balancer = lb_app["balancer"]
+    distribution = {backend.url: backend.requests for backend in balancer.backends}
+
+    await lb_runner.cleanup()
+    for backend in backends:
+        await backend.stop()
+
+    successful = [r for r in results if r["success"]]
+    durations = [r["duration"] for r in successful]
+    short_durations = [r["duration"] for r in successful if not r["long"]]
+    summary = {
+        "routing": routing,
+        "total_time": total_time,
+        "total_requests": len(results),
+        "successful": len(successful),
+        "failed": len(results) - len(successful),
+        "throughput": len(successful) / total_time if total_time > 0 else 0,
+        "avg_latency": mean(durations) if durations else 0,
+        "p50_latency": percentile(durations, 50),
+        "p95_latency": percentile(durations, 95),
+        "p99_latency": percentile(durations, 99),
+        "short_p95_latency": percentile(short_durations, 95),
+        "distribution": distribution,
+    }
+
+    print(f"  ✓ Thành công: {summary['successful']}/{summary['total_requests']}")
+    print(f"  ⏱️  Tổng thời gian: {total_time:.2f}s, throughput: {summary['throughput']:.1f} req/s")
+    print(
+        f"  📊 Latency avg {summary['avg_latency']:.3f}s | p50 {summary['p50_latency']:.3f}s | "
+        f"p95 {summary['p95_latency']:.3f}s | p99 {summary['p99_latency']:.3f}s"
+    )
+    print(f"  📊 Câu ngắn p95: {summary['short_p95_latency']:.3f}s")
+    for url, count in distribution.items():
+        print(f"     {url}: {count} requests")
+
+    return summary
+
+
+async def main(args):
+    summaries = []
+    for routing in args.routing:
+        summaries.append(await run_routing(routing, args))
+
+    if len(summaries) > 1:
+        base = summaries[0]
+        print("\n" + "=" * 60)
+        print("📊 SO SÁNH")
+        print("=" * 60)
+        for summary in summaries:
+            print(
+                f"  {summary['routing']:<20} p95 {summary['p95_latency']:.3f}s "
+                f"({base['p95_latency'] / summary['p95_latency']:.2f}x so với {base['routing']}), "
+                f"throughput {summary['throughput']:.1f} req/s"
+            )
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({"config": vars(args), "results": summaries}, f, indent=2, ensure_ascii=False)
+    print(f"\n💾 Đã lưu kết quả vào {args.output}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark load balancer với backend giả lập")
+    parser.add_argument("--backends", type=int, default=3, help="Số backend giả lập (default: 3)")
+    parser.add_argument("--requests", type=int, default=120, help="Tổng số request (default: 120)")
+    parser.add_argument("--concurrency", type=int, default=12, help="Số request đồng thời (default: 12)")
+    parser.add_argument("--long-ratio", type=float, default=0.3, help="Tỉ lệ câu dài (default: 0.3)")
+    parser.add_argument(
+        "--seconds-per-frame", type=float, default=0.0001, help="Thời gian xử lý mỗi mel frame (default: 0.0001)"
+    )
+    parser.add_argument(
+        "--routing",
+        nargs="+",
+        default=["round_robin", "least_outstanding", "least_work"],
+        choices=load_balancer.ROUTINGS,
+    )
+    parser.add_argument("--kill-backend", action="store_true", help="Tắt backend đầu tiên giữa chừng rồi bật lại")
+    parser.add_argument("--kill-after", type=float, default=0.5, help="Tắt backend sau bao nhiêu giây")
+    parser.add_argument("--kill-for", type=float, default=1.0, help="Tắt backend trong bao nhiêu giây")
+    parser.add_argument("--backend-port", type=int, default=15000)
+    parser.add_argument("--lb-port", type=int, default=18080)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default="benchmark_load_balancer_results.json")
+    args = parser.parse_args()
+
+    asyncio.run(main(args))
@@ -1,31 +1,33 @@
 #!/usr/bin/env python3
 """
-Load Balancer cho F5-TTS Multi-Server
-Tự động phân phối requests đến các TTS servers theo thuật toán Round-Robin
+Load Balancer cho F5-TTS Multi-Server (asyncio / aiohttp)
+Tự động phân phối requests đến các TTS servers:
+- Chọn server có ít việc nhất: tổng mel frame dự đoán của các request đang xử lý (least_work),
+  tính bằng cùng công thức với infer_batch_process, hoặc số request (least_outstanding)
+  dựa trên số request đang forward + số in-flight mà mỗi api_server báo qua /health
+- Giữ kết nối keep-alive tới các backend (connection pool), không mở kết nối mới mỗi request
+- Health check chạy nền: server lỗi bị loại khỏi vòng chọn, tự động nhận lại khi khỏe
+- Relay response theo từng chunk, không buffer toàn bộ file audio
 
 Usage:
     python load_balancer.py --port 8080
+    python load_balancer.py --port 8080 --routing round_robin
 """
 
-from flask import Flask, request, jsonify, send_file, Response
-import requests
-import itertools
+import aiohttp
+from aiohttp import web
 import argparse
-import time
+import asyncio
+import itertools
+import json
 import sys
-from threading import Lock
-import logging
-
-app = Flask(__name__)
-
-# Tắt log mặc định của Flask và Werkzeug
-log = logging.getLogger("werkzeug")
-log.setLevel(logging.ERROR)  # Chỉ hiển thị errors
+import time
+from pathlib import Path
 
-# Tắt Flask development server warning
-import os
+# Thêm đường dẫn src vào sys.path (chỉ dùng phần dự đoán độ dài, không cần torch)
+sys.path.append(str(Path(__file__).resolve().parent / "src"))
 
-os.environ["FLASK_ENV"] = "production"
+from f5_tts.infer.duration import estimate_gen_frames
 
 # ===== CẤU HÌNH =====
 # Danh sách các TTS servers backend
@@ -35,215 +37,398 @@ BACKEND_SERVERS = [
     # "http://localhost:5002",
 ]
 
-# Round-robin iterator
-server_cycle = itertools.cycle(BACKEND_SERVERS)
-server_lock = Lock()
-
-# Statistics
-stats = {
-    "total_requests": 0,
-    "successful_requests": 0,
-    "failed_requests": 0,
-    "server_stats": {
-        server: {"requests": 0, "failures": 0} for server in BACKEND_SERVERS
-    },
+# Thuật toán chọn server: "least_work", "least_outstanding" hoặc "round_robin"
+ROUTING = "least_work"
+ROUTINGS = ["least_work", "least_outstanding", "round_robin"]
+
+# Health check nền
+HEALTH_CHECK_INTERVAL = 2.0  # giây
+HEALTH_CHECK_TIMEOUT = 2.0  # giây
+EJECT_AFTER_FAILURES = 2  # số lần lỗi liên tiếp trước khi loại server
+
+# Timeout giữa 2 lần nhận dữ liệu từ backend (không giới hạn tổng thời gian stream)
+REQUEST_TIMEOUT = 120
+
+# Connection pool
+MAX_CONNECTIONS_PER_BACKEND = 64
+KEEPALIVE_TIMEOUT = 60
+
+# Header hop-by-hop / độ dài không relay, aiohttp tự dùng chunked transfer
+EXCLUDED_HEADERS = {
+    "content-length",
+    "transfer-encoding",
+    "connection",
+    "keep-alive",
+    "content-encoding",
+    "host",
 }
-stats_lock = Lock()
 
 
-def get_next_server():
-    """Lấy server tiếp theo theo thuật toán Round-Robin"""
-    with server_lock:
-        return next(server_cycle)
+class BackendBusy(Exception):
+    """Backend trả 429 (quá tải, chưa nhận request), có thể thử server khác"""
+
+    def __init__(self, body, retry_after):
+        super().__init__(f"HTTP 429, retry after {retry_after}s")
+        self.body = body
+        self.retry_after = retry_after
+
+
+class Backend:
+    """Trạng thái 1 backend server"""
+
+    def __init__(self, url):
+        self.url = url
+        self.healthy = True
+        self.outstanding = 0  # số request LB đang forward tới server này
+        self.reported_in_flight = 0  # số in-flight server báo qua /health (gồm cả request không qua LB)
+        self.outstanding_frames = 0  # tổng frame dự đoán của các request LB đang forward
+        self.reported_frames = 0  # tổng frame dự đoán server báo qua /health
+        self.default_voice = None  # {"ref_frames", "ref_text"} của giọng mặc định trên server
+        self.consecutive_failures = 0
+        self.last_health = None
+        self.requests = 0
+        self.failures = 0
+
+    def load(self):
+        # Số request LB vừa gửi có thể chưa kịp hiện trong /health, nên lấy giá trị lớn hơn
+        return max(self.outstanding, self.reported_in_flight)
+
+    def work(self):
+        return max(self.outstanding_frames, self.reported_frames)
+
+    def predict_frames(self, request_data):
+        """Số mel frame request sẽ sinh ra trên server này (cùng công thức với infer_batch_process)"""
+        text = request_data.get("text", "")
+        if not self.default_voice:
+            # Server cũ chưa báo giọng mặc định: dùng số byte làm đơn vị
+            return len(text.encode("utf-8"))
+        return estimate_gen_frames(
+            self.default_voice["ref_frames"],
+            request_data.get("ref_text") or self.default_voice["ref_text"],
+            text,
+            speed=request_data.get("speed", 1.0),
+        )
 
+    def mark_success(self):
+        self.consecutive_failures = 0
+        if not self.healthy:
+            self.healthy = True
+            print(f"💚 Backend {self.url} đã khỏe lại, nhận request trở lại", flush=True)
+
+    def mark_failure(self, reason):
+        self.consecutive_failures += 1
+        if self.healthy and self.consecutive_failures >= EJECT_AFTER_FAILURES:
+            self.healthy = False
+            print(f"💔 Loại backend {self.url} khỏi vòng chọn: {reason}", flush=True)
+
+    def to_dict(self):
+        return {
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "reported_in_flight": self.reported_in_flight,
+            "outstanding_frames": self.outstanding_frames,
+            "reported_frames": self.reported_frames,
+            "consecutive_failures": self.consecutive_failures,
+            "requests": self.requests,
+            "failures": self.failures,
+            "last_health": self.last_health,
+        }
 
-def update_stats(server, success):
-    """Cập nhật thống kê"""
-    with stats_lock:
-        stats["total_requests"] += 1
-        if success:
-            stats["successful_requests"] += 1
-        else:
-            stats["failed_requests"] += 1
 
-        stats["server_stats"][server]["requests"] += 1
-        if not success:
-            stats["server_stats"][server]["failures"] += 1
+class LoadBalancer:
+    def __init__(self, backend_servers, routing=ROUTING):
+        assert routing in ROUTINGS, f"Unknown routing: {routing}"
+        self.backends = [Backend(url) for url in backend_servers]
+        self.routing = routing
+        self.rr_cycle = itertools.cycle(range(len(self.backends)))
+        self.session = None
+        self.health_task = None
+
+        # Statistics
+        self.stats = {
+            "total_requests": 0,
+            "successful_requests": 0,
+            "failed_requests": 0,
+        }
 
+    # ----- vòng đời -----
 
-@app.route("/health", methods=["GET"])
-def health():
-    """Health check endpoint"""
-    # Kiểm tra health của tất cả backend servers
-    backend_health = {}
-    for server in BACKEND_SERVERS:
+    async def start(self, app=None):
+        connector = aiohttp.TCPConnector(
+            limit=0,
+            limit_per_host=MAX_CONNECTIONS_PER_BACKEND,
+            keepalive_timeout=KEEPALIVE_TIMEOUT,
+        )
+        self.session = aiohttp.ClientSession(connector=connector, auto_decompress=False)
+        await self.check_all_backends()
+        self.health_task = asyncio.create_task(self.health_check_loop())
+
+    async def stop(self, app=None):
+        if self.health_task is not None:
+            self.health_task.cancel()
+            try:
+                await self.health_task
+            except asyncio.CancelledError:
+                pass
+        if self.session is not None:
+            await self.session.close()
+
+    # ----- health check -----
+
+    async def check_backend(self, backend):
         try:
-            resp = requests.get(f"{server}/health", timeout=2)
-            backend_health[server] = {
-                "status": "ok" if resp.status_code == 200 else "error",
-                "response": resp.json() if resp.status_code == 200 else None,
-            }
+            async with self.session.get(
+                f"{backend.url}/health",
+                timeout=aiohttp.ClientTimeout(total=HEALTH_CHECK_TIMEOUT),
+            ) as resp:
+                if resp.status != 200:
+                    raise RuntimeError(f"HTTP {resp.status}")
+                data = await resp.json()
         except Exception as e:
-            backend_health[server] = {
-                "status": "error",
-                "error": str(e),
-            }
-
-    return jsonify(
-        {
-            "status": "ok",
-            "load_balancer": "F5-TTS Load Balancer",
-            "backend_servers": len(BACKEND_SERVERS),
-            "backends": backend_health,
-            "stats": stats,
-        }
-    )
-
-
-@app.route("/tts", methods=["POST"])
-def tts():
-    """
-    TTS endpoint - Forward request đến backend server
-    Tự động chọn server theo Round-Robin
-    """
-    # Lấy server tiếp theo
-    server = get_next_server()
-
-    # Lấy thông tin request
-    request_data = request.get_json()
-    text_preview = (
-        request_data.get("text", "")[:50] + "..."
-        if len(request_data.get("text", "")) > 50
-        else request_data.get("text", "")
-    )
+            backend.last_health = {"status": "error", "error": str(e) or type(e).__name__}
+            backend.mark_failure(backend.last_health["error"])
+            return
 
-    print(f"\n{'='*60}", flush=True)
-    print(f"🔀 LOAD BALANCER - Forwarding Request", flush=True)
-    print(f"{'='*60}", flush=True)
-    print(f"📝 Text: {text_preview}", flush=True)
-    print(f"🎯 Target Server: {server}", flush=True)
-    print(f"⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
-    print(f"{'='*60}\n", flush=True)
-
-    request_start = time.time()
-
-    try:
-        # Forward request đến backend server
-        # Giữ nguyên tất cả headers và body
-        resp = requests.post(
-            f"{server}/tts",
-            json=request_data,
-            headers={key: value for key, value in request.headers if key != "Host"},
-            timeout=120,  # 2 phút timeout
+        backend_stats = data.get("stats", {})
+        backend.reported_in_flight = backend_stats.get(
+            "in_flight", backend_stats.get("queue_size", 0) + int(bool(backend_stats.get("processing")))
         )
+        backend.reported_frames = backend_stats.get("in_flight_frames", 0)
+        backend.default_voice = data.get("default_voice")
+        backend.last_health = {"status": "ok", "response": data}
+        backend.mark_success()
+
+    async def check_all_backends(self):
+        await asyncio.gather(*(self.check_backend(backend) for backend in self.backends))
+
+    async def health_check_loop(self):
+        while True:
+            await asyncio.sleep(HEALTH_CHECK_INTERVAL)
+            await self.check_all_backends()
+
+    # ----- chọn server -----
+
+    def pick_backend(self, request_data, exclude=()):
+        candidates = [backend for backend in self.backends if backend.healthy and backend not in exclude]
+        if not candidates:
+            # Tất cả đều lỗi: vẫn thử, biết đâu server vừa khỏe lại
+            candidates = [backend for backend in self.backends if backend not in exclude]
+
+        if self.routing == "round_robin":
+            while True:
+                backend = self.backends[next(self.rr_cycle)]
+                if backend in candidates:
+                    return backend
+
+        # Bắt đầu từ vị trí round-robin để chia đều khi các server tải bằng nhau
+        start = next(self.rr_cycle)
+        ordered = [backend for backend in self.backends[start:] + self.backends[:start] if backend in candidates]
+        if self.routing == "least_work":
+            # Cân bằng tổng frame: server xong sớm nhất sau khi nhận thêm request này
+            return min(ordered, key=lambda backend: backend.work() + backend.predict_frames(request_data))
+        return min(ordered, key=Backend.load)
+
+    def update_stats(self, backend, success):
+        self.stats["total_requests"] += 1
+        if success:
+            self.stats["successful_requests"] += 1
+        else:
+            self.stats["failed_requests"] += 1
 
-        request_duration = time.time() - request_start
-
-        # Kiểm tra response type
-        content_type = resp.headers.get("Content-Type", "")
-
-        if "application/json" in content_type:
-            # JSON response
-            success = resp.status_code == 200
-            update_stats(server, success)
-
-            print(
-                f"{'✅' if success else '❌'} Response from {server}: HTTP {resp.status_code} ({request_duration:.1f}s)\n",
-                flush=True,
-            )
+        backend.requests += 1
+        if not success:
+            backend.failures += 1
 
-            return jsonify(resp.json()), resp.status_code
-        else:
-            # File response (audio)
-            success = resp.status_code == 200
-            file_size = len(resp.content) / 1024 / 1024  # MB
-            update_stats(server, success)
+    # ----- forward -----
 
+    async def forward(self, request, path, label):
+        """
+        Forward request đến backend được chọn, relay response theo từng chunk
+        Nếu không kết nối được hoặc backend quá tải (429, chưa nhận request) thì thử server khác
+        """
+        try:
+            request_data = await request.json()
+        except Exception:
+            request_data = None
+        if not isinstance(request_data, dict):
+            return web.json_response({"error": "Invalid JSON body"}, status=400)
+
+        text = request_data.get("text", "")
+        text_preview = text[:50] + "..." if len(text) > 50 else text
+
+        tried = set()
+        busy = None
+        while True:
+            backend = self.pick_backend(request_data, exclude=tried)
+
+            print(f"\n{'='*60}", flush=True)
+            print(f"🔀 LOAD BALANCER - Forwarding {label}", flush=True)
+            print(f"{'='*60}", flush=True)
+            print(f"📝 Text: {text_preview}", flush=True)
             print(
-                f"✅ Response from {server}: HTTP {resp.status_code} ({request_duration:.1f}s, {file_size:.1f}MB)\n",
+                f"🎯 Target Server: {backend.url} (load: {backend.load()} requests, {backend.work()} frames)",
                 flush=True,
             )
-
-            return Response(
-                resp.content,
-                status=resp.status_code,
-                headers=dict(resp.headers),
-            )
-
-    except Exception as e:
-        request_duration = time.time() - request_start
-        print(
-            f"❌ Error forwarding to {server}: {e} ({request_duration:.1f}s)\n",
-            flush=True,
-        )
-        update_stats(server, False)
-        return (
-            jsonify(
+            print(f"⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}", flush=True)
+            print(f"{'='*60}\n", flush=True)
+
+            try:
+                can_retry = len(tried) + 1 < len(self.backends)
+                return await self.forward_to(backend, request, path, request_data, can_retry)
+            except BackendBusy as e:
+                print(f"🚫 {backend.url} overloaded ({e}), trying another server\n", flush=True)
+                tried.add(backend)
+                if busy is None or e.retry_after < busy.retry_after:
+                    busy = e
+            except aiohttp.ClientConnectorError as e:
+                error = str(e) or type(e).__name__
+                print(f"❌ Cannot connect to {backend.url}: {error}\n", flush=True)
+                backend.mark_failure(error)
+                self.update_stats(backend, False)
+                tried.add(backend)
+                if len(tried) == len(self.backends):
+                    if busy is not None:
+                        # Các server còn lại đều quá tải: trả 429 với Retry-After ngắn nhất
+                        return web.Response(
+                            body=busy.body,
+                            status=429,
+                            content_type="application/json",
+                            headers={"Retry-After": str(busy.retry_after)},
+                        )
+                    return web.json_response(
+                        {
+                            "error": "Backend server error",
+                            "server": backend.url,
+                            "message": error,
+                        },
+                        status=502,
+                    )
+
+    async def forward_to(self, backend, request, path, request_data, can_retry=False):
+        request_start = time.time()
+        frames = backend.predict_frames(request_data)
+        backend.outstanding += 1
+        backend.outstanding_frames += frames
+        success = False
+        response = None
+        try:
+            async with self.session.post(
+                f"{backend.url}{path}",
+                json=request_data,
+                headers={
+                    **{
+                        key: value
+                        for key, value in request.headers.items()
+                        if key.lower() not in EXCLUDED_HEADERS and key.lower() != "content-type"
+                    },
+                    # Backend nhận diện client theo IP gốc (chia công bằng, giới hạn theo client)
+                    "X-Forwarded-For": ", ".join(
+                        filter(None, [request.headers.get("X-Forwarded-For"), request.remote])
+                    ),
+                },
+                timeout=aiohttp.ClientTimeout(total=None, sock_connect=HEALTH_CHECK_TIMEOUT, sock_read=REQUEST_TIMEOUT),
+            ) as resp:
+                backend.mark_success()
+
+                if resp.status == 429 and can_retry:
+                    body = await resp.read()
+                    try:
+                        retry_after = int(resp.headers.get("Retry-After", 1))
+                    except ValueError:
+                        retry_after = 1
+                    raise BackendBusy(body, retry_after)
+
+                response = web.StreamResponse(
+                    status=resp.status,
+                    headers={
+                        key: value for key, value in resp.headers.items() if key.lower() not in EXCLUDED_HEADERS
+                    },
+                )
+                await response.prepare(request)
+
+                total_bytes = 0
+                async for chunk in resp.content.iter_any():
+                    total_bytes += len(chunk)
+                    await response.write(chunk)
+                await response.write_eof()
+
+                success = resp.status == 200
+                request_duration = time.time() - request_start
+                print(
+                    f"{'✅' if success else '❌'} Response from {backend.url}: HTTP {resp.status} "
+                    f"({request_duration:.1f}s, {total_bytes / 1024 / 1024:.1f}MB)\n",
+                    flush=True,
+                )
+                self.update_stats(backend, success)
+                return response
+
+        except aiohttp.ClientConnectorError:
+            raise
+        except (aiohttp.ClientConnectionError, asyncio.TimeoutError) as e:
+            request_duration = time.time() - request_start
+            error = str(e) or type(e).__name__
+            print(f"❌ Error forwarding to {backend.url}: {error} ({request_duration:.1f}s)\n", flush=True)
+            backend.mark_failure(error)
+            self.update_stats(backend, False)
+            if response is not None and response.prepared:
+                # Header đã gửi, chỉ có thể cắt stream
+                return response
+            return web.json_response(
                 {
                     "error": "Backend server error",
-                    "server": server,
-                    "message": str(e),
-                }
-            ),
-            500,
+                    "server": backend.url,
+                    "message": error,
+                },
+                status=502,
+            )
+        finally:
+            backend.outstanding -= 1
+            backend.outstanding_frames -= frames
+
+    # ----- endpoints -----
+
+    async def handle_health(self, request):
+        """Health check endpoint, trả về trạng thái backend từ health check nền"""
+        return web.json_response(
+            {
+                "status": "ok",
+                "load_balancer": "F5-TTS Load Balancer",
+                "routing": self.routing,
+                "backend_servers": len(self.backends),
+                "healthy_backends": sum(backend.healthy for backend in self.backends),
+                "backends": {backend.url: backend.to_dict() for backend in self.backends},
+                "stats": self.stats,
+            },
+            dumps=lambda obj: json.dumps(obj, ensure_ascii=False),
         )
 
+    async def handle_tts(self, request):
+        """TTS endpoint - Forward request đến backend server"""
+        return await self.forward(request, "/tts", "Request")
 
-@app.route("/tts/json", methods=["POST"])
-def tts_json():
-    """TTS JSON endpoint - Forward request đến backend server"""
-    server = get_next_server()
+    async def handle_tts_json(self, request):
+        """TTS JSON endpoint - Forward request đến backend server"""
+        return await self.forward(request, "/tts/json", "JSON Request")
 
-    # Lấy thông tin request
-    request_data = request.get_json()
-    text_preview = (
-        request_data.get("text", "")[:50] + "..."
-        if len(request_data.get("text", "")) > 50
-        else request_data.get("text", "")
-    )
+    async def handle_tts_stream(self, request):
+        """TTS streaming endpoint - relay từng chunk audio ngay khi nhận được"""
+        return await self.forward(request, "/tts/stream", "Stream Request")
 
-    print(f"\n{'='*60}")
-    print(f"🔀 LOAD BALANCER - Forwarding JSON Request")
-    print(f"{'='*60}")
-    print(f"📝 Text: {text_preview}")
-    print(f"🎯 Target Server: {server}")
-    print(f"⏰ Time: {time.strftime('%Y-%m-%d %H:%M:%S')}")
-    print(f"{'='*60}\n")
-
-    request_start = time.time()
-
-    try:
-        resp = requests.post(
-            f"{server}/tts/json",
-            json=request_data,
-            headers={key: value for key, value in request.headers if key != "Host"},
-            timeout=120,
-        )
-
-        request_duration = time.time() - request_start
-        success = resp.status_code == 200
-        update_stats(server, success)
 
-        print(
-            f"{'✅' if success else '❌'} Response from {server}: HTTP {resp.status_code} ({request_duration:.1f}s)\n"
-        )
+def create_app(backend_servers=BACKEND_SERVERS, routing=ROUTING):
+    """Tạo aiohttp app (dùng cho chạy server và benchmark)"""
+    balancer = LoadBalancer(backend_servers, routing=routing)
 
-        return jsonify(resp.json()), resp.status_code
+    app = web.Application(client_max_size=16 * 1024 * 1024)
+    app["balancer"] = balancer
+    app.on_startup.append(balancer.start)
+    app.on_cleanup.append(balancer.stop)
 
-    except Exception as e:
-        request_duration = time.time() - request_start
-        print(f"❌ Error forwarding to {server}: {e} ({request_duration:.1f}s)\n")
-        update_stats(server, False)
-        return (
-            jsonify(
-                {
-                    "error": "Backend server error",
-                    "server": server,
-                    "message": str(e),
-                }
-            ),
-            500,
-        )
+    app.router.add_get("/health", balancer.handle_health)
+    app.router.add_post("/tts", balancer.handle_tts)
+    app.router.add_post("/tts/json", balancer.handle_tts_json)
+    app.router.add_post("/tts/stream", balancer.handle_tts_stream)
+    return app
 
 
 if __name__ == "__main__":
@@ -257,21 +442,31 @@ if __name__ == "__main__":
     parser.add_argument(
         "--host", type=str, default="0.0.0.0", help="Host to bind (default: 0.0.0.0)"
     )
+    parser.add_argument(
+        "--backends",
+        nargs="+",
+        default=BACKEND_SERVERS,
+        help="Danh sách backend servers (default: %(default)s)",
+    )
+    parser.add_argument(
+        "--routing",
+        choices=ROUTINGS,
+        default=ROUTING,
+        help=f"Thuật toán chọn server (default: {ROUTING})",
+    )
     args = parser.parse_args()
 
     print("\n" + "=" * 60, flush=True)
     print("🔀 F5-TTS LOAD BALANCER", flush=True)
     print("=" * 60, flush=True)
     print(f"🌐 Listening on: {args.host}:{args.port}", flush=True)
-    print(f"🖥️  Backend servers: {len(BACKEND_SERVERS)}", flush=True)
-    for i, server in enumerate(BACKEND_SERVERS, 1):
+    print(f"🖥️  Backend servers: {len(args.backends)}", flush=True)
+    for i, server in enumerate(args.backends, 1):
         print(f"   {i}. {server}", flush=True)
-    print(f"🔄 Algorithm: Round-Robin", flush=True)
+    print(f"🔄 Algorithm: {args.routing}", flush=True)
+    print(f"💓 Health check: mỗi {HEALTH_CHECK_INTERVAL:.0f}s, loại sau {EJECT_AFTER_FAILURES} lần lỗi liên tiếp", flush=True)
     print(f"📊 Log format: Mỗi request sẽ hiển thị node đang xử lý", flush=True)
     print("=" * 60 + "\n", flush=True)
     print("🚀 Load Balancer đã sẵn sàng! Đang chờ requests...\n", flush=True)
 
-    # Chạy Flask với log_level ERROR để tắt log mặc định
-    app.run(
-        host=args.host, port=args.port, debug=False, threaded=True, use_reloader=False
-    )
+    web.run_app(create_app(args.backends, args.routing), host=args.host, port=args.port, print=None, access_log=None)
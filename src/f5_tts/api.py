@@ -17,20 +17,23 @@ except ImportError:
 
 import soundfile as sf
 import tqdm
-from cached_path import cached_path
-from omegaconf import OmegaConf
 
 from f5_tts.infer.utils_infer import (
+    chunk_text,
+    get_latency_tier,
+    get_tier_guidance,
+    infer_batch_process,
+    infer_batch_texts,
     load_model,
     load_vocoder,
     transcribe,
-    preprocess_ref_audio_text,
     infer_process,
     remove_silence_for_generated_wav,
     save_spectrogram,
+    set_cpu_threads,
+    VoiceCache,
 )
 from f5_tts.model import DiT, UNetT  # noqa: F401. used for config
-from f5_tts.model.utils import seed_everything
 
 
 class F5TTS:
@@ -44,7 +47,21 @@ class F5TTS:
         vocoder_local_path=None,
         device=None,
         hf_cache_dir=None,
+        voice_cache_size=16,
+        voice_cache_dir=None,
+        cpu_engine=None,
+        cpu_threads=None,
+        cpu_interop_threads=None,
+        convert_ckpt=False,
     ):
+        """
+        `convert_ckpt` converts a .pt `ckpt_file` once to a sibling EMA-only safetensors file (see load_model).
+        `cpu_engine` (one of cpu_engines: fp32, bf16, int8) selects how the models run on a cpu device, ignored
+        on other devices;
+        `cpu_threads` / `cpu_interop_threads` set the torch thread budget of this process.
+        """
+        from omegaconf import OmegaConf
+
         model_cfg = OmegaConf.load(
             str(files("f5_tts").joinpath(f"configs/{model}.yaml"))
         )
@@ -72,6 +89,12 @@ class F5TTS:
                 )
             )
 
+        if str(self.device) == "cpu":
+            set_cpu_threads(cpu_threads, cpu_interop_threads)
+        else:
+            cpu_engine = None
+        self.cpu_engine = cpu_engine
+
         # Load models
         self.vocoder = load_vocoder(
             self.mel_spec_type,
@@ -79,6 +102,7 @@ class F5TTS:
             vocoder_local_path,
             self.device,
             hf_cache_dir,
+            cpu_engine=cpu_engine,
         )
 
         repo_name, ckpt_step, ckpt_type = "F5-TTS", 1250000, "safetensors"
@@ -97,6 +121,8 @@ class F5TTS:
             raise ValueError(f"Unknown model type: {model}")
 
         if not ckpt_file:
+            from cached_path import cached_path
+
             ckpt_file = str(
                 cached_path(
                     f"hf://SWivid/{repo_name}/{model}/model_{ckpt_step}.{ckpt_type}",
@@ -112,6 +138,13 @@ class F5TTS:
             self.ode_method,
             self.use_ema,
             self.device,
+            convert=convert_ckpt,
+            cpu_engine=cpu_engine,
+        )
+
+        # preprocessed reference voices, reused across infer calls
+        self.voice_cache = VoiceCache(
+            self.ema_model, max_size=voice_cache_size, cache_dir=voice_cache_dir, device=self.device
         )
 
     def transcribe(self, ref_audio, language=None):
@@ -144,18 +177,26 @@ class F5TTS:
         file_wave=None,
         file_spec=None,
         seed=None,
+        latency_tier=None,
+        guidance=None,
     ):
+        # sampled with a local generator, the global rng state is left alone (the model may be shared by threads)
         if seed is None:
-            self.seed = random.randint(0, sys.maxsize)
-        seed_everything(self.seed)
+            seed = random.randint(0, sys.maxsize)
+        self.seed = seed
+
+        ode_method = None
+        if latency_tier is not None:
+            nfe_step, ode_method = get_latency_tier(latency_tier)
+        guidance = get_tier_guidance(latency_tier, guidance)
 
-        ref_file, ref_text = preprocess_ref_audio_text(
-            ref_file, ref_text, device=self.device
+        voice = self.voice_cache.get(
+            ref_file, ref_text, target_rms=target_rms, show_info=show_info
         )
 
         wav, sr, spec = infer_process(
-            ref_file,
-            ref_text,
+            None,
+            voice["ref_text"],
             gen_text,
             self.ema_model,
             self.vocoder,
@@ -165,11 +206,15 @@ class F5TTS:
             target_rms=target_rms,
             cross_fade_duration=cross_fade_duration,
             nfe_step=nfe_step,
+            ode_method=ode_method,
             cfg_strength=cfg_strength,
             sway_sampling_coef=sway_sampling_coef,
             speed=speed,
             fix_duration=fix_duration,
             device=self.device,
+            ref_voice=voice,
+            seed=seed,
+            guidance=guidance,
         )
 
         if file_wave is not None:
@@ -180,6 +225,187 @@ class F5TTS:
 
         return wav, sr, spec
 
+    def infer_batch(
+        self,
+        ref_file,
+        ref_text,
+        gen_texts,
+        show_info=print,
+        progress=tqdm,
+        target_rms=0.1,
+        cross_fade_duration=0.15,
+        sway_sampling_coef=-1,
+        cfg_strength=2,
+        nfe_step=32,
+        speed=1.0,
+        fix_duration=None,
+        remove_silence=False,
+        file_waves=None,
+        seed=None,
+        latency_tier=None,
+        guidance=None,
+        max_batch_size=8,
+        max_padding_ratio=1.25,
+    ):
+        """
+        Synthesizes many independent texts with one reference voice.
+
+        Texts short enough to need no chunking are bucketed by predicted duration and sampled together,
+        one ode solve per bucket; longer texts fall back to infer_process. `speed` may be a list with one
+        value per text, `file_waves` an optional list of output paths. `latency_tier` (a key of latency_tiers)
+        overrides nfe_step and the ode solver, `guidance` (a key of guidance_presets) the steps that run cfg.
+        With an explicit `seed`, each text's output is deterministic and, as padded frames are masked, the same as
+        when sampled alone, up to floating-point rounding.
+        Yields (index, wav, sr, spec) as results become ready, not necessarily in input order.
+        """
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        self.seed = seed
+
+        ode_method = None
+        if latency_tier is not None:
+            nfe_step, ode_method = get_latency_tier(latency_tier)
+        guidance = get_tier_guidance(latency_tier, guidance)
+
+        voice = self.voice_cache.get(ref_file, ref_text, target_rms=target_rms, show_info=show_info)
+        ref_text = voice["ref_text"]
+        audio, sr = voice["audio"], voice["sr"]
+
+        speeds = speed if isinstance(speed, (list, tuple)) else [speed] * len(gen_texts)
+        max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr))
+        short_ids, long_ids = [], []
+        for i, gen_text in enumerate(gen_texts):
+            if len(chunk_text(gen_text, max_chars=max_chars)) <= 1:
+                short_ids.append(i)
+            else:
+                long_ids.append(i)
+
+        def finish(i, wav, sr, spec):
+            if file_waves is not None:
+                self.export_wav(wav, file_waves[i], remove_silence)
+            return i, wav, sr, spec
+
+        if short_ids:
+            show_info(f"Generating {len(short_ids)} texts in batches of up to {max_batch_size}...")
+            for j, wav, sr, spec in infer_batch_texts(
+                None,
+                ref_text,
+                [gen_texts[i] for i in short_ids],
+                self.ema_model,
+                self.vocoder,
+                self.mel_spec_type,
+                target_rms=target_rms,
+                nfe_step=nfe_step,
+                ode_method=ode_method,
+                cfg_strength=cfg_strength,
+                sway_sampling_coef=sway_sampling_coef,
+                speed=[speeds[i] for i in short_ids],
+                fix_duration=fix_duration,
+                device=self.device,
+                max_batch_size=max_batch_size,
+                max_padding_ratio=max_padding_ratio,
+                ref_voice=voice,
+                seed=seed,
+                guidance=guidance,
+            ):
+                yield finish(short_ids[j], wav, sr, spec)
+
+        for i in long_ids:
+            wav, sr, spec = infer_process(
+                None,
+                ref_text,
+                gen_texts[i],
+                self.ema_model,
+                self.vocoder,
+                self.mel_spec_type,
+                show_info=show_info,
+                progress=progress,
+                target_rms=target_rms,
+                cross_fade_duration=cross_fade_duration,
+                nfe_step=nfe_step,
+                ode_method=ode_method,
+                cfg_strength=cfg_strength,
+                sway_sampling_coef=sway_sampling_coef,
+                speed=speeds[i],
+                fix_duration=fix_duration,
+                device=self.device,
+                ref_voice=voice,
+                seed=seed,
+                guidance=guidance,
+            )
+            yield finish(i, wav, sr, spec)
+
+    def infer_stream(
+        self,
+        ref_file,
+        ref_text,
+        gen_text,
+        show_info=print,
+        target_rms=0.1,
+        cross_fade_duration=0.15,
+        sway_sampling_coef=-1,
+        cfg_strength=2,
+        nfe_step=32,
+        speed=1.0,
+        fix_duration=None,
+        seed=None,
+        latency_tier=None,
+        guidance=None,
+        chunk_size=2048,
+        model_lock=None,
+    ):
+        """
+        Streams the synthesis of `gen_text` as (wav_chunk, sr) tuples of up to `chunk_size` samples.
+
+        Each text chunk is sampled and vocoded on its own, so audio starts flowing once the first one is done;
+        the first text chunk is split smaller to keep the time to first audio low. Joins are cross-faded,
+        which holds back the last `cross_fade_duration` seconds of each text chunk until the next one.
+        The ode solve of the next text chunk overlaps the vocoding of the current one; `model_lock`, if given,
+        is held around each ode solve, for servers sharing the model between threads.
+        """
+        if seed is None:
+            seed = random.randint(0, sys.maxsize)
+        self.seed = seed
+
+        ode_method = None
+        if latency_tier is not None:
+            nfe_step, ode_method = get_latency_tier(latency_tier)
+        guidance = get_tier_guidance(latency_tier, guidance)
+
+        voice = self.voice_cache.get(ref_file, ref_text, target_rms=target_rms, show_info=show_info)
+        ref_text = voice["ref_text"]
+        audio, sr = voice["audio"], voice["sr"]
+
+        max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr))
+        gen_text_batches = chunk_text(gen_text, max_chars=max_chars)
+        if gen_text_batches:
+            gen_text_batches = chunk_text(gen_text_batches[0], max_chars=max_chars // 4) + gen_text_batches[1:]
+
+        yield from infer_batch_process(
+            None,
+            ref_text,
+            gen_text_batches,
+            self.ema_model,
+            self.vocoder,
+            self.mel_spec_type,
+            progress=None,
+            target_rms=target_rms,
+            cross_fade_duration=cross_fade_duration,
+            nfe_step=nfe_step,
+            ode_method=ode_method,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+            speed=speed,
+            fix_duration=fix_duration,
+            device=self.device,
+            streaming=True,
+            chunk_size=chunk_size,
+            ref_voice=voice,
+            model_lock=model_lock,
+            seed=seed,
+            guidance=guidance,
+        )
+
 
 if __name__ == "__main__":
     f5tts = F5TTS()
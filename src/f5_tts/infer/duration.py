@@ -0,0 +1,59 @@
+# Duration prediction shared by inference and request scheduling
+# Kept free of torch and model imports, so load balancers and queues can price a request cheaply
+
+target_sample_rate = 24000
+hop_length = 256
+speed = 1.0
+fix_duration = None
+
+
+# estimate total mel frames (ref + gen) of one generation
+
+
+def estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration):
+    if fix_duration is not None:
+        return int(fix_duration * target_sample_rate / hop_length)
+
+    local_speed = speed
+    if len(gen_text.encode("utf-8")) < 10:
+        local_speed = 0.3
+
+    ref_text_len = len(ref_text.encode("utf-8"))
+    gen_text_len = len(gen_text.encode("utf-8"))
+    return ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
+
+
+# predicted generated mel frames of one request, the unit of work for scheduling
+
+
+def estimate_gen_frames(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration):
+    return max(0, estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration) - ref_audio_len)
+
+
+# group generations of similar length, so padding waste inside a batch stays bounded
+
+
+def bucket_by_duration(durations, max_batch_size=8, max_padding_ratio=1.25):
+    """
+    Groups indices of `durations` into buckets for batched sampling.
+
+    Args:
+        durations (List[int]): Predicted total mel frames of each generation.
+        max_batch_size (int): The maximum number of generations per bucket.
+        max_padding_ratio (float): The longest item of a bucket is at most this many times the shortest.
+
+    Returns:
+        List[List[int]]: Buckets of indices, shortest durations first.
+    """
+    buckets = []
+    bucket = []
+    for idx in sorted(range(len(durations)), key=lambda i: durations[i]):
+        if bucket and (
+            len(bucket) >= max_batch_size or durations[idx] > durations[bucket[0]] * max_padding_ratio
+        ):
+            buckets.append(bucket)
+            bucket = []
+        bucket.append(idx)
+    if bucket:
+        buckets.append(bucket)
+    return buckets
@@ -9,8 +9,6 @@ from pathlib import Path
 import numpy as np
 import soundfile as sf
 import tomli
-from cached_path import cached_path
-from omegaconf import OmegaConf
 
 from f5_tts.infer.utils_infer import (
     mel_spec_type,
@@ -21,6 +19,10 @@ from f5_tts.infer.utils_infer import (
     sway_sampling_coef,
     speed,
     fix_duration,
+    latency_tiers,
+    guidance_presets,
+    get_latency_tier,
+    get_tier_guidance,
     infer_process,
     load_model,
     load_vocoder,
@@ -142,6 +144,21 @@ parser.add_argument(
     type=int,
     help=f"The number of function evaluation (denoising steps), default {nfe_step}",
 )
+parser.add_argument(
+    "--latency_tier",
+    type=str,
+    choices=list(latency_tiers),
+    help="Solver and step count preset, overrides --nfe_step: " + ", ".join(
+        f"{name} ({tier['ode_method']} x {tier['nfe_step']})" for name, tier in latency_tiers.items()
+    ),
+)
+parser.add_argument(
+    "--guidance",
+    type=str,
+    choices=list(guidance_presets),
+    help="Classifier-free guidance schedule, which steps also run the unconditional forward, default full "
+    "(or the preset of --latency_tier)",
+)
 parser.add_argument(
     "--cfg_strength",
     type=float,
@@ -198,6 +215,11 @@ vocoder_name = args.vocoder_name or config.get("vocoder_name", mel_spec_type)
 target_rms = args.target_rms or config.get("target_rms", target_rms)
 cross_fade_duration = args.cross_fade_duration or config.get("cross_fade_duration", cross_fade_duration)
 nfe_step = args.nfe_step or config.get("nfe_step", nfe_step)
+latency_tier = args.latency_tier or config.get("latency_tier", None)
+ode_method = None
+if latency_tier:
+    nfe_step, ode_method = get_latency_tier(latency_tier)
+guidance = get_tier_guidance(latency_tier or None, args.guidance or config.get("guidance", None))
 cfg_strength = args.cfg_strength or config.get("cfg_strength", cfg_strength)
 sway_sampling_coef = args.sway_sampling_coef or config.get("sway_sampling_coef", sway_sampling_coef)
 speed = args.speed or config.get("speed", speed)
@@ -244,6 +266,8 @@ vocoder = load_vocoder(vocoder_name=vocoder_name, is_local=load_vocoder_from_loc
 
 # load TTS model
 
+from omegaconf import OmegaConf  # noqa: E402. imported after argument parsing, --help stays fast
+
 model_cfg = OmegaConf.load(
     args.model_cfg or config.get("model_cfg", str(files("f5_tts").joinpath(f"configs/{model}.yaml")))
 ).model
@@ -266,6 +290,8 @@ elif model == "E2TTS_Base":
     ckpt_step = 1200000
 
 if not ckpt_file:
+    from cached_path import cached_path
+
     ckpt_file = str(cached_path(f"hf://SWivid/{repo_name}/{model}/model_{ckpt_step}.{ckpt_type}"))
 
 print(f"Using {model}...")
@@ -321,10 +347,12 @@ def main():
             target_rms=target_rms,
             cross_fade_duration=cross_fade_duration,
             nfe_step=nfe_step,
+            ode_method=ode_method,
             cfg_strength=cfg_strength,
             sway_sampling_coef=sway_sampling_coef,
             speed=speed,
             fix_duration=fix_duration,
+            guidance=guidance,
         )
         generated_audio_segments.append(audio_segment)
 
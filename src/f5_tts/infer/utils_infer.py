@@ -2,30 +2,28 @@
 # Make adjustments inside functions, and consider both gradio and cli scripts if need to change func output format
 import os
 import sys
-from concurrent.futures import ThreadPoolExecutor
 
 os.environ["PYTORCH_ENABLE_MPS_FALLBACK"] = "1"  # for MPS device compatibility
 sys.path.append(f"{os.path.dirname(os.path.abspath(__file__))}/../../third_party/BigVGAN/")
 
+import contextlib
 import hashlib
+import inspect
+import math
+import queue
 import re
 import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
 from importlib.resources import files
 
-import matplotlib
-
-matplotlib.use("Agg")
-
-import matplotlib.pylab as plt
 import numpy as np
 import torch
 import torchaudio
 import tqdm
-from huggingface_hub import snapshot_download, hf_hub_download
-from pydub import AudioSegment, silence
-from transformers import pipeline
-from vocos import Vocos
 
+from f5_tts.infer.duration import bucket_by_duration, estimate_duration  # noqa: F401. re-exported
 from f5_tts.model import CFM
 from f5_tts.model.utils import (
     get_tokenizer,
@@ -61,9 +59,52 @@ sway_sampling_coef = -1.0
 speed = 1.0
 fix_duration = None
 
+# latency tiers: solver and step count presets trading quality for speed, see benchmark_latency_tiers.py
+latency_tiers = {
+    "fast": {"nfe_step": 8, "ode_method": "euler"},
+    "balanced": {"nfe_step": 16, "ode_method": "euler"},
+    "balanced_midpoint": {"nfe_step": 8, "ode_method": "midpoint"},  # 2 evaluations per step
+    "quality": {"nfe_step": 32, "ode_method": "euler"},
+    "fast_no_cfg": {"nfe_step": 8, "ode_method": "euler", "guidance": "none"},  # 1 forward per step
+}
+
+# guidance presets: which evaluations also run the unconditional (cfg) forward, see benchmark_guidance.py
+# cfg_interval is the range of flow time t (0 = noise, 1 = audio) where cfg is applied, cfg_reuse reuses the
+# unconditional prediction of the last guided evaluation for cfg_reuse - 1 evaluations
+guidance_presets = {
+    "full": {},
+    "interval": {"cfg_interval": (0.0, 0.3)},  # cfg while the coarse structure forms, conditional only after
+    "reuse2": {"cfg_reuse": 2},
+    "interval_reuse2": {"cfg_interval": (0.0, 0.3), "cfg_reuse": 2},
+    "none": {"cfg_strength": 0.0},
+}
+
 # -----------------------------------------
 
 
+def get_latency_tier(name):
+    # (nfe_step, ode_method) of a latency tier
+    if name not in latency_tiers:
+        raise ValueError(f"Unknown latency tier: {name}, expected one of {list(latency_tiers)}")
+    return latency_tiers[name]["nfe_step"], latency_tiers[name]["ode_method"]
+
+
+def get_tier_guidance(latency_tier, guidance=None):
+    # guidance preset to use, an explicit one wins over the default of the latency tier
+    if guidance is None and latency_tier is not None:
+        return latency_tiers[latency_tier].get("guidance")
+    return guidance
+
+
+def get_guidance(name, cfg_strength=cfg_strength):
+    # CFM.sample keyword arguments of a guidance preset, None for "full"
+    if name is None:
+        name = "full"
+    if name not in guidance_presets:
+        raise ValueError(f"Unknown guidance preset: {name}, expected one of {list(guidance_presets)}")
+    return {"cfg_strength": cfg_strength, "cfg_interval": None, "cfg_reuse": 1, **guidance_presets[name]}
+
+
 # chunk text into smaller pieces
 
 
@@ -98,8 +139,15 @@ def chunk_text(text, max_chars=135):
 
 
 # load vocoder
-def load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None):
+def load_vocoder(
+    vocoder_name="vocos", is_local=False, local_path="", device=device, hf_cache_dir=None, cpu_engine=None
+):
+    # vocoder and hub libraries are imported on first use, keeping `import utils_infer` cheap
+    from huggingface_hub import hf_hub_download, snapshot_download
+
     if vocoder_name == "vocos":
+        from vocos import Vocos
+
         # vocoder = Vocos.from_pretrained("charactr/vocos-mel-24khz").to(device)
         if is_local:
             print(f"Load vocos from local path {local_path}")
@@ -122,6 +170,8 @@ def load_vocoder(vocoder_name="vocos", is_local=False, local_path="", device=dev
             state_dict.update(encodec_parameters)
         vocoder.load_state_dict(state_dict)
         vocoder = vocoder.eval().to(device)
+        if cpu_engine is not None:  # only int8 changes the vocoder, bf16 keeps it (and the istft) in fp32
+            _, vocoder = apply_cpu_engine(cpu_engine, vocoder=vocoder)
     elif vocoder_name == "bigvgan":
         try:
             from third_party.BigVGAN import bigvgan
@@ -153,6 +203,8 @@ def initialize_asr_pipeline(device: str = device, dtype=None):
             and not torch.cuda.get_device_name().endswith("[ZLUDA]")
             else torch.float32
         )
+    from transformers import pipeline
+
     global asr_pipe
     asr_pipe = pipeline(
         "automatic-speech-recognition",
@@ -181,22 +233,129 @@ def transcribe(ref_audio, language=None):
 # load model checkpoint for inference
 
 
+def get_inference_dtype(device):
+    return (
+        torch.float16
+        if "cuda" in device
+        and torch.cuda.get_device_properties(device).major >= 6
+        and not torch.cuda.get_device_name().endswith("[ZLUDA]")
+        else torch.float32
+    )
+
+
+# cpu inference engines, see benchmark_cpu_engine.py
+#   fp32: default
+#   bf16: bfloat16 weights and activations, on cpus with native bf16 (avx512_bf16 / amx), fp32 otherwise
+#   int8: dynamic int8 quantization of the Linear layers of the DiT and Vocos, activations stay fp32
+cpu_engines = ("fp32", "bf16", "int8")
+
+
+def cpu_supports_bf16():
+    try:
+        return torch.backends.mkldnn.is_available() and torch.ops.mkldnn._is_mkldnn_bf16_supported()
+    except (AttributeError, RuntimeError):
+        return False
+
+
+def get_cpu_engine_dtype(cpu_engine):
+    if cpu_engine == "bf16":
+        if cpu_supports_bf16():
+            return torch.bfloat16
+        print("⚠️ No native bf16 support on this CPU, the bf16 engine runs in fp32")
+    return torch.float32
+
+
+def set_cpu_threads(intra_op=None, inter_op=None):
+    # thread budget of this process, e.g. cpu_count // number of server processes sharing the host
+    if intra_op:
+        torch.set_num_threads(intra_op)
+    if inter_op and inter_op != torch.get_num_interop_threads():
+        try:
+            torch.set_num_interop_threads(inter_op)
+        except RuntimeError as e:  # can only be set once, before any inter-op parallel work
+            print(f"⚠️ Could not set inter-op threads to {inter_op}: {e}")
+
+
+def quantize_linear_int8(module, exclude=()):
+    """
+    Dynamic int8 quantization (cpu only) of the nn.Linear layers of `module`, except the submodules named in
+    `exclude`. Weights are stored in int8, activations are quantized on the fly at each call. In place.
+    """
+    from torch.ao.quantization import default_dynamic_qconfig, quantize_dynamic
+
+    qconfig_spec = {
+        name: default_dynamic_qconfig
+        for name, submodule in module.named_modules()
+        if isinstance(submodule, torch.nn.Linear) and name not in exclude
+    }
+    return quantize_dynamic(module, qconfig_spec, dtype=torch.qint8, inplace=True)
+
+
+def apply_cpu_engine(cpu_engine, model=None, vocoder=None):
+    """
+    Switches a loaded CFM `model` and/or Vocos `vocoder`, both on cpu, to `cpu_engine` (one of cpu_engines).
+    Also usable after loading, e.g. from a server flag. Returns (model, vocoder).
+    """
+    if cpu_engine not in cpu_engines:
+        raise ValueError(f"Unknown cpu engine: {cpu_engine}, expected one of {list(cpu_engines)}")
+    for module in (model, vocoder):
+        if module is not None and next(module.parameters()).device.type != "cpu":
+            raise ValueError(f"The {cpu_engine} cpu engine needs the model on cpu")
+
+    if model is not None:
+        if cpu_engine == "int8":
+            # input_embed.proj stays a float Linear, its weight is sliced for the cached cond projection
+            quantize_linear_int8(model.transformer, exclude=("input_embed.proj",))
+        else:
+            model = model.to(get_cpu_engine_dtype(cpu_engine))
+        # cached time embeddings & modulations were computed with the previous weights
+        if hasattr(model.transformer, "enable_time_cache"):
+            model.transformer.enable_time_cache()
+
+    if vocoder is not None and cpu_engine == "int8":
+        # the istft head's output Linear produces the log-magnitude (exponentiated) and phase, kept in fp32
+        quantize_linear_int8(vocoder, exclude=("head.out",))
+
+    return model, vocoder
+
+
+def get_model_state_dict(checkpoint, ckpt_type, use_ema=True):
+    # model weights of a loaded checkpoint, under the model's own parameter names
+    if not use_ema:
+        return checkpoint if ckpt_type == "safetensors" else checkpoint["model_state_dict"]
+
+    ema_state_dict = checkpoint if ckpt_type == "safetensors" else checkpoint["ema_model_state_dict"]
+    state_dict = {k.replace("ema_model.", ""): v for k, v in ema_state_dict.items() if k not in ["initted", "step"]}
+
+    # patch for backward compatibility, 305e3ea
+    for key in ["mel_spec.mel_stft.mel_scale.fb", "mel_spec.mel_stft.spectrogram.window"]:
+        if key in state_dict:
+            del state_dict[key]
+
+    return state_dict
+
+
 def load_checkpoint(model, ckpt_path, device: str, dtype=None, use_ema=True):
+    """
+    Loads `ckpt_path` into `model` and returns it on `device` in `dtype` (float16 on recent cuda by default).
+
+    A model built on the meta device (e.g. under accelerate's init_empty_weights) gets the checkpoint tensors
+    assigned as its parameters, cast straight to the target dtype and device, instead of allocating fp32
+    parameters first and copying into them.
+    """
     if dtype is None:
-        dtype = (
-            torch.float16
-            if "cuda" in device
-            and torch.cuda.get_device_properties(device).major >= 6
-            and not torch.cuda.get_device_name().endswith("[ZLUDA]")
-            else torch.float32
-        )
-    model = model.to(dtype)
+        dtype = get_inference_dtype(device)
+
+    on_meta = any(param.is_meta for param in model.parameters())
+    if not on_meta:
+        model = model.to(dtype)
 
     ckpt_type = ckpt_path.split(".")[-1]
     if ckpt_type == "safetensors":
         from safetensors.torch import load_file
 
-        checkpoint = load_file(ckpt_path, device=device)
+        # reads the stored tensors only (no unpickling, no optimizer state), eagerly
+        checkpoint = load_file(ckpt_path, device="cpu" if on_meta else device)
     else:
         # checkpoint = torch.load(ckpt_path, map_location=device, weights_only=True)
         try:
@@ -205,30 +364,78 @@ def load_checkpoint(model, ckpt_path, device: str, dtype=None, use_ema=True):
             print(f"⚠️ Weights-only load failed, retrying with full load... ({e})")
             checkpoint = torch.load(ckpt_path, map_location=device, weights_only=False)
 
-    if use_ema:
-        if ckpt_type == "safetensors":
-            checkpoint = {"ema_model_state_dict": checkpoint}
-        checkpoint["model_state_dict"] = {
-            k.replace("ema_model.", ""): v
-            for k, v in checkpoint["ema_model_state_dict"].items()
-            if k not in ["initted", "step"]
+    state_dict = get_model_state_dict(checkpoint, ckpt_type, use_ema=use_ema)
+    if on_meta:
+        state_dict = {
+            k: v.to(device=device, dtype=dtype) if v.is_floating_point() else v.to(device) for k, v in state_dict.items()
         }
-
-        # patch for backward compatibility, 305e3ea
-        for key in ["mel_spec.mel_stft.mel_scale.fb", "mel_spec.mel_stft.spectrogram.window"]:
-            if key in checkpoint["model_state_dict"]:
-                del checkpoint["model_state_dict"][key]
-
-        model.load_state_dict(checkpoint["model_state_dict"])
+        model.load_state_dict(state_dict, assign=True)
     else:
-        if ckpt_type == "safetensors":
-            checkpoint = {"model_state_dict": checkpoint}
-        model.load_state_dict(checkpoint["model_state_dict"])
+        model.load_state_dict(state_dict)
 
-    del checkpoint
+    del checkpoint, state_dict
     torch.cuda.empty_cache()
 
-    return model.to(device)
+    # parameters are already in place when assigned, this only moves the buffers
+    return model.to(device=device, dtype=dtype) if on_meta else model.to(device)
+
+
+def get_converted_checkpoint_path(ckpt_path, use_ema=True):
+    return f"{os.path.splitext(ckpt_path)[0]}.{'ema' if use_ema else 'model'}.safetensors"
+
+
+def convert_checkpoint(ckpt_path, out_path=None, use_ema=True):
+    """
+    Writes the model (by default EMA) weights of a training checkpoint to a safetensors file,
+    dropping the optimizer state and the other model copy. Returns the path written.
+    """
+    from safetensors.torch import save_file
+
+    out_path = out_path or get_converted_checkpoint_path(ckpt_path, use_ema=use_ema)
+    try:
+        checkpoint = torch.load(ckpt_path, map_location="cpu", weights_only=True, mmap=True)
+    except Exception as e:
+        print(f"⚠️ Weights-only load failed, retrying with full load... ({e})")
+        checkpoint = torch.load(ckpt_path, map_location="cpu", weights_only=False)
+
+    state_dict = {k: v.contiguous() for k, v in get_model_state_dict(checkpoint, "pt", use_ema=use_ema).items()}
+    tmp_path = f"{out_path}.{os.getpid()}.tmp"  # servers starting together may convert at the same time
+    save_file(state_dict, tmp_path, metadata={"source": os.path.basename(ckpt_path), "use_ema": str(use_ema)})
+    os.replace(tmp_path, out_path)
+    return out_path
+
+
+def prepare_checkpoint(ckpt_path, use_ema=True):
+    """
+    Path to load for inference: a .pt/.ckpt training checkpoint is converted once to a sibling safetensors
+    file (re-converted if the checkpoint is newer). Falls back to the original path if that cannot be written.
+    """
+    if ckpt_path.endswith(".safetensors") or not os.path.isfile(ckpt_path):
+        return ckpt_path
+
+    converted_path = get_converted_checkpoint_path(ckpt_path, use_ema=use_ema)
+    if os.path.isfile(converted_path) and os.path.getmtime(converted_path) >= os.path.getmtime(ckpt_path):
+        return converted_path
+
+    try:
+        print(f"Converting {ckpt_path} -> {converted_path} (once)")
+        return convert_checkpoint(ckpt_path, converted_path, use_ema=use_ema)
+    except Exception as e:
+        print(f"⚠️ Checkpoint conversion failed, loading {ckpt_path} directly... ({e})")
+        return ckpt_path
+
+
+def empty_init_context(ckpt_path):
+    # build parameters on the meta device when the checkpoint can be assigned directly
+    if not ckpt_path.endswith(".safetensors"):
+        return contextlib.nullcontext()
+    if "assign" not in inspect.signature(torch.nn.Module.load_state_dict).parameters:  # torch < 2.1
+        return contextlib.nullcontext()
+    try:
+        from accelerate import init_empty_weights
+    except ImportError:
+        return contextlib.nullcontext()
+    return init_empty_weights(include_buffers=False)
 
 
 # load model for inference
@@ -243,39 +450,65 @@ def load_model(
     ode_method=ode_method,
     use_ema=True,
     device=device,
+    convert=False,
+    cpu_engine=None,
 ):
+    """
+    Builds the CFM model and loads `ckpt_path` for inference.
+
+    With `convert` (opt-in, it writes next to `ckpt_path`, so only for checkpoint directories you own), a training
+    checkpoint is first converted once to an EMA-only safetensors file next to it, which is then loaded and
+    assigned into a model built without allocating its parameters.
+    `cpu_engine` (one of cpu_engines, device "cpu" only) loads the weights in bf16 or quantizes them to int8.
+    """
     if vocab_file == "":
         vocab_file = str(files("f5_tts").joinpath("infer/examples/vocab.txt"))
     tokenizer = "custom"
 
+    if convert:
+        ckpt_path = prepare_checkpoint(ckpt_path, use_ema=use_ema)
+
     print("\nvocab : ", vocab_file)
     print("token : ", tokenizer)
     print("model : ", ckpt_path, "\n")
 
     vocab_char_map, vocab_size = get_tokenizer(vocab_file, tokenizer)
-    model = CFM(
-        transformer=model_cls(**model_cfg, text_num_embeds=vocab_size, mel_dim=n_mel_channels),
-        mel_spec_kwargs=dict(
-            n_fft=n_fft,
-            hop_length=hop_length,
-            win_length=win_length,
-            n_mel_channels=n_mel_channels,
-            target_sample_rate=target_sample_rate,
-            mel_spec_type=mel_spec_type,
-        ),
-        odeint_kwargs=dict(
-            method=ode_method,
-        ),
-        vocab_char_map=vocab_char_map,
-    ).to(device)
+    with empty_init_context(ckpt_path):
+        model = CFM(
+            transformer=model_cls(**model_cfg, text_num_embeds=vocab_size, mel_dim=n_mel_channels),
+            mel_spec_kwargs=dict(
+                n_fft=n_fft,
+                hop_length=hop_length,
+                win_length=win_length,
+                n_mel_channels=n_mel_channels,
+                target_sample_rate=target_sample_rate,
+                mel_spec_type=mel_spec_type,
+            ),
+            odeint_kwargs=dict(
+                method=ode_method,
+            ),
+            vocab_char_map=vocab_char_map,
+        )
+    if not any(param.is_meta for param in model.parameters()):
+        model = model.to(device)
 
     dtype = torch.float32 if mel_spec_type == "bigvgan" else None
+    if cpu_engine is not None and dtype is None:
+        dtype = get_cpu_engine_dtype(cpu_engine)
     model = load_checkpoint(model, ckpt_path, device, dtype=dtype, use_ema=use_ema)
+    if cpu_engine is not None:
+        model, _ = apply_cpu_engine(cpu_engine, model=model)
+
+    # weights are fixed from here on, so per-timestep embeddings can be cached across sample() calls
+    if hasattr(model.transformer, "enable_time_cache"):
+        model.transformer.enable_time_cache()
 
     return model
 
 
 def remove_silence_edges(audio, silence_threshold=-42):
+    from pydub import silence
+
     # Remove silence from the start
     non_silent_start_idx = silence.detect_leading_silence(audio, silence_threshold=silence_threshold)
     audio = audio[non_silent_start_idx:]
@@ -295,6 +528,8 @@ def remove_silence_edges(audio, silence_threshold=-42):
 
 
 def preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_info=print, device=device):
+    from pydub import AudioSegment, silence
+
     show_info("Converting audio...")
     with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as f:
         aseg = AudioSegment.from_file(ref_audio_orig)
@@ -365,6 +600,109 @@ def preprocess_ref_audio_text(ref_audio_orig, ref_text, clip_short=True, show_in
     return ref_audio, ref_text
 
 
+# registry of preprocessed reference voices, so a reused reference is only prepared once
+
+
+class VoiceCache:
+    """
+    LRU cache of make_ref_voice() entries, keyed by a hash of the reference audio content and ref_text.
+
+    Saves the pydub decoding and silence clipping of preprocess_ref_audio_text(), the resampling,
+    the reference mel and the ref_text tokenization on every request with a known reference.
+    With `cache_dir`, the clipped waveform and the final (possibly transcribed) ref_text are also
+    stored on disk, so restarted processes skip preprocessing and ASR.
+    """
+
+    def __init__(self, model_obj, max_size=16, cache_dir=None, device=device):
+        self.model_obj = model_obj
+        self.max_size = max_size
+        self.cache_dir = cache_dir
+        self.device = device
+
+        self.entries = OrderedDict()
+        self.file_hashes = OrderedDict()  # (path, mtime, size) -> content hash, avoids rereading unchanged files
+        self.pending = {}  # key -> Future of a miss being loaded, concurrent requests for it wait on it
+        self.lock = threading.Lock()  # guards the dicts only, never held while loading
+
+        if cache_dir is not None:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    def hash_file(self, path):
+        stat = os.stat(path)
+        file_key = (os.path.abspath(path), stat.st_mtime_ns, stat.st_size)
+        with self.lock:
+            if file_key in self.file_hashes:
+                self.file_hashes.move_to_end(file_key)
+                return self.file_hashes[file_key]
+
+        with open(path, "rb") as f:
+            file_hash = hashlib.md5(f.read()).hexdigest()
+
+        # one file per voice, so the same bound as the voices themselves
+        with self.lock:
+            self.file_hashes[file_key] = file_hash
+            while len(self.file_hashes) > self.max_size:
+                self.file_hashes.popitem(last=False)
+        return file_hash
+
+    def get(self, ref_audio_orig, ref_text, clip_short=True, target_rms=target_rms, show_info=print):
+        key = hashlib.md5(
+            f"{self.hash_file(ref_audio_orig)}|{ref_text}|{clip_short}|{target_rms}".encode("utf-8")
+        ).hexdigest()
+
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                return self.entries[key]
+            future = self.pending.get(key)
+            owner = future is None
+            if owner:
+                future = self.pending[key] = Future()
+
+        if not owner:
+            return future.result()
+
+        try:
+            audio, sr, final_ref_text = self.load_reference(key, ref_audio_orig, ref_text, clip_short, show_info)
+            entry = make_ref_voice(
+                (audio, sr), final_ref_text, self.model_obj, target_rms=target_rms, device=self.device
+            )
+        except BaseException as e:
+            with self.lock:
+                del self.pending[key]
+            future.set_exception(e)
+            raise
+
+        with self.lock:
+            del self.pending[key]
+            self.entries[key] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+        future.set_result(entry)
+        return entry
+
+    def load_reference(self, key, ref_audio_orig, ref_text, clip_short, show_info):
+        disk_path = os.path.join(self.cache_dir, f"{key}.pt") if self.cache_dir is not None else None
+        if disk_path is not None and os.path.exists(disk_path):
+            show_info("Using cached reference audio...")
+            stored = torch.load(disk_path, map_location="cpu", weights_only=True)
+            return stored["audio"], stored["sr"], stored["ref_text"]
+
+        ref_file, final_ref_text = preprocess_ref_audio_text(
+            ref_audio_orig, ref_text, clip_short=clip_short, show_info=show_info, device=self.device
+        )
+        audio, sr = torchaudio.load(ref_file)
+        os.remove(ref_file)
+
+        if disk_path is not None:
+            torch.save({"audio": audio, "sr": sr, "ref_text": final_ref_text}, disk_path)
+        return audio, sr, final_ref_text
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
 # infer process: chunk text -> infer batches [i.e. infer_batch_process()]
 
 
@@ -380,14 +718,21 @@ def infer_process(
     target_rms=target_rms,
     cross_fade_duration=cross_fade_duration,
     nfe_step=nfe_step,
+    ode_method=None,
     cfg_strength=cfg_strength,
     sway_sampling_coef=sway_sampling_coef,
     speed=speed,
     fix_duration=fix_duration,
     device=device,
+    ref_voice=None,
+    seed=None,
+    guidance=None,
 ):
     # Split the input text into batches
-    audio, sr = torchaudio.load(ref_audio)
+    if ref_voice is not None:
+        audio, sr = ref_voice["audio"], ref_voice["sr"]
+    else:
+        audio, sr = torchaudio.load(ref_audio)
     max_chars = int(len(ref_text.encode("utf-8")) / (audio.shape[-1] / sr) * (22 - audio.shape[-1] / sr))
     gen_text_batches = chunk_text(gen_text, max_chars=max_chars)
     for i, gen_text in enumerate(gen_text_batches):
@@ -407,15 +752,314 @@ def infer_process(
             target_rms=target_rms,
             cross_fade_duration=cross_fade_duration,
             nfe_step=nfe_step,
+            ode_method=ode_method,
             cfg_strength=cfg_strength,
             sway_sampling_coef=sway_sampling_coef,
             speed=speed,
             fix_duration=fix_duration,
             device=device,
+            ref_voice=ref_voice,
+            seed=seed,
+            guidance=guidance,
         )
     )
 
 
+# normalize, resample, mel-encode and tokenize reference audio and text for inference
+
+
+def make_ref_voice(ref_audio, ref_text, model_obj, target_rms=target_rms, device=device):
+    """
+    Prepares everything about a reference that does not depend on the text to generate.
+
+    Args:
+        ref_audio (Tuple[Tensor, int]): The (waveform, sample_rate) of the preprocessed reference audio.
+        ref_text (str): The preprocessed reference text.
+        model_obj (CFM): The model, used for its mel extractor and dtype.
+
+    Returns:
+        dict: "audio", "sr" and "ref_text" as given; "rms" of the reference; "cond_audio", the loudness
+        normalized 24kHz waveform on device; "mel", the reference mel [1, n, d] in model dtype;
+        "text_tokens", the tokenized ref_text as prefixed to every generated text.
+    """
+    audio, sr = ref_audio
+    cond_audio = audio
+    if cond_audio.shape[0] > 1:
+        cond_audio = torch.mean(cond_audio, dim=0, keepdim=True)
+
+    rms = torch.sqrt(torch.mean(torch.square(cond_audio)))
+    if rms < target_rms:
+        cond_audio = cond_audio * target_rms / rms
+    if sr != target_sample_rate:
+        resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
+        cond_audio = resampler(cond_audio)
+    cond_audio = cond_audio.to(device)
+
+    with torch.inference_mode():
+        mel = model_obj.mel_spec(cond_audio).permute(0, 2, 1)
+        mel = mel.to(next(model_obj.parameters()).dtype)
+
+    prefix_text = ref_text + " " if len(ref_text[-1].encode("utf-8")) == 1 else ref_text
+
+    return {
+        "audio": audio,
+        "sr": sr,
+        "ref_text": ref_text,
+        "rms": rms,
+        "cond_audio": cond_audio,
+        "mel": mel,
+        "text_tokens": convert_char_to_pinyin([prefix_text])[0],
+    }
+
+
+# infer several texts with the same reference in a single ode solve
+
+
+def sample_batch(
+    ref_voice,
+    gen_texts,
+    durations,
+    model_obj,
+    vocoder,
+    mel_spec_type="vocos",
+    target_rms=0.1,
+    nfe_step=32,
+    ode_method=None,
+    cfg_strength=2.0,
+    sway_sampling_coef=-1,
+    seed=None,
+    guidance=None,
+):
+    """
+    Runs one batched `CFM.sample` for `gen_texts` and vocodes the whole batch at once.
+
+    `ref_voice` comes from make_ref_voice(); `durations` are total mel frames per item (ref + gen).
+    With a `seed`, each item gets the same noise as when sampled alone, whatever else is in the batch.
+    Returns a list of (wave, mel) numpy pairs in the order of `gen_texts`.
+    """
+    batch = len(gen_texts)
+    rms = ref_voice["rms"]
+    ref_audio_len = ref_voice["cond_audio"].shape[-1] // hop_length
+    final_text_list = [ref_voice["text_tokens"] + tokens for tokens in convert_char_to_pinyin(gen_texts)]
+
+    # same clamping as CFM.sample, needed to cut each item out of the padded batch
+    durations = [
+        min(max(duration, max(len(text), ref_audio_len) + 1), 4096)
+        for duration, text in zip(durations, final_text_list)
+    ]
+
+    with torch.inference_mode():
+        generated, _ = model_obj.sample(
+            cond=ref_voice["mel"].expand(batch, -1, -1),
+            text=final_text_list,
+            duration=torch.tensor(durations, device=ref_voice["mel"].device, dtype=torch.long),
+            steps=nfe_step,
+            ode_method=ode_method,
+            **get_guidance(guidance, cfg_strength),
+            sway_sampling_coef=sway_sampling_coef,
+            seed=seed,
+        )
+
+        generated = generated.to(torch.float32)  # generated mel spectrogram
+        generated = generated[:, ref_audio_len:, :]
+        # fill batch padding with silence, so it does not leak into the vocoded tail of shorter items
+        for i, duration in enumerate(durations):
+            generated[i, duration - ref_audio_len :, :] = math.log(1e-5)
+        generated = generated.permute(0, 2, 1)
+        if mel_spec_type == "vocos":
+            generated_waves = vocoder.decode(generated)
+        elif mel_spec_type == "bigvgan":
+            generated_waves = vocoder(generated).squeeze(1)
+        if rms < target_rms:
+            generated_waves = generated_waves * rms / target_rms
+
+        generated_waves = generated_waves.cpu().numpy()
+        generated = generated.cpu().numpy()
+
+    results = []
+    for i, duration in enumerate(durations):
+        gen_len = duration - ref_audio_len
+        results.append((generated_waves[i, : gen_len * hop_length], generated[i, :, :gen_len]))
+    return results
+
+
+# infer many independent texts with the same reference, batching those of similar length
+
+
+def infer_batch_texts(
+    ref_audio,
+    ref_text,
+    gen_texts,
+    model_obj,
+    vocoder,
+    mel_spec_type="vocos",
+    target_rms=0.1,
+    nfe_step=32,
+    ode_method=None,
+    cfg_strength=2.0,
+    sway_sampling_coef=-1,
+    speed=1,
+    fix_duration=None,
+    device=None,
+    max_batch_size=8,
+    max_padding_ratio=1.25,
+    ref_voice=None,
+    seed=None,
+    guidance=None,
+):
+    """
+    Generates one utterance per text of `gen_texts` (no chunking, no cross-fade).
+
+    `speed` may be a single value or a list with one value per text. A `ref_voice` from make_ref_voice()
+    or VoiceCache skips reference preprocessing.
+    Yields (index, wave, sample_rate, mel) as each duration bucket finishes, shortest first.
+    """
+    if ref_voice is None:
+        ref_voice = make_ref_voice(ref_audio, ref_text, model_obj, target_rms=target_rms, device=device)
+
+    if len(ref_text[-1].encode("utf-8")) == 1:
+        ref_text = ref_text + " "
+
+    speeds = speed if isinstance(speed, (list, tuple)) else [speed] * len(gen_texts)
+    ref_audio_len = ref_voice["cond_audio"].shape[-1] // hop_length
+    durations = [
+        estimate_duration(ref_audio_len, ref_text, gen_text, speed=local_speed, fix_duration=fix_duration)
+        for gen_text, local_speed in zip(gen_texts, speeds)
+    ]
+
+    for bucket in bucket_by_duration(durations, max_batch_size=max_batch_size, max_padding_ratio=max_padding_ratio):
+        results = sample_batch(
+            ref_voice,
+            [gen_texts[i] for i in bucket],
+            [durations[i] for i in bucket],
+            model_obj,
+            vocoder,
+            mel_spec_type=mel_spec_type,
+            target_rms=target_rms,
+            nfe_step=nfe_step,
+            ode_method=ode_method,
+            cfg_strength=cfg_strength,
+            sway_sampling_coef=sway_sampling_coef,
+            seed=seed,
+            guidance=guidance,
+        )
+        for i, (generated_wave, generated_mel) in zip(bucket, results):
+            yield i, generated_wave, target_sample_rate, generated_mel
+
+
+# join generated waves with linear cross-fades, in a single pass
+
+
+_fade_windows = {}
+
+
+def get_fade_windows(num_samples):
+    # (fade_in, fade_out) of a cross-fade, shared by every join of the same length
+    if num_samples not in _fade_windows:
+        _fade_windows[num_samples] = (np.linspace(0, 1, num_samples), np.linspace(1, 0, num_samples))
+    return _fade_windows[num_samples]
+
+
+class CrossFadeAssembler:
+    """
+    Appends waves one at a time, cross-fading each into the end of what is already assembled.
+
+    Every join overlaps min(cross_fade_samples, assembled length, next wave length) samples, like
+    concatenating with fades pairwise, but the output is written in place into one buffer, preallocated
+    from `total_samples` when the lengths are known and grown geometrically otherwise.
+    For streaming, pop_ready() hands out everything that no later join can still touch, i.e. all but
+    the last cross_fade_samples, and finish() the rest.
+    """
+
+    def __init__(self, cross_fade_samples, total_samples=0, dtype=np.float32):
+        self.cross_fade_samples = max(0, int(cross_fade_samples))
+        self.buffer = np.empty(total_samples, dtype=dtype)
+        self.length = 0  # assembled samples in the buffer
+        self.popped = 0  # leading samples of the buffer already handed out by pop_ready()
+
+    def reserve(self, length):
+        if length > len(self.buffer):
+            buffer = np.empty(max(length, 2 * len(self.buffer)), dtype=self.buffer.dtype)
+            buffer[: self.length] = self.buffer[: self.length]
+            self.buffer = buffer
+
+    def add(self, wave):
+        overlap = min(self.cross_fade_samples, self.length, len(wave))
+        end = self.length - overlap + len(wave)
+        self.reserve(end)
+
+        if overlap > 0:
+            fade_in, fade_out = get_fade_windows(overlap)
+            tail = self.buffer[self.length - overlap : self.length]
+            tail *= fade_out
+            tail += wave[:overlap] * fade_in
+        self.buffer[self.length : end] = wave[overlap:]
+        self.length = end
+
+    def pop_ready(self):
+        # drop what was handed out before, so a long stream only keeps the held-back tail
+        if self.popped > 0:
+            held = self.length - self.popped
+            self.buffer[:held] = self.buffer[self.popped : self.length]
+            self.length, self.popped = held, 0
+
+        ready = max(0, self.length - self.cross_fade_samples)
+        self.popped = ready
+        return self.buffer[:ready].copy()
+
+    def finish(self):
+        # the whole assembled wave, or what pop_ready() has not handed out yet
+        wave = self.buffer[self.popped : self.length]
+        self.popped = self.length
+        return wave
+
+
+# run one stage of a pipeline in a background thread, a bounded number of items ahead of the consumer
+
+
+def iter_in_background(fn, items, max_ahead=1):
+    """
+    Yields fn(item) for each of `items`, in order, computed by a background thread.
+
+    The thread runs at most `max_ahead` finished items ahead of the consumer, then waits. An exception in
+    `fn` is re-raised in the consumer; closing the generator stops the thread once its current item is done.
+    """
+    results = queue.Queue(maxsize=max_ahead)
+    stop = threading.Event()
+    end = object()
+
+    def put(result):
+        while not stop.is_set():
+            try:
+                results.put(result, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def worker():
+        try:
+            for item in items:
+                if not put((fn(item), None)):
+                    return
+            put((end, None))
+        except BaseException as e:
+            put((None, e))
+
+    thread = threading.Thread(target=worker, daemon=True)
+    thread.start()
+    try:
+        while True:
+            result, error = results.get()
+            if error is not None:
+                raise error
+            if result is end:
+                return
+            yield result
+    finally:
+        stop.set()
+
+
 # infer batches
 
 
@@ -430,6 +1074,7 @@ def infer_batch_process(
     target_rms=0.1,
     cross_fade_duration=0.15,
     nfe_step=32,
+    ode_method=None,
     cfg_strength=2.0,
     sway_sampling_coef=-1,
     speed=1,
@@ -437,18 +1082,15 @@ def infer_batch_process(
     device=None,
     streaming=False,
     chunk_size=2048,
+    ref_voice=None,
+    max_batch_size=8,
+    model_lock=None,
+    seed=None,
+    guidance=None,
 ):
-    audio, sr = ref_audio
-    if audio.shape[0] > 1:
-        audio = torch.mean(audio, dim=0, keepdim=True)
-
-    rms = torch.sqrt(torch.mean(torch.square(audio)))
-    if rms < target_rms:
-        audio = audio * target_rms / rms
-    if sr != target_sample_rate:
-        resampler = torchaudio.transforms.Resample(sr, target_sample_rate)
-        audio = resampler(audio)
-    audio = audio.to(device)
+    if ref_voice is None:
+        ref_voice = make_ref_voice(ref_audio, ref_text, model_obj, target_rms=target_rms, device=device)
+    audio, rms = ref_voice["cond_audio"], ref_voice["rms"]
 
     generated_waves = []
     spectrograms = []
@@ -456,39 +1098,44 @@ def infer_batch_process(
     if len(ref_text[-1].encode("utf-8")) == 1:
         ref_text = ref_text + " "
 
-    def process_batch(gen_text):
-        local_speed = speed
-        if len(gen_text.encode("utf-8")) < 10:
-            local_speed = 0.3
-
-        # Prepare the text
-        text_list = [ref_text + gen_text]
-        final_text_list = convert_char_to_pinyin(text_list)
+    def sample_mel(gen_text):
+        # Prepare the text, reusing the tokenized reference text
+        final_text_list = [ref_voice["text_tokens"] + convert_char_to_pinyin([gen_text])[0]]
 
         ref_audio_len = audio.shape[-1] // hop_length
-        if fix_duration is not None:
-            duration = int(fix_duration * target_sample_rate / hop_length)
-        else:
-            # Calculate duration
-            ref_text_len = len(ref_text.encode("utf-8"))
-            gen_text_len = len(gen_text.encode("utf-8"))
-            duration = ref_audio_len + int(ref_audio_len / ref_text_len * gen_text_len / local_speed)
+        duration = estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration)
 
         # inference
-        with torch.inference_mode():
+        with torch.inference_mode(), model_lock or contextlib.nullcontext():
             generated, _ = model_obj.sample(
-                cond=audio,
+                cond=ref_voice["mel"],
                 text=final_text_list,
                 duration=duration,
                 steps=nfe_step,
-                cfg_strength=cfg_strength,
+                ode_method=ode_method,
+                **get_guidance(guidance, cfg_strength),
                 sway_sampling_coef=sway_sampling_coef,
+                seed=seed,
             )
-            del _
 
             generated = generated.to(torch.float32)  # generated mel spectrogram
             generated = generated[:, ref_audio_len:, :]
             generated = generated.permute(0, 2, 1)
+
+            # the vocoder may run on another cuda stream, which has to wait for this one
+            ready = None
+            if generated.is_cuda:
+                ready = torch.cuda.Event()
+                ready.record()
+            return generated, ready
+
+    vocode_stream = torch.cuda.Stream(ref_voice["mel"].device) if ref_voice["mel"].is_cuda else None
+
+    def vocode(generated, ready=None):
+        with torch.inference_mode(), torch.cuda.stream(vocode_stream) if vocode_stream else contextlib.nullcontext():
+            if vocode_stream is not None:
+                vocode_stream.wait_event(ready)
+                generated.record_stream(vocode_stream)
             if mel_spec_type == "vocos":
                 generated_wave = vocoder.decode(generated)
             elif mel_spec_type == "bigvgan":
@@ -497,67 +1144,67 @@ def infer_batch_process(
                 generated_wave = generated_wave * rms / target_rms
 
             # wav -> numpy
-            generated_wave = generated_wave.squeeze().cpu().numpy()
-
-            if streaming:
-                for j in range(0, len(generated_wave), chunk_size):
-                    yield generated_wave[j : j + chunk_size], target_sample_rate
-            else:
-                generated_cpu = generated[0].cpu().numpy()
-                del generated
-                yield generated_wave, generated_cpu
+            return generated_wave.squeeze().cpu().numpy()
 
     if streaming:
-        for gen_text in progress.tqdm(gen_text_batches) if progress is not None else gen_text_batches:
-            for chunk in process_batch(gen_text):
-                yield chunk
+        # cross-fade chunk joins like the non-streaming path, holding back only the last
+        # cross_fade_duration of audio until the next chunk is blended into it
+        # the ode solve of the next chunk runs in a background thread while this one is vocoded and consumed
+        assembler = CrossFadeAssembler(cross_fade_duration * target_sample_rate)
+        texts = progress.tqdm(gen_text_batches) if progress is not None else gen_text_batches
+        for generated, ready in iter_in_background(sample_mel, texts):
+            assembler.add(vocode(generated, ready))
+            ready = assembler.pop_ready()
+            for j in range(0, len(ready), chunk_size):
+                yield ready[j : j + chunk_size], target_sample_rate
+
+        rest = assembler.finish()
+        for j in range(0, len(rest), chunk_size):
+            yield rest[j : j + chunk_size], target_sample_rate
     else:
-        with ThreadPoolExecutor() as executor:
-            futures = [executor.submit(process_batch, gen_text) for gen_text in gen_text_batches]
-            for future in progress.tqdm(futures) if progress is not None else futures:
-                result = future.result()
-                if result:
-                    generated_wave, generated_mel_spec = next(result)
-                    generated_waves.append(generated_wave)
-                    spectrograms.append(generated_mel_spec)
+        # pad all chunks of similar length into one batch, one ode solve per bucket instead of per chunk
+        ref_audio_len = audio.shape[-1] // hop_length
+        durations = [
+            estimate_duration(ref_audio_len, ref_text, gen_text, speed=speed, fix_duration=fix_duration)
+            for gen_text in gen_text_batches
+        ]
+        buckets = bucket_by_duration(durations, max_batch_size=max_batch_size)
+
+        chunk_results = [None] * len(gen_text_batches)
+        for bucket in progress.tqdm(buckets) if progress is not None else buckets:
+            with model_lock or contextlib.nullcontext():
+                results = sample_batch(
+                    ref_voice,
+                    [gen_text_batches[i] for i in bucket],
+                    [durations[i] for i in bucket],
+                    model_obj,
+                    vocoder,
+                    mel_spec_type=mel_spec_type,
+                    target_rms=target_rms,
+                    nfe_step=nfe_step,
+                    ode_method=ode_method,
+                    cfg_strength=cfg_strength,
+                    sway_sampling_coef=sway_sampling_coef,
+                    seed=seed,
+                    guidance=guidance,
+                )
+            for i, result in zip(bucket, results):
+                chunk_results[i] = result
+
+        for generated_wave, generated_mel_spec in chunk_results:
+            generated_waves.append(generated_wave)
+            spectrograms.append(generated_mel_spec)
 
         if generated_waves:
-            if cross_fade_duration <= 0:
-                # Simply concatenate
-                final_wave = np.concatenate(generated_waves)
-            else:
-                # Combine all generated waves with cross-fading
-                final_wave = generated_waves[0]
-                for i in range(1, len(generated_waves)):
-                    prev_wave = final_wave
-                    next_wave = generated_waves[i]
-
-                    # Calculate cross-fade samples, ensuring it does not exceed wave lengths
-                    cross_fade_samples = int(cross_fade_duration * target_sample_rate)
-                    cross_fade_samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
-
-                    if cross_fade_samples <= 0:
-                        # No overlap possible, concatenate
-                        final_wave = np.concatenate([prev_wave, next_wave])
-                        continue
-
-                    # Overlapping parts
-                    prev_overlap = prev_wave[-cross_fade_samples:]
-                    next_overlap = next_wave[:cross_fade_samples]
-
-                    # Fade out and fade in
-                    fade_out = np.linspace(1, 0, cross_fade_samples)
-                    fade_in = np.linspace(0, 1, cross_fade_samples)
-
-                    # Cross-faded overlap
-                    cross_faded_overlap = prev_overlap * fade_out + next_overlap * fade_in
-
-                    # Combine
-                    new_wave = np.concatenate(
-                        [prev_wave[:-cross_fade_samples], cross_faded_overlap, next_wave[cross_fade_samples:]]
-                    )
-
-                    final_wave = new_wave
+            # Combine all generated waves with cross-fading (cross_fade_duration <= 0 simply concatenates)
+            assembler = CrossFadeAssembler(
+                cross_fade_duration * target_sample_rate,
+                total_samples=sum(len(wave) for wave in generated_waves),
+                dtype=generated_waves[0].dtype,
+            )
+            for wave in generated_waves:
+                assembler.add(wave)
+            final_wave = assembler.finish()
 
             # Create a combined spectrogram
             combined_spectrogram = np.concatenate(spectrograms, axis=1)
@@ -572,6 +1219,8 @@ def infer_batch_process(
 
 
 def remove_silence_for_generated_wav(filename):
+    from pydub import AudioSegment, silence
+
     aseg = AudioSegment.from_file(filename)
     non_silent_segs = silence.split_on_silence(
         aseg, min_silence_len=1000, silence_thresh=-50, keep_silence=500, seek_step=10
@@ -587,6 +1236,11 @@ def remove_silence_for_generated_wav(filename):
 
 
 def save_spectrogram(spectrogram, path):
+    import matplotlib
+
+    matplotlib.use("Agg")
+    import matplotlib.pylab as plt
+
     plt.figure(figsize=(12, 4))
     plt.imshow(spectrogram, origin="lower", aspect="auto")
     plt.colorbar()
@@ -4,7 +4,14 @@ from f5_tts.model.backbones.unett import UNetT
 from f5_tts.model.backbones.dit import DiT
 from f5_tts.model.backbones.mmdit import MMDiT
 
-from f5_tts.model.trainer import Trainer
+
+def __getattr__(name):
+    # the trainer pulls in accelerate, wandb, ema_pytorch and datasets, which inference never needs
+    if name == "Trainer":
+        from f5_tts.model.trainer import Trainer
+
+        return Trainer
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 __all__ = ["CFM", "UNetT", "DiT", "MMDiT", "Trainer"]
@@ -16,6 +16,7 @@ import torch.nn.functional as F
 from x_transformers.x_transformers import RotaryEmbedding
 
 from f5_tts.model.modules import (
+    SampleCache,
     TimestepEmbedding,
     ConvNeXtV2Block,
     ConvPositionEmbedding,
@@ -23,6 +24,7 @@ from f5_tts.model.modules import (
     AdaLayerNorm_Final,
     precompute_freqs_cis,
     get_pos_embed_indices,
+    key_padding_attn_mask,
 )
 
 
@@ -85,15 +87,36 @@ class TextEmbedding(nn.Module):
 class InputEmbedding(nn.Module):
     def __init__(self, mel_dim, text_dim, out_dim):
         super().__init__()
+        self.mel_dim = mel_dim
+        # one Linear, as in checkpoints and their optimizer state; cached sampling applies its column slices
         self.proj = nn.Linear(mel_dim * 2 + text_dim, out_dim)
         self.conv_pos_embed = ConvPositionEmbedding(dim=out_dim)
 
-    def forward(self, x: float["b n d"], cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
-        if drop_audio_cond:  # cfg for cond audio
-            cond = torch.zeros_like(cond)
+    def cond_proj(self, cond: float["b n d"], text_embed: float["b n d"], drop_audio_cond=False):  # noqa: F722
+        # cond audio & text columns of proj (with bias), fixed over the ode steps of one sample
+        weight = self.proj.weight[:, self.mel_dim :]
+        if drop_audio_cond:  # cfg for cond audio, zeroed cond contributes nothing
+            return F.linear(text_embed, weight[:, self.mel_dim :], self.proj.bias)
+        return F.linear(torch.cat((cond, text_embed), dim=-1), weight, self.proj.bias)
 
-        x = self.proj(torch.cat((x, cond, text_embed), dim=-1))
-        x = self.conv_pos_embed(x) + x
+    def forward(
+        self,
+        x: float["b n d"],  # noqa: F722
+        cond: float["b n d"] | None,  # noqa: F722
+        text_embed: float["b n d"] | None,  # noqa: F722
+        drop_audio_cond=False,
+        cond_embed: float["b n d"] | None = None,  # noqa: F722  # precomputed cond_proj(cond, text_embed)
+        mask: bool["b n"] | None = None,  # noqa: F722
+    ):
+        if cond_embed is not None:
+            x = F.linear(x, self.proj.weight[:, : self.mel_dim]) + cond_embed
+        else:
+            if drop_audio_cond:  # cfg for cond audio
+                cond = torch.zeros_like(cond)
+            x = self.proj(torch.cat((x, cond, text_embed), dim=-1))
+
+        # padded frames are zeroed before the convs, otherwise they leak into the last frames of shorter items
+        x = self.conv_pos_embed(x, mask=mask) + x
         return x
 
 
@@ -128,10 +151,12 @@ class DiT(nn.Module):
         self.text_embed = TextEmbedding(
             text_num_embeds, text_dim, mask_padding=text_mask_padding, conv_layers=conv_layers
         )
-        self.text_cond, self.text_uncond = None, None  # text cache
+        self.text_cache = SampleCache()  # shared text cache for legacy cache=True calls
         self.input_embed = InputEmbedding(mel_dim, text_dim, dim)
 
         self.rotary_embed = RotaryEmbedding(dim_head)
+        self.rope_cache = {}  # rope tables per length bucket, see get_rope()
+        self.time_cache = None  # time embeddings & adaln modulations per sampling schedule, see enable_time_cache()
 
         self.dim = dim
         self.depth = depth
@@ -180,7 +205,103 @@ class DiT(nn.Module):
         return ckpt_forward
 
     def clear_cache(self):
-        self.text_cond, self.text_uncond = None, None
+        self.text_cache.clear()
+
+    def enable_time_cache(self, max_entries=64):
+        # inference only: entries depend on the weights, so enable (i.e. reset) again after loading new ones
+        self.time_cache = {}
+        self.time_cache_max_entries = max_entries
+
+    def precompute_time_embed(self, times: float["s"], key=None):  # noqa: F821
+        # time embedding and every adaln modulation of a whole sampling schedule, in one batched pass
+        # returns one (t, block_mods, final_mod) entry per time, to pass to forward() as time_embed
+        # with the time cache enabled, entries are kept under key (a hashable id of the schedule)
+        time_cache = self.time_cache if key is not None else None  # may be swapped by a concurrent reset
+        if time_cache is not None and key in time_cache:
+            return time_cache[key]
+
+        t = self.time_embed(times)
+        block_mods = [block.attn_norm.linear(block.attn_norm.silu(t)) for block in self.transformer_blocks]
+        final_mod = self.norm_out.linear(self.norm_out.silu(t))
+        entries = [
+            (t[i : i + 1], [mod[i : i + 1] for mod in block_mods], final_mod[i : i + 1]) for i in range(len(times))
+        ]
+
+        if time_cache is not None:
+            if len(time_cache) >= self.time_cache_max_entries:
+                time_cache.clear()
+            time_cache[key] = entries
+        return entries
+
+    def get_time_embed(self, time: float["b"] | float[""], batch, time_embed=None):  # noqa: F821 F722
+        # returns time embedding, per-block adaln modulations and final modulation (None if not precomputed)
+        if time_embed is not None:
+            t, block_mods, final_mod = time_embed
+            return t.expand(batch, -1), [mod.expand(batch, -1) for mod in block_mods], final_mod.expand(batch, -1)
+
+        if time.ndim == 0:
+            time = time.repeat(batch)
+        return self.time_embed(time), [None] * self.depth, None
+
+    def get_rope(self, seq_len, bucket_size=256):
+        # rope for the length bucket is computed once and sliced, identical to forward_from_seq_len(seq_len)
+        if self.training:
+            return self.rotary_embed.forward_from_seq_len(seq_len)
+
+        bucket = -(-seq_len // bucket_size) * bucket_size
+        key = (bucket, self.rotary_embed.inv_freq.device)
+        if key not in self.rope_cache:
+            self.rope_cache[key] = self.rotary_embed.forward_from_seq_len(bucket)
+        freqs, xpos_scale = self.rope_cache[key]
+        if torch.is_tensor(xpos_scale):
+            xpos_scale = xpos_scale[:, :seq_len]
+        return freqs[:, :seq_len], xpos_scale
+
+    def get_text_embed(self, text, seq_len, drop_text, cache: SampleCache | bool = False):
+        if not cache:
+            return self.text_embed(text, seq_len, drop_text=drop_text)
+        if cache is True:
+            cache = self.text_cache
+        if drop_text:
+            if cache.text_uncond is None:
+                cache.text_uncond = self.text_embed(text, seq_len, drop_text=True)
+            return cache.text_uncond
+        if cache.text_cond is None:
+            cache.text_cond = self.text_embed(text, seq_len, drop_text=False)
+        return cache.text_cond
+
+    def get_input_cond(self, cond, text, seq_len, drop_audio_cond, drop_text, cache: SampleCache | bool = True):
+        # cond audio + text part of the input projection, computed once per sample instead of once per step
+        if cache is True:
+            cache = self.text_cache
+        if drop_audio_cond != drop_text:  # not a cfg branch used by sampling, keep it uncached
+            text_embed = self.get_text_embed(text, seq_len, drop_text, cache)
+            return self.input_embed.cond_proj(cond, text_embed, drop_audio_cond)
+        if drop_text:
+            if cache.input_uncond is None:
+                text_embed = self.get_text_embed(text, seq_len, True, cache)
+                cache.input_uncond = self.input_embed.cond_proj(cond, text_embed, drop_audio_cond=True)
+            return cache.input_uncond
+        if cache.input_cond is None:
+            text_embed = self.get_text_embed(text, seq_len, False, cache)
+            cache.input_cond = self.input_embed.cond_proj(cond, text_embed)
+        return cache.input_cond
+
+    def get_attn_mask(self, mask, dtype, cache: SampleCache | bool = False, cfg_infer=False):
+        # additive attention mask of the key padding, built once per sample instead of per layer and step
+        if mask is None:
+            return None
+        if not cache:
+            return key_padding_attn_mask(mask, dtype)
+        if cache is True:
+            cache = self.text_cache
+        if cfg_infer:
+            if cache.attn_mask_cfg is None:
+                cache.attn_mask_cfg = key_padding_attn_mask(mask, dtype)
+            return cache.attn_mask_cfg
+        if cache.attn_mask is None:
+            cache.attn_mask = key_padding_attn_mask(mask, dtype)
+        return cache.attn_mask
 
     def forward(
         self,
@@ -191,42 +312,59 @@ class DiT(nn.Module):
         drop_audio_cond,  # cfg for cond audio
         drop_text,  # cfg for text
         mask: bool["b n"] | None = None,  # noqa: F722
-        cache=False,
+        cache: SampleCache | bool = False,  # per-call SampleCache, or True for the shared one
+        cfg_infer=False,  # cfg inference, pack cond & uncond forward, output is [2b n d]
+        time_embed=None,  # precomputed entry for a scalar time, see precompute_time_embed()
     ):
         batch, seq_len = x.shape[0], x.shape[1]
-        if time.ndim == 0:
-            time = time.repeat(batch)
 
         # t: conditioning time, text: text, x: noised audio + cond audio + text
-        t = self.time_embed(time)
-        if cache:
-            if drop_text:
-                if self.text_uncond is None:
-                    self.text_uncond = self.text_embed(text, seq_len, drop_text=True)
-                text_embed = self.text_uncond
-            else:
-                if self.text_cond is None:
-                    self.text_cond = self.text_embed(text, seq_len, drop_text=False)
-                text_embed = self.text_cond
+        t, block_mods, final_mod = self.get_time_embed(time, batch * 2 if cfg_infer else batch, time_embed)
+        if cfg_infer and mask is not None:
+            mask = torch.cat((mask, mask), dim=0)
+        if cfg_infer and cache:  # pack cond & uncond forward: b n d -> 2b n d
+            if cache is True:
+                cache = self.text_cache
+            if cache.input_cfg is None:
+                cache.input_cfg = torch.cat(
+                    (
+                        self.get_input_cond(cond, text, seq_len, False, False, cache),
+                        self.get_input_cond(cond, text, seq_len, True, True, cache),
+                    ),
+                    dim=0,
+                )
+            x = self.input_embed(torch.cat((x, x), dim=0), None, None, cond_embed=cache.input_cfg, mask=mask)
+        elif cfg_infer:
+            text_embed = torch.cat(
+                (self.get_text_embed(text, seq_len, False, cache), self.get_text_embed(text, seq_len, True, cache)),
+                dim=0,
+            )
+            x = self.input_embed(
+                torch.cat((x, x), dim=0), torch.cat((cond, torch.zeros_like(cond)), dim=0), text_embed, mask=mask
+            )
+        elif cache:
+            cond_embed = self.get_input_cond(cond, text, seq_len, drop_audio_cond, drop_text, cache)
+            x = self.input_embed(x, None, None, cond_embed=cond_embed, mask=mask)
         else:
-            text_embed = self.text_embed(text, seq_len, drop_text=drop_text)
-        x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond)
+            text_embed = self.get_text_embed(text, seq_len, drop_text, cache)
+            x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond, mask=mask)
 
-        rope = self.rotary_embed.forward_from_seq_len(seq_len)
+        rope = self.get_rope(seq_len)
+        attn_mask = self.get_attn_mask(mask, x.dtype, cache, cfg_infer)
 
         if self.long_skip_connection is not None:
             residual = x
 
-        for block in self.transformer_blocks:
+        for block, t_mod in zip(self.transformer_blocks, block_mods):
             if self.checkpoint_activations:
                 x = torch.utils.checkpoint.checkpoint(self.ckpt_wrapper(block), x, t, mask, rope)
             else:
-                x = block(x, t, mask=mask, rope=rope)
+                x = block(x, t, mask=mask, rope=rope, t_mod=t_mod, attn_mask=attn_mask)
 
         if self.long_skip_connection is not None:
             x = self.long_skip_connection(torch.cat((x, residual), dim=-1))
 
-        x = self.norm_out(x, t)
+        x = self.norm_out(x, t, mod=final_mod)
         output = self.proj_out(x)
 
         return output
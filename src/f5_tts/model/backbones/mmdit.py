@@ -15,6 +15,7 @@ from torch import nn
 from x_transformers.x_transformers import RotaryEmbedding
 
 from f5_tts.model.modules import (
+    SampleCache,
     TimestepEmbedding,
     ConvPositionEmbedding,
     MMDiTBlock,
@@ -101,7 +102,7 @@ class MMDiT(nn.Module):
 
         self.time_embed = TimestepEmbedding(dim)
         self.text_embed = TextEmbedding(dim, text_num_embeds, mask_padding=text_mask_padding)
-        self.text_cond, self.text_uncond = None, None  # text cache
+        self.text_cache = SampleCache()  # shared text cache for legacy cache=True calls
         self.audio_embed = AudioEmbedding(mel_dim, dim)
 
         self.rotary_embed = RotaryEmbedding(dim_head)
@@ -143,7 +144,20 @@ class MMDiT(nn.Module):
         nn.init.constant_(self.proj_out.bias, 0)
 
     def clear_cache(self):
-        self.text_cond, self.text_uncond = None, None
+        self.text_cache.clear()
+
+    def get_text_embed(self, text, drop_text, cache: SampleCache | bool = False):
+        if not cache:
+            return self.text_embed(text, drop_text=drop_text)
+        if cache is True:
+            cache = self.text_cache
+        if drop_text:
+            if cache.text_uncond is None:
+                cache.text_uncond = self.text_embed(text, drop_text=True)
+            return cache.text_uncond
+        if cache.text_cond is None:
+            cache.text_cond = self.text_embed(text, drop_text=False)
+        return cache.text_cond
 
     def forward(
         self,
@@ -154,7 +168,8 @@ class MMDiT(nn.Module):
         drop_audio_cond,  # cfg for cond audio
         drop_text,  # cfg for text
         mask: bool["b n"] | None = None,  # noqa: F722
-        cache=False,
+        cache: SampleCache | bool = False,  # per-call SampleCache, or True for the shared one
+        cfg_infer=False,  # cfg inference, pack cond & uncond forward, output is [2b n d]
     ):
         batch = x.shape[0]
         if time.ndim == 0:
@@ -162,18 +177,14 @@ class MMDiT(nn.Module):
 
         # t: conditioning (time), c: context (text + masked cond audio), x: noised input audio
         t = self.time_embed(time)
-        if cache:
-            if drop_text:
-                if self.text_uncond is None:
-                    self.text_uncond = self.text_embed(text, drop_text=True)
-                c = self.text_uncond
-            else:
-                if self.text_cond is None:
-                    self.text_cond = self.text_embed(text, drop_text=False)
-                c = self.text_cond
+        if cfg_infer:  # pack cond & uncond forward: b n d -> 2b n d
+            c = torch.cat((self.get_text_embed(text, False, cache), self.get_text_embed(text, True, cache)), dim=0)
+            x = self.audio_embed(torch.cat((x, x), dim=0), torch.cat((cond, torch.zeros_like(cond)), dim=0))
+            t = torch.cat((t, t), dim=0)
+            mask = torch.cat((mask, mask), dim=0) if mask is not None else None
         else:
-            c = self.text_embed(text, drop_text=drop_text)
-        x = self.audio_embed(x, cond, drop_audio_cond=drop_audio_cond)
+            c = self.get_text_embed(text, drop_text, cache)
+            x = self.audio_embed(x, cond, drop_audio_cond=drop_audio_cond)
 
         seq_len = x.shape[1]
         text_len = text.shape[1]
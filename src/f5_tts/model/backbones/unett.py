@@ -18,6 +18,7 @@ from x_transformers import RMSNorm
 from x_transformers.x_transformers import RotaryEmbedding
 
 from f5_tts.model.modules import (
+    SampleCache,
     TimestepEmbedding,
     ConvNeXtV2Block,
     ConvPositionEmbedding,
@@ -131,7 +132,7 @@ class UNetT(nn.Module):
         self.text_embed = TextEmbedding(
             text_num_embeds, text_dim, mask_padding=text_mask_padding, conv_layers=conv_layers
         )
-        self.text_cond, self.text_uncond = None, None  # text cache
+        self.text_cache = SampleCache()  # shared text cache for legacy cache=True calls
         self.input_embed = InputEmbedding(mel_dim, text_dim, dim)
 
         self.rotary_embed = RotaryEmbedding(dim_head)
@@ -179,7 +180,20 @@ class UNetT(nn.Module):
         self.proj_out = nn.Linear(dim, mel_dim)
 
     def clear_cache(self):
-        self.text_cond, self.text_uncond = None, None
+        self.text_cache.clear()
+
+    def get_text_embed(self, text, seq_len, drop_text, cache: SampleCache | bool = False):
+        if not cache:
+            return self.text_embed(text, seq_len, drop_text=drop_text)
+        if cache is True:
+            cache = self.text_cache
+        if drop_text:
+            if cache.text_uncond is None:
+                cache.text_uncond = self.text_embed(text, seq_len, drop_text=True)
+            return cache.text_uncond
+        if cache.text_cond is None:
+            cache.text_cond = self.text_embed(text, seq_len, drop_text=False)
+        return cache.text_cond
 
     def forward(
         self,
@@ -190,7 +204,8 @@ class UNetT(nn.Module):
         drop_audio_cond,  # cfg for cond audio
         drop_text,  # cfg for text
         mask: bool["b n"] | None = None,  # noqa: F722
-        cache=False,
+        cache: SampleCache | bool = False,  # per-call SampleCache, or True for the shared one
+        cfg_infer=False,  # cfg inference, pack cond & uncond forward, output is [2b n d]
     ):
         batch, seq_len = x.shape[0], x.shape[1]
         if time.ndim == 0:
@@ -198,18 +213,19 @@ class UNetT(nn.Module):
 
         # t: conditioning time, c: context (text + masked cond audio), x: noised input audio
         t = self.time_embed(time)
-        if cache:
-            if drop_text:
-                if self.text_uncond is None:
-                    self.text_uncond = self.text_embed(text, seq_len, drop_text=True)
-                text_embed = self.text_uncond
-            else:
-                if self.text_cond is None:
-                    self.text_cond = self.text_embed(text, seq_len, drop_text=False)
-                text_embed = self.text_cond
+        if cfg_infer:  # pack cond & uncond forward: b n d -> 2b n d
+            text_embed = torch.cat(
+                (self.get_text_embed(text, seq_len, False, cache), self.get_text_embed(text, seq_len, True, cache)),
+                dim=0,
+            )
+            x = self.input_embed(
+                torch.cat((x, x), dim=0), torch.cat((cond, torch.zeros_like(cond)), dim=0), text_embed
+            )
+            t = torch.cat((t, t), dim=0)
+            mask = torch.cat((mask, mask), dim=0) if mask is not None else None
         else:
-            text_embed = self.text_embed(text, seq_len, drop_text=drop_text)
-        x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond)
+            text_embed = self.get_text_embed(text, seq_len, drop_text, cache)
+            x = self.input_embed(x, cond, text_embed, drop_audio_cond=drop_audio_cond)
 
         # postfix time t to input x, [b n d] -> [b n+1 d]
         x = torch.cat([t.unsqueeze(1), x], dim=1)  # pack t to x
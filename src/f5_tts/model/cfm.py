@@ -18,7 +18,7 @@ from torch import nn
 from torch.nn.utils.rnn import pad_sequence
 from torchdiffeq import odeint
 
-from f5_tts.model.modules import MelSpec
+from f5_tts.model.modules import MelSpec, SampleCache
 from f5_tts.model.utils import (
     default,
     exists,
@@ -29,6 +29,36 @@ from f5_tts.model.utils import (
 )
 
 
+# fixed-grid solvers integrated in place, same update rules as torchdiffeq
+FIXED_STEP_METHODS = ("euler", "midpoint")
+
+
+def fixed_step_eval_times(t, method="euler"):
+    """Times at which fixed_step_integrate calls fn, in call order (the midpoint of each step follows its start)."""
+    if method == "euler":
+        return t[:-1]
+    return torch.stack((t[:-1], t[:-1] + 0.5 * (t[1:] - t[:-1])), dim=1).flatten()
+
+
+def fixed_step_integrate(fn, y0, t, method="euler", times=None):
+    """Integrate over the time grid t keeping only the current state (and the midpoint state), not the trajectory.
+
+    y0 is updated in place and returned. times is t as python floats, read back from t if not given.
+    """
+    y = y0
+    y_mid = torch.empty_like(y0) if method == "midpoint" else None
+    if times is None:
+        times = t.tolist()  # python step sizes for alpha=, one device sync per call
+    for i in range(len(times) - 1):
+        dt = times[i + 1] - times[i]
+        if method == "euler":
+            y.add_(fn(t[i], y), alpha=dt)
+        else:  # midpoint
+            torch.add(y, fn(t[i], y), alpha=0.5 * dt, out=y_mid)
+            y.add_(fn(t[i] + 0.5 * (t[i + 1] - t[i]), y_mid), alpha=dt)
+    return y
+
+
 class CFM(nn.Module):
     def __init__(
         self,
@@ -70,6 +100,7 @@ class CFM(nn.Module):
 
         # sampling related
         self.odeint_kwargs = odeint_kwargs
+        self.time_schedules = {}  # t grid per (t_start, steps, sway_sampling_coef, dtype, device, method)
 
         # vocab map for tokenization
         self.vocab_char_map = vocab_char_map
@@ -78,6 +109,25 @@ class CFM(nn.Module):
     def device(self):
         return next(self.parameters()).device
 
+    def get_time_schedule(self, t_start, steps, sway_sampling_coef, dtype, method=None):
+        # the t grid only depends on these arguments, so it is built and read back to the host once per schedule
+        # returns (t, times, eval_t, eval_times): t on device and as python floats, and for a fixed-step method
+        # the time of each fn evaluation on device and as python floats (None otherwise)
+        key = (t_start, steps, sway_sampling_coef, dtype, self.device, method)
+        if key not in self.time_schedules:
+            t = torch.linspace(t_start, 1, steps + 1, device=self.device, dtype=dtype)
+            if sway_sampling_coef is not None:
+                t = t + sway_sampling_coef * (torch.cos(torch.pi / 2 * t) - 1 + t)
+            eval_t = fixed_step_eval_times(t, method) if method in FIXED_STEP_METHODS else None
+            self.time_schedules[key] = (t, t.tolist(), eval_t, eval_t.tolist() if eval_t is not None else None)
+        return self.time_schedules[key]
+
+    def get_time_embeds(self, eval_t, key):
+        # per-evaluation time embeddings & modulations of a fixed-step schedule, if the transformer precomputes them
+        if not hasattr(self.transformer, "precompute_time_embed"):
+            return None
+        return self.transformer.precompute_time_embed(eval_t, key=key)
+
     @torch.no_grad()
     def sample(
         self,
@@ -96,6 +146,11 @@ class CFM(nn.Module):
         duplicate_test=False,
         t_inter=0.1,
         edit_mask=None,
+        fused_cfg=True,  # run cond & uncond predictions in one batched transformer call per step
+        ode_method: str | None = None,  # override odeint_kwargs["method"] for this call, e.g. "midpoint"
+        return_trajectory=False,  # keep every intermediate state ([steps + 1, b, n, d]), otherwise None is returned
+        cfg_interval: tuple[float, float] | None = None,  # apply cfg only for t in [lo, hi], conditional only outside
+        cfg_reuse=1,  # run the unconditional forward every cfg_reuse guided evaluations, reuse the last one between
     ):
         self.eval()
         # raw wave
@@ -149,37 +204,106 @@ class CFM(nn.Module):
             cond_mask, cond, torch.zeros_like(cond)
         )  # allow direct control (cut cond audio) with lens passed in
 
-        if batch > 1:
+        if batch > 1 and (duration != max_duration).any():
             mask = lens_to_mask(duration)
-        else:  # save memory and speed up, as single inference need no mask currently
+        else:  # save memory and speed up, no padding to mask for single inference or equal durations
             mask = None
 
         # neural ode
 
+        # text embeddings are computed once per call and cached here, not on the shared transformer
+        cache = SampleCache()
+
+        # guidance schedule, unconditional predictions skipped by cfg_interval / cfg_reuse are not computed
+        # fixed-step solvers evaluate fn at known times, so which evaluations are guided (and their
+        # time embeddings) is looked up by evaluation index instead of reading t back every step
+        evals = 0
+        eval_guided = None
+        time_embeds = None
+        guided_evals = 0
+        last_null_pred = None
+
         def fn(t, x):
+            nonlocal evals, guided_evals, last_null_pred
             # at each step, conditioning is fixed
             # step_cond = torch.where(cond_mask, cond, torch.zeros_like(cond))
 
+            step = evals
+            evals += 1
+            if eval_guided is not None:
+                guided = eval_guided[step]
+            else:  # adaptive solvers choose their own times
+                guided = cfg_strength >= 1e-5
+                if guided and cfg_interval is not None:
+                    guided = cfg_interval[0] <= float(t) <= cfg_interval[1]
+            time_kwargs = {"time_embed": time_embeds[step]} if time_embeds is not None else {}
+            reuse_null = guided and last_null_pred is not None and guided_evals % cfg_reuse != 0
+            if guided:
+                guided_evals += 1
+
             # predict flow
+            if guided and not reuse_null and fused_cfg:
+                pred_cfg = self.transformer(
+                    x=x,
+                    cond=step_cond,
+                    text=text,
+                    time=t,
+                    mask=mask,
+                    drop_audio_cond=False,
+                    drop_text=False,
+                    cache=cache,
+                    cfg_infer=True,
+                    **time_kwargs,
+                )
+                pred, null_pred = torch.chunk(pred_cfg, 2, dim=0)
+                last_null_pred = null_pred
+                return pred + (pred - null_pred) * cfg_strength
+
             pred = self.transformer(
-                x=x, cond=step_cond, text=text, time=t, mask=mask, drop_audio_cond=False, drop_text=False, cache=True
+                x=x,
+                cond=step_cond,
+                text=text,
+                time=t,
+                mask=mask,
+                drop_audio_cond=False,
+                drop_text=False,
+                cache=cache,
+                **time_kwargs,
             )
-            if cfg_strength < 1e-5:
+            if not guided:
                 return pred
 
-            null_pred = self.transformer(
-                x=x, cond=step_cond, text=text, time=t, mask=mask, drop_audio_cond=True, drop_text=True, cache=True
-            )
+            if reuse_null:
+                null_pred = last_null_pred
+            else:
+                null_pred = self.transformer(
+                    x=x,
+                    cond=step_cond,
+                    text=text,
+                    time=t,
+                    mask=mask,
+                    drop_audio_cond=True,
+                    drop_text=True,
+                    cache=cache,
+                    **time_kwargs,
+                )
+                last_null_pred = null_pred
             return pred + (pred - null_pred) * cfg_strength
 
         # noise input
-        # to make sure batch inference result is same with different batch size, and for sure single inference
-        # still some difference maybe due to convolutional layers
+        # each item's noise is drawn on its own (reseeded per item when seeded) and padded frames are masked in the
+        # transformer (attention keys and conv position embedding), so with a seed an item's output does not depend
+        # on the batch it is sampled in, up to floating-point rounding
+        # a local generator (same stream as torch.manual_seed) keeps seeded sampling deterministic when several
+        # threads sample at once
+        generator = torch.Generator(device=self.device) if exists(seed) else None
         y0 = []
         for dur in duration:
             if exists(seed):
-                torch.manual_seed(seed)
-            y0.append(torch.randn(dur, self.num_channels, device=self.device, dtype=step_cond.dtype))
+                generator.manual_seed(seed)
+            y0.append(
+                torch.randn(dur, self.num_channels, device=self.device, dtype=step_cond.dtype, generator=generator)
+            )
         y0 = pad_sequence(y0, padding_value=0, batch_first=True)
 
         t_start = 0
@@ -190,14 +314,27 @@ class CFM(nn.Module):
             y0 = (1 - t_start) * y0 + t_start * test_cond
             steps = int(steps * (1 - t_start))
 
-        t = torch.linspace(t_start, 1, steps + 1, device=self.device, dtype=step_cond.dtype)
-        if sway_sampling_coef is not None:
-            t = t + sway_sampling_coef * (torch.cos(torch.pi / 2 * t) - 1 + t)
-
-        trajectory = odeint(fn, y0, t, **self.odeint_kwargs)
-        self.transformer.clear_cache()
+        odeint_kwargs = self.odeint_kwargs if ode_method is None else {**self.odeint_kwargs, "method": ode_method}
+        method = odeint_kwargs.get("method")
+        fixed_step = not return_trajectory and method in FIXED_STEP_METHODS and len(odeint_kwargs) == 1
+        schedule = (t_start, steps, sway_sampling_coef, step_cond.dtype, method if fixed_step else None)
+        t, times, eval_t, eval_times = self.get_time_schedule(*schedule)
+
+        if fixed_step:
+            guided = cfg_strength >= 1e-5
+            eval_guided = [
+                guided and (cfg_interval is None or cfg_interval[0] <= time <= cfg_interval[1]) for time in eval_times
+            ]
+            time_embeds = self.get_time_embeds(eval_t, (*schedule, self.device))
+            # final state only, memory stays at the size of the output instead of steps + 1 copies
+            sampled = fixed_step_integrate(fn, y0, t, method, times)
+            trajectory = None
+        else:  # adaptive solvers / extra odeint options
+            trajectory = odeint(fn, y0, t, **odeint_kwargs)
+            sampled = trajectory[-1]
+            if not return_trajectory:
+                trajectory = None
 
-        sampled = trajectory[-1]
         out = sampled
         out = torch.where(cond_mask, cond, out)
 
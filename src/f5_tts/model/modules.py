@@ -15,7 +15,6 @@ from typing import Optional
 import torch
 import torch.nn.functional as F
 import torchaudio
-from librosa.filters import mel as librosa_mel_fn
 from torch import nn
 from x_transformers.x_transformers import apply_rotary_pos_emb
 
@@ -25,6 +24,7 @@ from x_transformers.x_transformers import apply_rotary_pos_emb
 
 mel_basis_cache = {}
 hann_window_cache = {}
+mel_stft_cache = {}
 
 
 def get_bigvgan_mel_spectrogram(
@@ -42,6 +42,8 @@ def get_bigvgan_mel_spectrogram(
     key = f"{n_fft}_{n_mel_channels}_{target_sample_rate}_{hop_length}_{win_length}_{fmin}_{fmax}_{device}"
 
     if key not in mel_basis_cache:
+        from librosa.filters import mel as librosa_mel_fn
+
         mel = librosa_mel_fn(sr=target_sample_rate, n_fft=n_fft, n_mels=n_mel_channels, fmin=fmin, fmax=fmax)
         mel_basis_cache[key] = torch.from_numpy(mel).float().to(device)  # TODO: why they need .float()?
         hann_window_cache[key] = torch.hann_window(win_length).to(device)
@@ -80,17 +82,23 @@ def get_vocos_mel_spectrogram(
     hop_length=256,
     win_length=1024,
 ):
-    mel_stft = torchaudio.transforms.MelSpectrogram(
-        sample_rate=target_sample_rate,
-        n_fft=n_fft,
-        win_length=win_length,
-        hop_length=hop_length,
-        n_mels=n_mel_channels,
-        power=1,
-        center=True,
-        normalized=False,
-        norm=None,
-    ).to(waveform.device)
+    device = waveform.device
+    key = f"{n_fft}_{n_mel_channels}_{target_sample_rate}_{hop_length}_{win_length}_{device}"
+
+    if key not in mel_stft_cache:
+        mel_stft_cache[key] = torchaudio.transforms.MelSpectrogram(
+            sample_rate=target_sample_rate,
+            n_fft=n_fft,
+            win_length=win_length,
+            hop_length=hop_length,
+            n_mels=n_mel_channels,
+            power=1,
+            center=True,
+            normalized=False,
+            norm=None,
+        ).to(device)
+
+    mel_stft = mel_stft_cache[key]
     if len(waveform.shape) == 3:
         waveform = waveform.squeeze(1)  # 'b 1 nw -> b nw'
 
@@ -143,6 +151,28 @@ class MelSpec(nn.Module):
         return mel
 
 
+# per-call cache of step-invariant tensors for one CFM.sample run
+# kept out of the backbone, so concurrent sample() calls on a shared model do not read each other's cache
+
+
+class SampleCache:
+    def __init__(self):
+        self.text_cond = None
+        self.text_uncond = None
+        # step-invariant part of the input projection (cond audio + text), see DiT.get_input_cond
+        self.input_cond = None
+        self.input_uncond = None
+        self.input_cfg = None
+        # additive key padding masks for the single and the packed cfg batch, see DiT.get_attn_mask
+        self.attn_mask = None
+        self.attn_mask_cfg = None
+
+    def clear(self):
+        self.text_cond, self.text_uncond = None, None
+        self.input_cond, self.input_uncond, self.input_cfg = None, None, None
+        self.attn_mask, self.attn_mask_cfg = None, None
+
+
 # sinusoidal position embedding
 
 
@@ -307,9 +337,10 @@ class AdaLayerNorm(nn.Module):
 
         self.norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
 
-    def forward(self, x, emb=None):
-        emb = self.linear(self.silu(emb))
-        shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = torch.chunk(emb, 6, dim=1)
+    def forward(self, x, emb=None, mod=None):
+        if mod is None:  # mod: precomputed self.linear(self.silu(emb)), e.g. from DiT's time cache
+            mod = self.linear(self.silu(emb))
+        shift_msa, scale_msa, gate_msa, shift_mlp, scale_mlp, gate_mlp = torch.chunk(mod, 6, dim=1)
 
         x = self.norm(x) * (1 + scale_msa[:, None]) + shift_msa[:, None]
         return x, gate_msa, shift_mlp, scale_mlp, gate_mlp
@@ -328,9 +359,10 @@ class AdaLayerNorm_Final(nn.Module):
 
         self.norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
 
-    def forward(self, x, emb):
-        emb = self.linear(self.silu(emb))
-        scale, shift = torch.chunk(emb, 2, dim=1)
+    def forward(self, x, emb=None, mod=None):
+        if mod is None:
+            mod = self.linear(self.silu(emb))
+        scale, shift = torch.chunk(mod, 2, dim=1)
 
         x = self.norm(x) * (1 + scale)[:, None, :] + shift[:, None, :]
         return x
@@ -422,11 +454,25 @@ class Attention(nn.Module):
         mask: bool["b n"] | None = None,  # noqa: F722
         rope=None,  # rotary position embedding for x
         c_rope=None,  # rotary position embedding for c
+        attn_mask: float["b 1 1 n"] | None = None,  # noqa: F722  # precomputed key_padding_attn_mask(mask)
     ) -> torch.Tensor:
         if c is not None:
             return self.processor(self, x, c=c, mask=mask, rope=rope, c_rope=c_rope)
         else:
-            return self.processor(self, x, mask=mask, rope=rope)
+            return self.processor(self, x, mask=mask, rope=rope, attn_mask=attn_mask)
+
+
+# attention mask
+
+
+def key_padding_attn_mask(mask: bool["b n"], dtype) -> float["b 1 1 n"]:  # noqa: F722
+    # additive mask, 0 for kept keys and the dtype minimum for padding, broadcast by sdpa over heads and queries
+    # sdpa passes a float mask as is to the memory-efficient kernel (a bool one is converted on every call);
+    # rows are allocated padded to a multiple of 8 keys, the alignment that kernel needs for the mask
+    batch, seq_len = mask.shape
+    aligned_len = -(-seq_len // 8) * 8
+    attn_mask = torch.zeros(batch, 1, 1, aligned_len, dtype=dtype, device=mask.device)[..., :seq_len]
+    return attn_mask.masked_fill_(~mask[:, None, None, :], torch.finfo(dtype).min)
 
 
 # Attention processor
@@ -445,6 +491,7 @@ class AttnProcessor:
         x: float["b n d"],  # noised input x  # noqa: F722
         mask: bool["b n"] | None = None,  # noqa: F722
         rope=None,  # rotary position embedding
+        attn_mask: float["b 1 1 n"] | None = None,  # noqa: F722  # precomputed from mask, e.g. once per sample
     ) -> torch.FloatTensor:
         batch_size = x.shape[0]
 
@@ -480,12 +527,8 @@ class AttnProcessor:
                 key = apply_rotary_pos_emb(key, freqs, k_xpos_scale)
 
         # mask. e.g. inference got a batch with different target durations, mask out the padding
-        if mask is not None:
-            attn_mask = mask
-            attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n'
-            attn_mask = attn_mask.expand(batch_size, attn.heads, query.shape[-2], key.shape[-2])
-        else:
-            attn_mask = None
+        if mask is not None and attn_mask is None:
+            attn_mask = key_padding_attn_mask(mask, query.dtype)
 
         x = F.scaled_dot_product_attention(query, key, value, attn_mask=attn_mask, dropout_p=0.0, is_causal=False)
         x = x.transpose(1, 2).reshape(batch_size, -1, attn.heads * head_dim)
@@ -574,8 +617,7 @@ class JointAttnProcessor:
         # mask. e.g. inference got a batch with different target durations, mask out the padding
         if mask is not None:
             attn_mask = F.pad(mask, (0, c.shape[1]), value=True)  # no mask for c (text)
-            attn_mask = attn_mask.unsqueeze(1).unsqueeze(1)  # 'b n -> b 1 1 n'
-            attn_mask = attn_mask.expand(batch_size, attn.heads, query.shape[-2], key.shape[-2])
+            attn_mask = key_padding_attn_mask(attn_mask, query.dtype)
         else:
             attn_mask = None
 
@@ -624,12 +666,12 @@ class DiTBlock(nn.Module):
         self.ff_norm = nn.LayerNorm(dim, elementwise_affine=False, eps=1e-6)
         self.ff = FeedForward(dim=dim, mult=ff_mult, dropout=dropout, approximate="tanh")
 
-    def forward(self, x, t, mask=None, rope=None):  # x: noised input, t: time embedding
-        # pre-norm & modulation for attention input
-        norm, gate_msa, shift_mlp, scale_mlp, gate_mlp = self.attn_norm(x, emb=t)
+    def forward(self, x, t, mask=None, rope=None, t_mod=None, attn_mask=None):  # x: noised input, t: time embedding
+        # pre-norm & modulation for attention input, t_mod: optional precomputed adaln modulation of t
+        norm, gate_msa, shift_mlp, scale_mlp, gate_mlp = self.attn_norm(x, emb=t, mod=t_mod)
 
-        # attention
-        attn_output = self.attn(x=norm, mask=mask, rope=rope)
+        # attention, attn_mask: optional precomputed additive mask of mask
+        attn_output = self.attn(x=norm, mask=mask, rope=rope, attn_mask=attn_mask)
 
         # process attention output for input x
         x = x + gate_msa.unsqueeze(1) * attn_output
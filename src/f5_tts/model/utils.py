@@ -8,9 +8,6 @@ from importlib.resources import files
 import torch
 from torch.nn.utils.rnn import pad_sequence
 
-import jieba
-from pypinyin import lazy_pinyin, Style
-
 
 # seed everything
 
@@ -135,6 +132,10 @@ def get_tokenizer(dataset_name, tokenizer: str = "pinyin"):
 
 
 def convert_char_to_pinyin(text_list, polyphone=True):
+    # imported on first use, loading jieba and the pinyin dictionaries takes a while
+    import jieba
+    from pypinyin import lazy_pinyin, Style
+
     if jieba.dt.initialized is False:
         jieba.default_logger.setLevel(50)  # CRITICAL
         jieba.initialize()
@@ -0,0 +1,35 @@
+"""Convert a training checkpoint (.pt) to an inference-only safetensors file (EMA weights, no optimizer state).
+
+Conversion on load is opt-in: load_model(convert=True) (F5TTS(convert_ckpt=True), as api_server.py uses) writes
+this file next to the checkpoint on first load. Otherwise the given path is loaded as is, so for read-only checkpoint
+directories or to ship only the converted file, run this ahead of time and load its output, e.g.
+
+    python src/f5_tts/scripts/convert_checkpoint.py F5-TTS-Vietnamese/model_last.pt
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.append(os.getcwd())
+
+from f5_tts.infer.utils_infer import convert_checkpoint, get_converted_checkpoint_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Convert a training checkpoint to safetensors for inference")
+    parser.add_argument("ckpt_path", help="training checkpoint, e.g. model_last.pt")
+    parser.add_argument("-o", "--output", help="output path (default: <ckpt>.ema.safetensors next to the input)")
+    parser.add_argument("--no_ema", action="store_true", help="export model_state_dict instead of the EMA weights")
+    args = parser.parse_args()
+
+    use_ema = not args.no_ema
+    out_path = args.output or get_converted_checkpoint_path(args.ckpt_path, use_ema=use_ema)
+    convert_checkpoint(args.ckpt_path, out_path, use_ema=use_ema)
+
+    in_size, out_size = os.path.getsize(args.ckpt_path), os.path.getsize(out_path)
+    print(f"{args.ckpt_path} ({in_size / 1024**2:.0f} MB) -> {out_path} ({out_size / 1024**2:.0f} MB)")
+
+
+if __name__ == "__main__":
+    main()
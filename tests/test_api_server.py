@@ -0,0 +1,220 @@
+import os
+import queue
+import sys
+
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("flask")
+pytest.importorskip("soundfile")
+
+
+class FakeVoiceCache:
+    def get(self, ref_audio, ref_text, show_info=print):
+        return {"cond_audio": np.zeros((1, 3 * 24000), dtype=np.float32), "ref_text": ref_text + ". "}
+
+    def hash_file(self, path):
+        return "0" * 64
+
+
+class FakeF5TTS:
+    # what api_server reads from the model at import, no weights are loaded
+    target_sample_rate = 24000
+    device = "cpu"
+    cpu_engine = None
+    mel_spec_type = "vocos"
+
+    def __init__(self, **kwargs):
+        self.voice_cache = FakeVoiceCache()
+
+
+@pytest.fixture(scope="module")
+def server(tmp_path_factory):
+    import f5_tts.api
+
+    with pytest.MonkeyPatch.context() as mp:
+        mp.setattr(f5_tts.api, "F5TTS", FakeF5TTS)
+        mp.chdir(tmp_path_factory.mktemp("server"))  # outputs/ is created in the working directory
+        sys.modules.pop("api_server", None)
+        import api_server
+    return api_server
+
+
+@pytest.fixture
+def api(server):
+    yield server
+    with server.stats_lock:
+        server.stats.update(in_flight=0, in_flight_frames=0, rejected_requests=0)
+        server.client_in_flight_frames.clear()
+
+
+def job(frames, client_id="a", enqueue_time=0.0, **kwargs):
+    return {"frames": frames, "client_id": client_id, "enqueue_time": enqueue_time, **kwargs}
+
+
+def drain(job_queue):
+    jobs = []
+    while job_queue.qsize():
+        jobs.append(job_queue.get(timeout=0))
+    return jobs
+
+
+# job queue
+
+
+def test_job_queue_shortest_first(api):
+    job_queue = api.JobQueue()
+    for frames, client_id in [(500, "a"), (100, "b"), (300, "c")]:
+        job_queue.put(job(frames, client_id))
+
+    assert [j["frames"] for j in drain(job_queue)] == [100, 300, 500]
+
+
+def test_job_queue_aging_lets_long_jobs_through(api):
+    job_queue = api.JobQueue()
+    job_queue.put(job(1000, "a", enqueue_time=0.0))
+    # a short job arriving later than (1000 - 100) / AGING_FRAMES_PER_SEC waits behind the long one
+    late = (1000 - 100) / api.AGING_FRAMES_PER_SEC + 1
+    job_queue.put(job(100, "b", enqueue_time=late))
+    job_queue.put(job(100, "c", enqueue_time=0.0))
+
+    assert [j["client_id"] for j in drain(job_queue)] == ["c", "a", "b"]
+
+
+def test_job_queue_is_fair_between_clients(api):
+    job_queue = api.JobQueue()
+    for i in range(3):
+        job_queue.put(job(100, "bulk", name=f"bulk{i}"))
+    job_queue.put(job(150, "other", name="other"))
+
+    assert [j["name"] for j in drain(job_queue)] == ["bulk0", "other", "bulk1", "bulk2"]
+    assert job_queue.queued_frames == 0
+    assert job_queue.client_frames == {}
+
+
+def test_job_queue_poison_pill_sorts_last(api):
+    job_queue = api.JobQueue()
+    job_queue.put(None)
+    job_queue.put(job(10**6, enqueue_time=1e9))
+
+    assert job_queue.get(timeout=0)["frames"] == 10**6
+    assert job_queue.get(timeout=0) is None
+    with pytest.raises(queue.Empty):
+        job_queue.get(timeout=0.01)
+
+
+# admission control
+
+
+def frames_for(api, seconds):
+    return int(seconds * api.tts_model.target_sample_rate / api.hop_length)
+
+
+def test_admit_reserves_and_releases(api):
+    frames = frames_for(api, 10)
+    assert api.admit(frames, "a") is None
+    assert api.stats["in_flight"] == 1
+    assert api.stats["in_flight_frames"] == frames
+    assert api.client_in_flight_frames == {"a": frames}
+
+    api.update_in_flight(-1, frames, "a")
+    assert api.stats["in_flight"] == 0
+    assert api.stats["in_flight_frames"] == 0
+    assert api.client_in_flight_frames == {}
+
+
+def test_admit_first_request_always_admitted(api):
+    assert api.admit(frames_for(api, 10 * api.MAX_QUEUED_AUDIO_SECONDS), "a") is None
+    assert api.admit(frames_for(api, 1), "b") is not None
+
+
+def test_admit_limits_each_client(api):
+    assert api.admit(frames_for(api, api.MAX_CLIENT_AUDIO_SECONDS - 10), "bulk") is None
+
+    retry_after = api.admit(frames_for(api, 20), "bulk")
+    assert retry_after is not None and retry_after >= 1
+    assert api.stats["rejected_requests"] == 1
+    # other clients still fit under the global limit
+    assert api.admit(frames_for(api, 20), "other") is None
+
+
+def test_admit_retry_after_scales_with_excess(api):
+    api.stats["rtf"] = 0.5
+    assert api.admit(frames_for(api, api.MAX_QUEUED_AUDIO_SECONDS), "a") is None
+
+    short = api.admit(frames_for(api, 10), "b")
+    long = api.admit(frames_for(api, 100), "b")
+    assert 1 <= short < long
+    assert long == pytest.approx(100 * 0.5 / api.NUM_WORKERS, abs=1)
+
+
+def test_tts_returns_429_with_retry_after(api):
+    assert api.admit(frames_for(api, api.MAX_QUEUED_AUDIO_SECONDS), "other") is None
+    queued = api.request_queue.qsize()
+
+    resp = api.app.test_client().post("/tts", json={"text": "Xin chào các bạn."}, headers={"X-Client-Id": "c"})
+
+    assert resp.status_code == 429
+    assert int(resp.headers["Retry-After"]) >= 1
+    assert resp.get_json()["retry_after"] == int(resp.headers["Retry-After"])
+    assert api.request_queue.qsize() == queued  # nothing was queued
+    assert "c" not in api.client_in_flight_frames
+
+
+# result cache
+
+
+def write_wav(path, size):
+    path.write_bytes(b"\0" * size)
+    return path
+
+
+def test_result_cache_lru_eviction(api, tmp_path):
+    cache = api.ResultCache(tmp_path / "cache", max_bytes=250)
+    for key in "abc":
+        cache.put(key, write_wav(tmp_path / f"{key}.wav", 100))
+
+    # a was least recently used
+    assert list(cache.entries) == ["b", "c"]
+    assert cache.total_bytes == 200
+    assert not cache.path("a").exists()
+    assert cache.get("a") is None
+
+    assert cache.get("b") == cache.path("b")
+    cache.put("d", write_wav(tmp_path / "d.wav", 100))
+    assert list(cache.entries) == ["b", "d"]
+    assert not cache.path("c").exists()
+
+    info = cache.info()
+    assert (info["entries"], info["hits"], info["misses"]) == (2, 1, 1)
+
+
+def test_result_cache_put_replaces_entry(api, tmp_path):
+    cache = api.ResultCache(tmp_path / "cache", max_bytes=1000)
+    cache.put("a", write_wav(tmp_path / "a.wav", 100))
+    cache.put("a", write_wav(tmp_path / "a.wav", 300))
+
+    assert cache.entries == {"a": 300}
+    assert cache.total_bytes == 300
+
+
+def test_result_cache_restores_lru_order_and_cleans_tmp(api, tmp_path):
+    cache_dir = tmp_path / "cache"
+    cache_dir.mkdir()
+    for mtime, key in enumerate(["c", "a", "b"]):
+        path = write_wav(cache_dir / f"{key}.wav", 100)
+        os.utime(path, (1000 + mtime, 1000 + mtime))
+    write_wav(cache_dir / "a.0123abcd.tmp", 100)  # left behind by a crash while sending
+
+    cache = api.ResultCache(cache_dir, max_bytes=250)
+
+    assert list(cache.entries) == ["a", "b"]
+    assert not (cache_dir / "c.wav").exists()
+    assert list(cache_dir.glob("*.tmp")) == []
+
+
+def test_result_cache_disabled(api, tmp_path):
+    cache = api.ResultCache(tmp_path / "cache", max_bytes=0)
+    assert not cache.enabled
+    assert not (tmp_path / "cache").exists()
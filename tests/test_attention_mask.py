@@ -0,0 +1,59 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+F = torch.nn.functional
+
+from f5_tts.model.modules import Attention, AttnProcessor, key_padding_attn_mask  # noqa: E402
+
+
+def make_batch(device="cpu", dtype=torch.float32, lengths=(37, 21, 30)):
+    # mixed target durations, like a bucket of chunks sampled together
+    torch.manual_seed(0)
+    seq_len = max(lengths)
+    mask = torch.arange(seq_len, device=device)[None, :] < torch.tensor(lengths, device=device)[:, None]
+    attn = Attention(processor=AttnProcessor(), dim=64, heads=4, dim_head=16, dropout=0.0)
+    attn = attn.to(device=device, dtype=dtype).eval()
+    x = torch.randn(len(lengths), seq_len, 64, device=device, dtype=dtype)
+    return attn, x, mask
+
+
+def test_additive_mask_matches_bool_mask():
+    q, k, v = torch.randn(3, 3, 4, 29, 16).unbind(0)
+    mask = torch.arange(29)[None, :] < torch.tensor([29, 11, 20])[:, None]
+
+    attn_mask = key_padding_attn_mask(mask, q.dtype)
+    expected = F.scaled_dot_product_attention(q, k, v, attn_mask=mask[:, None, None, :])
+    torch.testing.assert_close(F.scaled_dot_product_attention(q, k, v, attn_mask=attn_mask), expected)
+
+
+def test_additive_mask_rows_are_aligned():
+    mask = torch.ones(2, 29, dtype=torch.bool)
+    mask[1, 20:] = False
+
+    attn_mask = key_padding_attn_mask(mask, torch.float16)
+    assert attn_mask.shape == (2, 1, 1, 29)
+    assert attn_mask.stride(0) % 8 == 0
+    assert (attn_mask[1, 0, 0, 20:] == torch.finfo(torch.float16).min).all()
+    assert (attn_mask[0] == 0).all()
+
+
+def test_precomputed_mask_matches_per_call_mask():
+    attn, x, mask = make_batch()
+    with torch.no_grad():
+        expected = attn(x, mask=mask)
+        out = attn(x, mask=mask, attn_mask=key_padding_attn_mask(mask, x.dtype))
+    torch.testing.assert_close(out, expected)
+
+
+@pytest.mark.skipif(not torch.cuda.is_available(), reason="needs cuda")
+def test_mixed_duration_batch_runs_on_memory_efficient_kernel():
+    attention = pytest.importorskip("torch.nn.attention")
+    attn, x, mask = make_batch(device="cuda", dtype=torch.float16)
+    attn_mask = key_padding_attn_mask(mask, x.dtype)
+
+    # raises "No available kernel" if sdpa would have to fall back to the math kernel
+    with torch.no_grad(), attention.sdpa_kernel(attention.SDPBackend.EFFICIENT_ATTENTION):
+        out = attn(x, mask=mask, attn_mask=attn_mask)
+    with torch.no_grad(), attention.sdpa_kernel(attention.SDPBackend.MATH):
+        expected = attn(x, mask=mask, attn_mask=attn_mask)
+    torch.testing.assert_close(out, expected, atol=2e-3, rtol=2e-3)
@@ -0,0 +1,209 @@
+import pytest
+
+torch = pytest.importorskip("torch")
+torchdiffeq = pytest.importorskip("torchdiffeq")
+from torch import nn  # noqa: E402
+
+from f5_tts.model.backbones.dit import DiT  # noqa: E402
+from f5_tts.model.cfm import CFM, fixed_step_eval_times, fixed_step_integrate  # noqa: E402
+from f5_tts.model.modules import SampleCache  # noqa: E402
+
+MEL_DIM = 8
+
+
+def tiny_dit(seed=0):
+    torch.manual_seed(seed)
+    dit = DiT(
+        dim=32, depth=2, heads=2, dim_head=16, dropout=0.0, ff_mult=2, mel_dim=MEL_DIM, text_num_embeds=10,
+        conv_layers=1,
+    )
+    # initialize_weights() zeroes the output layers, which would make every comparison trivially equal
+    with torch.no_grad():
+        for param in dit.parameters():
+            param.normal_(std=0.2)
+    return dit.eval()
+
+
+def forward_inputs(lengths=(13, 9), seed=0):
+    generator = torch.Generator().manual_seed(seed)
+    batch, seq_len = len(lengths), max(lengths)
+    x = torch.randn(batch, seq_len, MEL_DIM, generator=generator)
+    cond = torch.randn(batch, seq_len, MEL_DIM, generator=generator)
+    cond[:, seq_len // 2 :] = 0  # only the prompt part is given, like step_cond in CFM.sample
+    text = torch.randint(0, 10, (batch, 7), generator=generator)
+    mask = torch.arange(seq_len)[None, :] < torch.tensor(lengths)[:, None]
+    return x, cond, text, mask
+
+
+def sway_grid(steps):
+    t = torch.linspace(0, 1, steps + 1)
+    return t - (torch.cos(torch.pi / 2 * t) - 1 + t)
+
+
+def tiny_cfm(method="euler"):
+    return CFM(tiny_dit(), odeint_kwargs=dict(method=method), mel_spec_module=nn.Identity(), num_channels=MEL_DIM)
+
+
+def sample_inputs():
+    generator = torch.Generator().manual_seed(0)
+    cond = torch.randn(2, 6, MEL_DIM, generator=generator)
+    text = torch.randint(0, 10, (2, 5), generator=generator)
+    return cond, text, torch.tensor([6, 4]), torch.tensor([40, 23])
+
+
+# fixed-step solvers
+
+
+@pytest.mark.parametrize("method", ["euler", "midpoint"])
+def test_fixed_step_integrate_matches_odeint(method):
+    def fn(t, y):
+        return torch.sin(3 * t) - y * y.abs().sqrt()
+
+    t = sway_grid(10)
+    y0 = torch.randn(2, 5, 3, generator=torch.Generator().manual_seed(0))
+
+    expected = torchdiffeq.odeint(fn, y0, t, method=method)[-1]
+    out = fixed_step_integrate(fn, y0.clone(), t, method=method)
+    torch.testing.assert_close(out, expected, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.parametrize("method", ["euler", "midpoint"])
+def test_fixed_step_eval_times_are_call_times(method):
+    calls = []
+
+    def fn(t, y):
+        calls.append(float(t))
+        return torch.ones_like(y)
+
+    t = sway_grid(6)
+    out = fixed_step_integrate(fn, torch.zeros(3), t, method=method)
+
+    assert calls == pytest.approx(fixed_step_eval_times(t, method).tolist())
+    torch.testing.assert_close(out, torch.ones(3))  # integrates dy/dt = 1 over [0, 1]
+
+
+# fused cfg & cached cond projection
+
+
+@pytest.mark.parametrize("use_cache", [False, True])
+def test_fused_cfg_matches_separate_forwards(use_cache):
+    dit = tiny_dit()
+    x, cond, text, mask = forward_inputs()
+    time = torch.tensor(0.3)
+
+    with torch.no_grad():
+        pred = dit(x, cond, text, time, drop_audio_cond=False, drop_text=False, mask=mask)
+        null_pred = dit(x, cond, text, time, drop_audio_cond=True, drop_text=True, mask=mask)
+        cache = SampleCache() if use_cache else False
+        fused = dit(x, cond, text, time, drop_audio_cond=False, drop_text=False, mask=mask, cache=cache, cfg_infer=True)
+
+    torch.testing.assert_close(fused, torch.cat((pred, null_pred), dim=0), rtol=1e-5, atol=1e-5)
+
+
+def test_cached_cond_projection_matches_uncached():
+    dit = tiny_dit()
+    _, cond, text, mask = forward_inputs()
+    cache = SampleCache()
+
+    with torch.no_grad():
+        for step, time in enumerate([0.0, 0.4, 0.9]):
+            x = forward_inputs(seed=step + 1)[0]  # the noised audio changes every step, cond & text do not
+            for drop in (False, True):
+                kwargs = dict(drop_audio_cond=drop, drop_text=drop, mask=mask)
+                expected = dit(x, cond, text, torch.tensor(time), **kwargs)
+                out = dit(x, cond, text, torch.tensor(time), cache=cache, **kwargs)
+                torch.testing.assert_close(out, expected, rtol=1e-5, atol=1e-5)
+
+    assert cache.input_cond is not None and cache.input_uncond is not None
+
+
+def test_precomputed_time_embed_matches_per_step():
+    dit = tiny_dit()
+    x, cond, text, mask = forward_inputs()
+    times = sway_grid(4)
+    cache = SampleCache()
+
+    with torch.no_grad():
+        entries = dit.precompute_time_embed(times)
+        for time, entry in zip(times, entries):
+            kwargs = dict(drop_audio_cond=False, drop_text=False, mask=mask, cfg_infer=True)
+            expected = dit(x, cond, text, time, **kwargs)
+            out = dit(x, cond, text, time, cache=cache, time_embed=entry, **kwargs)
+            torch.testing.assert_close(out, expected, rtol=1e-5, atol=1e-5)
+
+
+def test_parameters_match_checkpoint_layout():
+    dit = tiny_dit()
+    state_dict = dit.state_dict()
+    buffers = dict(dit.named_buffers())
+
+    assert state_dict["input_embed.proj.weight"].shape == (32, 3 * MEL_DIM)
+    # optimizer states are saved per parameter index, so parameters must be the checkpoint's, in its order
+    assert [name for name, _ in dit.named_parameters()] == [key for key in state_dict if key not in buffers]
+
+
+def train_step(dit, optimizer):
+    x, cond, text, mask = forward_inputs()
+    pred = dit(x, cond, text, torch.full((2,), 0.5), drop_audio_cond=False, drop_text=False, mask=mask)
+    optimizer.zero_grad()
+    pred.pow(2).mean().backward()
+    optimizer.step()
+
+
+def test_resume_round_trips_optimizer_state(tmp_path):
+    dit = tiny_dit().train()
+    optimizer = torch.optim.AdamW(dit.parameters(), lr=1e-3)
+    train_step(dit, optimizer)
+    # the entries Trainer.save_checkpoint writes and Trainer.load_checkpoint restores
+    torch.save(
+        dict(model_state_dict=dit.state_dict(), optimizer_state_dict=optimizer.state_dict()),
+        tmp_path / "model_last.pt",
+    )
+
+    checkpoint = torch.load(tmp_path / "model_last.pt", weights_only=True, map_location="cpu")
+    resumed = tiny_dit(seed=1).train()
+    resumed_optimizer = torch.optim.AdamW(resumed.parameters(), lr=1e-3)
+    resumed.load_state_dict(checkpoint["model_state_dict"])
+    resumed_optimizer.load_state_dict(checkpoint["optimizer_state_dict"])
+
+    train_step(dit, optimizer)
+    train_step(resumed, resumed_optimizer)
+    for (name, param), resumed_param in zip(dit.named_parameters(), resumed.parameters()):
+        torch.testing.assert_close(resumed_param, param, msg=name)
+
+
+# end to end sampling
+
+
+@pytest.mark.parametrize("method", ["euler", "midpoint"])
+@pytest.mark.parametrize("guidance", [dict(), dict(cfg_interval=(0.2, 0.8)), dict(cfg_strength=0.0)])
+def test_sample_matches_unfused_odeint(method, guidance):
+    model = tiny_cfm(method)
+    cond, text, lens, _ = sample_inputs()
+    duration = torch.tensor([16, 11])
+    kwargs = dict(lens=lens, steps=6, cfg_strength=2.0, sway_sampling_coef=-1.0, seed=0)
+    kwargs.update(guidance)
+
+    # return_trajectory goes through odeint, fused_cfg=False runs cond & uncond forwards separately
+    expected, trajectory = model.sample(cond, text, duration, fused_cfg=False, return_trajectory=True, **kwargs)
+    out, no_trajectory = model.sample(cond, text, duration, **kwargs)
+
+    assert trajectory.shape[0] == 7 and no_trajectory is None
+    torch.testing.assert_close(out, expected, rtol=1e-4, atol=1e-5)
+
+
+
+
+@pytest.mark.parametrize("fused_cfg", [True, False])
+def test_batched_sample_matches_sample_alone(fused_cfg):
+    model = tiny_cfm()
+    cond, text, lens, duration = sample_inputs()
+    kwargs = dict(steps=4, cfg_strength=2.0, sway_sampling_coef=-1.0, seed=0, fused_cfg=fused_cfg)
+
+    batched, _ = model.sample(cond, text, duration, lens=lens, **kwargs)
+    for i in range(len(duration)):
+        alone, _ = model.sample(
+            cond[i : i + 1, : lens[i]], text[i : i + 1], duration[i : i + 1], lens=lens[i : i + 1], **kwargs
+        )
+        # padding up to the longest item changes nothing in the shorter one, not even in its last frames
+        torch.testing.assert_close(batched[i, : duration[i]], alone[0], rtol=1e-4, atol=1e-5)
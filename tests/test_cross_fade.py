@@ -0,0 +1,67 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+
+from f5_tts.infer.utils_infer import CrossFadeAssembler  # noqa: E402
+
+
+def reference_cross_fade(waves, cross_fade_samples):
+    # the pairwise concatenation infer_batch_process used before CrossFadeAssembler
+    final_wave = waves[0]
+    for next_wave in waves[1:]:
+        prev_wave = final_wave
+        samples = min(cross_fade_samples, len(prev_wave), len(next_wave))
+        if samples <= 0:
+            final_wave = np.concatenate([prev_wave, next_wave])
+            continue
+        fade_out = np.linspace(1, 0, samples)
+        fade_in = np.linspace(0, 1, samples)
+        overlap = prev_wave[-samples:] * fade_out + next_wave[:samples] * fade_in
+        final_wave = np.concatenate([prev_wave[:-samples], overlap, next_wave[samples:]])
+    return final_wave
+
+
+def make_waves(lengths, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.standard_normal(length).astype(np.float32) for length in lengths]
+
+
+@pytest.mark.parametrize("cross_fade_samples", [0, 1, 64, 3600])
+@pytest.mark.parametrize("lengths", [[5000], [5000, 7000, 6000], [5000, 30, 6000], [20, 10, 4000, 5]])
+def test_matches_pairwise_cross_fade(lengths, cross_fade_samples):
+    waves = make_waves(lengths)
+    expected = reference_cross_fade(waves, cross_fade_samples)
+
+    preallocated = CrossFadeAssembler(cross_fade_samples, total_samples=sum(lengths))
+    grown = CrossFadeAssembler(cross_fade_samples)
+    for wave in waves:
+        preallocated.add(wave)
+        grown.add(wave)
+
+    np.testing.assert_allclose(preallocated.finish(), expected, rtol=1e-6, atol=1e-6)
+    np.testing.assert_allclose(grown.finish(), expected, rtol=1e-6, atol=1e-6)
+
+
+def test_streamed_chunks_match_whole_wave():
+    waves = make_waves([4000, 2500, 50, 6000])
+    expected = reference_cross_fade(waves, 1000)
+
+    assembler = CrossFadeAssembler(1000)
+    chunks = []
+    for wave in waves:
+        assembler.add(wave)
+        ready = assembler.pop_ready()
+        # everything handed out is final, only the last cross_fade_samples are held back
+        assert assembler.length - assembler.popped <= 1000
+        chunks.append(ready)
+    chunks.append(assembler.finish())
+
+    np.testing.assert_allclose(np.concatenate(chunks), expected, rtol=1e-6, atol=1e-6)
+
+
+def test_pop_ready_holds_back_short_waves():
+    assembler = CrossFadeAssembler(1000)
+    assembler.add(np.ones(600, dtype=np.float32))
+    assert len(assembler.pop_ready()) == 0
+    assert len(assembler.finish()) == 600
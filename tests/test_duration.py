@@ -0,0 +1,45 @@
+from f5_tts.infer.duration import bucket_by_duration, estimate_duration, estimate_gen_frames, hop_length
+
+
+def test_gen_frames_scale_with_text_and_speed():
+    ref_frames, ref_text = 300, "a" * 30  # 10 frames per utf-8 byte of reference text
+
+    assert estimate_gen_frames(ref_frames, ref_text, "b" * 20) == 200
+    assert estimate_gen_frames(ref_frames, ref_text, "b" * 20, speed=2.0) == 100
+    # vietnamese diacritics count by utf-8 bytes, like the reference text
+    assert estimate_gen_frames(ref_frames, ref_text, "ế" * 10) == 300
+
+
+def test_gen_frames_short_text_is_slowed_down():
+    assert estimate_gen_frames(300, "a" * 30, "b" * 3) == int(10 * 3 / 0.3)
+
+
+def test_gen_frames_fix_duration():
+    frames = estimate_duration(300, "a" * 30, "b" * 20, fix_duration=5.0)
+    assert frames == int(5.0 * 24000 / hop_length)
+    assert estimate_gen_frames(300, "a" * 30, "b" * 20, fix_duration=5.0) == frames - 300
+    # a fixed total shorter than the reference leaves nothing to generate
+    assert estimate_gen_frames(1000, "a" * 30, "b" * 20, fix_duration=1.0) == 0
+
+
+def test_buckets_cover_every_index_once():
+    durations = [500, 120, 130, 900, 125, 480, 1000, 119]
+    buckets = bucket_by_duration(durations, max_batch_size=3)
+
+    assert sorted(i for bucket in buckets for i in bucket) == list(range(len(durations)))
+    assert [durations[bucket[0]] for bucket in buckets] == sorted(durations[bucket[0]] for bucket in buckets)
+
+
+def test_buckets_respect_batch_size_and_padding_ratio():
+    durations = [100, 101, 102, 103, 104, 124, 131, 200]
+    buckets = bucket_by_duration(durations, max_batch_size=4, max_padding_ratio=1.25)
+
+    assert buckets == [[0, 1, 2, 3], [4, 5], [6], [7]]
+    for bucket in buckets:
+        lengths = [durations[i] for i in bucket]
+        assert len(bucket) <= 4
+        assert max(lengths) <= min(lengths) * 1.25
+
+
+def test_buckets_empty():
+    assert bucket_by_duration([]) == []
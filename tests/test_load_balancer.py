@@ -0,0 +1,192 @@
+import asyncio
+
+import pytest
+
+aiohttp = pytest.importorskip("aiohttp")
+from aiohttp import web  # noqa: E402
+from aiohttp.test_utils import TestClient, TestServer  # noqa: E402
+
+import load_balancer  # noqa: E402
+from load_balancer import Backend, LoadBalancer, create_app  # noqa: E402
+
+DEFAULT_VOICE = {"ref_frames": 400, "ref_text": "a" * 40}  # 10 frames per byte of text
+
+
+def make_balancer(routing, count=3):
+    balancer = LoadBalancer([f"http://backend{i}" for i in range(count)], routing=routing)
+    for backend in balancer.backends:
+        backend.default_voice = DEFAULT_VOICE
+    return balancer
+
+
+def test_least_work_balances_predicted_frames():
+    balancer = make_balancer("least_work")
+    b0, b1, b2 = balancer.backends
+    b0.reported_frames = 500
+    b1.outstanding_frames = 300
+    b2.reported_frames = 250
+
+    assert balancer.pick_backend({"text": "x" * 10}) is b2
+    # lb-side frames not yet visible in /health count too, the larger of both is used
+    b2.outstanding_frames = 600
+    assert balancer.pick_backend({"text": "x" * 10}) is b1
+
+
+def test_backend_predicts_frames_from_default_voice():
+    backend = Backend("http://backend")
+    assert backend.predict_frames({"text": "x" * 20}) == 20  # no voice reported yet: utf-8 bytes
+    backend.default_voice = DEFAULT_VOICE
+    assert backend.predict_frames({"text": "x" * 20}) == 200
+    assert backend.predict_frames({"text": "x" * 20, "speed": 2.0}) == 100
+
+
+def test_least_outstanding_uses_lb_and_reported_load():
+    balancer = make_balancer("least_outstanding")
+    b0, b1, b2 = balancer.backends
+    b0.outstanding = 2
+    b1.reported_in_flight = 3
+    b2.outstanding, b2.reported_in_flight = 1, 1
+
+    assert balancer.pick_backend({"text": "x"}) is b2
+
+
+def test_round_robin_skips_excluded_and_ejected():
+    balancer = make_balancer("round_robin")
+    b0, b1, b2 = balancer.backends
+
+    assert [balancer.pick_backend({}) for _ in range(3)] == [b0, b1, b2]
+    b1.healthy = False
+    assert [balancer.pick_backend({}) for _ in range(4)] == [b0, b2, b0, b2]
+    assert balancer.pick_backend({}, exclude={b0}) is b2
+
+
+def test_ties_rotate_between_backends():
+    balancer = make_balancer("least_work")
+    picked = {balancer.pick_backend({"text": "x"}) for _ in range(3)}
+    assert picked == set(balancer.backends)
+
+
+def test_ejection_after_consecutive_failures():
+    balancer = make_balancer("least_outstanding", count=2)
+    b0, b1 = balancer.backends
+
+    for _ in range(load_balancer.EJECT_AFTER_FAILURES - 1):
+        b0.mark_failure("timeout")
+    assert b0.healthy
+    b0.mark_failure("timeout")
+    assert not b0.healthy
+    assert all(balancer.pick_backend({"text": "x"}) is b1 for _ in range(4))
+
+    b0.mark_success()
+    assert b0.healthy and b0.consecutive_failures == 0
+
+
+def test_all_ejected_still_picks_a_backend():
+    balancer = make_balancer("least_outstanding", count=2)
+    for backend in balancer.backends:
+        backend.healthy = False
+    assert balancer.pick_backend({"text": "x"}) in balancer.backends
+
+
+# end to end through aiohttp, with fake backends
+
+
+def fake_backend(name, status=200, retry_after=7):
+    requests = []
+
+    async def handle_health(request):
+        return web.json_response(
+            {"status": "ok", "stats": {"in_flight": 0, "in_flight_frames": 0}, "default_voice": DEFAULT_VOICE}
+        )
+
+    async def handle_tts(request):
+        requests.append(await request.json())
+        if status == 429:
+            return web.json_response({"error": "busy"}, status=429, headers={"Retry-After": str(retry_after)})
+        return web.Response(body=name.encode(), content_type="audio/wav")
+
+    app = web.Application()
+    app.router.add_get("/health", handle_health)
+    app.router.add_post("/tts", handle_tts)
+    return TestServer(app), requests
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_busy_backend_is_retried_on_another():
+    async def main():
+        busy, busy_requests = fake_backend("busy", status=429)
+        idle, idle_requests = fake_backend("idle")
+        await busy.start_server()
+        await idle.start_server()
+        client = TestClient(TestServer(create_app([str(busy.make_url("")), str(idle.make_url(""))])))
+        await client.start_server()
+        try:
+            balancer = client.server.app["balancer"]
+            balancer.backends[1].outstanding_frames = 10**6  # routing prefers the busy one first
+
+            resp = await client.post("/tts", json={"text": "xin chào"})
+            assert resp.status == 200
+            assert await resp.read() == b"idle"
+            assert len(busy_requests) == 1 and len(idle_requests) == 1
+            # 429 means the backend is up, it is not ejected
+            assert balancer.backends[0].healthy
+        finally:
+            await client.close()
+            await busy.close()
+            await idle.close()
+
+    run(main())
+
+
+def test_all_busy_returns_429_with_shortest_retry_after():
+    async def main():
+        slow, _ = fake_backend("slow", status=429, retry_after=9)
+        fast, _ = fake_backend("fast", status=429, retry_after=3)
+        await slow.start_server()
+        await fast.start_server()
+        client = TestClient(TestServer(create_app([str(slow.make_url("")), str(fast.make_url(""))])))
+        await client.start_server()
+        try:
+            resp = await client.post("/tts", json={"text": "xin chào"})
+            assert resp.status == 429
+            assert resp.headers["Retry-After"] == "3"
+        finally:
+            await client.close()
+            await slow.close()
+            await fast.close()
+
+    run(main())
+
+
+def test_unreachable_backend_is_ejected_and_skipped():
+    async def main():
+        alive, alive_requests = fake_backend("alive")
+        await alive.start_server()
+        dead = fake_backend("dead")[0]
+        await dead.start_server()
+        dead_url = str(dead.make_url(""))
+        await dead.close()  # nothing listens on its port any more
+
+        client = TestClient(TestServer(create_app([dead_url, str(alive.make_url(""))])))
+        await client.start_server()
+        try:
+            balancer = client.server.app["balancer"]
+            dead_backend = balancer.backends[0]
+            while dead_backend.consecutive_failures < load_balancer.EJECT_AFTER_FAILURES:
+                await balancer.check_all_backends()
+            assert not dead_backend.healthy
+            assert balancer.backends[1].healthy
+
+            for _ in range(3):
+                resp = await client.post("/tts", json={"text": "xin chào"})
+                assert resp.status == 200
+                assert await resp.read() == b"alive"
+            assert len(alive_requests) == 3
+        finally:
+            await client.close()
+            await alive.close()
+
+    run(main())